@@ -14,7 +14,10 @@ from app.schemas.user import (
     ChangeEmailRequest,    # Mới
     MessageResponse        # Mới
 )
-from app.schemas.token import Token
+from app.schemas.token import Token, TokenIntrospectionRequest, TokenIntrospectionResponse
+
+# Import Core
+from app.core.request_timing import TimedRoute
 
 # Import Services
 from app.services.user_service import UserService
@@ -25,13 +28,18 @@ from app.dependencies import (
     get_current_user,
     get_current_active_user,
     get_current_user_id,
+    requires_permission,
+    oauth2_scheme,
+    enforce_login_rate_limit,
+    admission,
 )
 
 # THAY ĐỔI: Định nghĩa một hàm để trả về APIRouter
 def get_auth_router() -> APIRouter:
-    router = APIRouter(prefix="/auth", tags=["Authentication & User Profile"])
+    router = APIRouter(prefix="/auth", tags=["Authentication & User Profile"], route_class=TimedRoute)
 
-    @router.post("/register", response_model=UserInResponse, status_code=status.HTTP_201_CREATED)
+    @router.post("/register", response_model=UserInResponse, status_code=status.HTTP_201_CREATED,
+                 dependencies=[Depends(admission("register"))]) # Bị loại bỏ (503) trước tiên khi quá tải
     async def register_user(
         user_in: UserCreate,
         user_service: UserService = Depends(get_user_service)
@@ -41,7 +49,8 @@ def get_auth_router() -> APIRouter:
         """
         return await user_service.register_new_user(user_in)
 
-    @router.post("/login", response_model=Token)
+    @router.post("/login", response_model=Token,
+                 dependencies=[Depends(enforce_login_rate_limit), Depends(admission("login"))]) # 429 trước khi đọc DB/chạy bcrypt, 503 khi quá tải
     async def login_for_access_token(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
         user_service: UserService = Depends(get_user_service)
@@ -54,14 +63,26 @@ def get_auth_router() -> APIRouter:
 
     @router.post("/refresh-token", response_model=Token)
     async def refresh_access_token(
-        user_id: str = Depends(get_current_user_id),
+        refresh_token: str = Depends(oauth2_scheme),
         user_service: UserService = Depends(get_user_service)
     ):
         """
-        Làm mới Access Token bằng Refresh Token.
+        Làm mới Access Token bằng Refresh Token (gửi trong header Authorization: Bearer <refresh_token>).
+        Refresh token cũ bị vô hiệu hóa; dùng lại nó sẽ thu hồi toàn bộ phiên đăng nhập.
         """
-        user_db_model = await user_service.get_user_profile(user_id)
-        return await user_service.create_auth_tokens(user_db_model)
+        return await user_service.refresh_access_token(refresh_token)
+
+    @router.post("/introspect", response_model=TokenIntrospectionResponse, response_model_exclude_none=True,
+                 dependencies=[Depends(requires_permission("token:introspect"))]) # Yêu cầu quyền token:introspect
+    async def introspect_tokens(
+        request: TokenIntrospectionRequest,
+        user_service: UserService = Depends(get_user_service)
+    ):
+        """
+        Introspect nhiều token trong một request (kiểu RFC 7662), dành cho API gateway.
+        Kết quả trả về theo đúng thứ tự `tokens`; token không hợp lệ chỉ có {"active": false}.
+        """
+        return await user_service.introspect_tokens(request.tokens)
 
     @router.get("/me", response_model=UserInResponse)
     async def read_users_me(
@@ -84,7 +105,8 @@ def get_auth_router() -> APIRouter:
         """
         return await user_service.request_password_reset(request)
 
-    @router.post("/reset-password", response_model=MessageResponse)
+    @router.post("/reset-password", response_model=MessageResponse,
+                 dependencies=[Depends(admission("password"))])
     async def reset_password(
         request: ResetPasswordRequest,
         user_service: UserService = Depends(get_user_service)
@@ -94,7 +116,8 @@ def get_auth_router() -> APIRouter:
         """
         return await user_service.reset_password(request)
 
-    @router.put("/change-password", response_model=MessageResponse)
+    @router.put("/change-password", response_model=MessageResponse,
+                dependencies=[Depends(admission("password", authenticated=True))]) # Xác thực trước khi xin slot
     async def change_password(
         request: ChangePasswordRequest,
         current_user: Annotated[UserInResponse, Depends(get_current_active_user)],
@@ -115,7 +138,8 @@ def get_auth_router() -> APIRouter:
         """
         return await user_service.deactivate_account(current_user.id)
 
-    @router.post("/reactivate-account", response_model=MessageResponse)
+    @router.post("/reactivate-account", response_model=MessageResponse,
+                 dependencies=[Depends(enforce_login_rate_limit), Depends(admission("login"))]) # Cũng xác minh mật khẩu: dùng chung giới hạn với login
     async def reactivate_account(
         form_data: Annotated[OAuth2PasswordRequestForm, Depends()], # Sử dụng form data như login
         user_service: UserService = Depends(get_user_service)
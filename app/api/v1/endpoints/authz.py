@@ -0,0 +1,35 @@
+# app/api/v1/endpoints/authz.py
+
+from fastapi import APIRouter, Depends
+
+# Import Schemas
+from app.schemas.authz import AuthzCheckRequest, AuthzCheckResponse
+
+# Import Core
+from app.core.request_timing import TimedRoute
+
+# Import Services
+from app.services.authz_service import AuthzService
+
+# Import Dependencies
+from app.dependencies import (
+    get_authz_service,
+    requires_permission,
+)
+
+def get_authz_router() -> APIRouter:
+    router = APIRouter(prefix="/authz", tags=["Authorization Checks"], route_class=TimedRoute)
+
+    @router.post("/check", response_model=AuthzCheckResponse,
+                 dependencies=[Depends(requires_permission("authz:check"))]) # Yêu cầu quyền authz:check
+    async def check_permissions(
+        request: AuthzCheckRequest,
+        authz_service: AuthzService = Depends(get_authz_service)
+    ):
+        """
+        Kiểm tra hàng loạt quyền hạn của nhiều người dùng trong một request (dành cho gateway/backend
+        có quyền 'authz:check'). Kết quả trả về theo đúng thứ tự các kiểm tra trong request.
+        """
+        return await authz_service.check(request)
+
+    return router
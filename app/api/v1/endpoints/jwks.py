@@ -0,0 +1,31 @@
+# app/api/v1/endpoints/jwks.py
+
+from fastapi import APIRouter, Request, Response, status
+
+from app.core import security
+from app.core.config import settings
+
+# JWKS rỗng khi token vẫn ký HS256: không bao giờ công bố khóa đối xứng
+_EMPTY_JWKS = b'{"keys":[]}'
+
+def get_jwks_router() -> APIRouter:
+    router = APIRouter(tags=["JWKS"])
+
+    @router.get("/.well-known/jwks.json")
+    async def read_jwks(request: Request):
+        """
+        Public keys (JWK Set, RFC 7517) dùng để xác minh access token mà không cần gọi về service này.
+        Nội dung được serialize sẵn khi nạp keyring; hỗ trợ If-None-Match với ETag.
+        """
+        keyring = security.token_keyring
+        body = keyring.jwks_body if keyring else _EMPTY_JWKS
+        etag = keyring.jwks_etag if keyring else '"empty"'
+        headers = {
+            "Cache-Control": f"public, max-age={settings.JWKS_CACHE_MAX_AGE_SECONDS}",
+            "ETag": etag,
+        }
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    return router
@@ -0,0 +1,19 @@
+# app/api/v1/endpoints/metrics.py
+
+from fastapi import APIRouter, Response
+
+from app.core.metrics import render_metrics
+
+def get_metrics_router() -> APIRouter:
+    router = APIRouter(tags=["Metrics"])
+
+    @router.get("/metrics", include_in_schema=False)
+    async def read_metrics():
+        """
+        Prometheus text exposition: latency HTTP theo route, lệnh Mongo theo collection,
+        thời gian chờ connection pool, băm mật khẩu, JWT và số lần hit/miss của các cache.
+        """
+        body, content_type = render_metrics()
+        return Response(content=body, media_type=content_type)
+
+    return router
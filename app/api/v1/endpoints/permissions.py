@@ -1,10 +1,15 @@
 # app/api/v1/endpoints/permissions.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path
-from typing import List, Annotated
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query
+from typing import Annotated, Literal, Optional
 
 # Import Schemas
 from app.schemas.permission import PermissionCreate, PermissionInResponse
+from app.schemas.pagination import Page
+
+# Import Core
+from app.core.request_timing import TimedRoute
 
 # Import Services
 from app.services.permission_service import PermissionService
@@ -17,7 +22,7 @@ from app.dependencies import (
 
 # THAY ĐỔI: Định nghĩa một hàm để trả về APIRouter
 def get_permissions_router() -> APIRouter:
-    router = APIRouter(prefix="/permissions", tags=["Permission Management"])
+    router = APIRouter(prefix="/permissions", tags=["Permission Management"], route_class=TimedRoute)
 
     @router.post("/", response_model=PermissionInResponse, status_code=status.HTTP_201_CREATED,
                  dependencies=[Depends(requires_permission("permission:create"))]) # Yêu cầu quyền permission:create
@@ -30,15 +35,23 @@ def get_permissions_router() -> APIRouter:
         """
         return await permission_service.create_new_permission(permission_in)
 
-    @router.get("/", response_model=List[PermissionInResponse],
+    @router.get("/", response_model=Page[PermissionInResponse],
                 dependencies=[Depends(requires_permission("permission:read_all"))]) # Yêu cầu quyền permission:read_all
     async def read_all_permissions(
+        limit: Annotated[Optional[int], Query(ge=1, description="Số phần tử mỗi trang (tối đa PAGINATION_MAX_LIMIT)")] = None,
+        cursor: Annotated[Optional[str], Query(description="Giá trị next_cursor của trang trước")] = None,
+        sort_by: Annotated[Literal["_id", "created_at"], Query(description="Khóa sắp xếp")] = "_id",
+        order: Annotated[Literal["asc", "desc"], Query(description="Chiều sắp xếp")] = "asc",
+        created_after: Annotated[Optional[datetime], Query(description="Chỉ lấy bản ghi tạo từ thời điểm này")] = None,
+        created_before: Annotated[Optional[datetime], Query(description="Chỉ lấy bản ghi tạo trước thời điểm này")] = None,
         permission_service: PermissionService = Depends(get_permission_service)
     ):
         """
-        Lấy danh sách tất cả quyền hạn (chỉ dành cho người có quyền 'permission:read_all').
+        Lấy danh sách quyền hạn theo trang (chỉ dành cho người có quyền 'permission:read_all').
         """
-        return await permission_service.get_all_permissions()
+        return await permission_service.list_permissions(
+            limit, cursor, sort_by, order, created_after=created_after, created_before=created_before,
+        )
 
     @router.get("/{permission_id}", response_model=PermissionInResponse,
                 dependencies=[Depends(requires_permission("permission:read_all"))]) # Yêu cầu quyền permission:read_all
@@ -1,10 +1,16 @@
 # app/api/v1/endpoints/roles.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path
-from typing import List, Annotated
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query
+from typing import Annotated, Literal, Optional
 
 # Import Schemas
 from app.schemas.role import RoleCreate, RoleInResponse, RoleUpdate
+from app.schemas.pagination import Page
+from app.schemas.user import MessageResponse
+
+# Import Core
+from app.core.request_timing import TimedRoute
 
 # Import Services
 from app.services.role_service import RoleService
@@ -17,7 +23,7 @@ from app.dependencies import (
 
 # THAY ĐỔI: Định nghĩa một hàm để trả về APIRouter
 def get_roles_router() -> APIRouter:
-    router = APIRouter(prefix="/roles", tags=["Role Management & Assignment"])
+    router = APIRouter(prefix="/roles", tags=["Role Management & Assignment"], route_class=TimedRoute)
 
     @router.post("/", response_model=RoleInResponse, status_code=status.HTTP_201_CREATED,
                  dependencies=[Depends(requires_permission("role:create"))]) # Yêu cầu quyền role:create
@@ -30,15 +36,25 @@ def get_roles_router() -> APIRouter:
         """
         return await role_service.create_new_role(role_in)
 
-    @router.get("/", response_model=List[RoleInResponse],
+    @router.get("/", response_model=Page[RoleInResponse],
                 dependencies=[Depends(requires_permission("role:read_all"))]) # Yêu cầu quyền role:read_all
     async def read_all_roles(
+        limit: Annotated[Optional[int], Query(ge=1, description="Số phần tử mỗi trang (tối đa PAGINATION_MAX_LIMIT)")] = None,
+        cursor: Annotated[Optional[str], Query(description="Giá trị next_cursor của trang trước")] = None,
+        sort_by: Annotated[Literal["_id", "created_at"], Query(description="Khóa sắp xếp")] = "_id",
+        order: Annotated[Literal["asc", "desc"], Query(description="Chiều sắp xếp")] = "asc",
+        permission_id: Annotated[Optional[str], Query(description="Lọc vai trò có quyền hạn này")] = None,
+        created_after: Annotated[Optional[datetime], Query(description="Chỉ lấy bản ghi tạo từ thời điểm này")] = None,
+        created_before: Annotated[Optional[datetime], Query(description="Chỉ lấy bản ghi tạo trước thời điểm này")] = None,
         role_service: RoleService = Depends(get_role_service)
     ):
         """
-        Lấy danh sách tất cả vai trò (chỉ dành cho người có quyền 'role:read_all').
+        Lấy danh sách vai trò theo trang (chỉ dành cho người có quyền 'role:read_all').
         """
-        return await role_service.get_all_roles()
+        return await role_service.list_roles(
+            limit, cursor, sort_by, order,
+            permission_id=permission_id, created_after=created_after, created_before=created_before,
+        )
 
     @router.get("/{role_id}", response_model=RoleInResponse,
                 dependencies=[Depends(requires_permission("role:read_all"))]) # Yêu cầu quyền role:read_all
@@ -63,6 +79,17 @@ def get_roles_router() -> APIRouter:
         """
         return await role_service.update_role(role_id, role_update)
 
+    @router.post("/{role_id}/revoke-tokens", response_model=MessageResponse,
+                 dependencies=[Depends(requires_permission("role:revoke_tokens"))]) # Yêu cầu quyền role:revoke_tokens
+    async def revoke_role_tokens(
+        role_id: Annotated[str, Path(description="ID của vai trò cần thu hồi token")],
+        role_service: RoleService = Depends(get_role_service)
+    ):
+        """
+        Thu hồi mọi access/refresh token của các người dùng có vai trò này (chỉ dành cho người có quyền 'role:revoke_tokens').
+        """
+        return await role_service.revoke_role_tokens(role_id)
+
     @router.delete("/{role_id}", status_code=status.HTTP_204_NO_CONTENT,
                 dependencies=[Depends(requires_permission("role:delete"))]) # Yêu cầu quyền role:delete
     async def delete_existing_role(
@@ -1,10 +1,17 @@
 # app/api/v1/endpoints/users.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Path
-from typing import List, Annotated
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Path, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Annotated, Literal, Optional
 
 # Import Schemas
 from app.schemas.user import UserCreate, UserUpdate, UserInResponse
+from app.schemas.pagination import Page
+
+# Import Core
+from app.core.export import EXPORT_FORMATS, gzip_stream
+from app.core.request_timing import TimedRoute
 
 # Import Services
 from app.services.user_service import UserService
@@ -18,7 +25,7 @@ from app.dependencies import (
 
 # THAY ĐỔI: Định nghĩa một hàm để trả về APIRouter
 def get_users_router() -> APIRouter:
-    router = APIRouter(prefix="/users", tags=["User Management"])
+    router = APIRouter(prefix="/users", tags=["User Management"], route_class=TimedRoute)
 
     @router.post("/", response_model=UserInResponse, status_code=status.HTTP_201_CREATED,
                  dependencies=[Depends(requires_permission("user:create"))]) # Yêu cầu quyền user:create
@@ -31,15 +38,47 @@ def get_users_router() -> APIRouter:
         """
         return await user_service.register_new_user(user_in) # Tái sử dụng logic đăng ký
 
-    @router.get("/", response_model=List[UserInResponse],
+    @router.get("/", response_model=Page[UserInResponse],
                 dependencies=[Depends(requires_permission("user:read_all"))]) # Yêu cầu quyền user:read_all
     async def read_all_users(
+        limit: Annotated[Optional[int], Query(ge=1, description="Số phần tử mỗi trang (tối đa PAGINATION_MAX_LIMIT)")] = None,
+        cursor: Annotated[Optional[str], Query(description="Giá trị next_cursor của trang trước")] = None,
+        sort_by: Annotated[Literal["_id", "created_at"], Query(description="Khóa sắp xếp")] = "_id",
+        order: Annotated[Literal["asc", "desc"], Query(description="Chiều sắp xếp")] = "asc",
+        is_active: Annotated[Optional[bool], Query(description="Lọc theo trạng thái hoạt động")] = None,
+        role_id: Annotated[Optional[str], Query(description="Lọc người dùng có vai trò này")] = None,
+        created_after: Annotated[Optional[datetime], Query(description="Chỉ lấy bản ghi tạo từ thời điểm này")] = None,
+        created_before: Annotated[Optional[datetime], Query(description="Chỉ lấy bản ghi tạo trước thời điểm này")] = None,
+        user_service: UserService = Depends(get_user_service)
+    ):
+        """
+        Lấy danh sách người dùng theo trang (chỉ dành cho người có quyền 'user:read_all').
+        Dùng `next_cursor` trong response làm `cursor` để lấy trang tiếp theo.
+        """
+        return await user_service.list_users(
+            limit, cursor, sort_by, order,
+            is_active=is_active, role_id=role_id, created_after=created_after, created_before=created_before,
+        )
+
+    # Phải khai báo trước "/{user_id}" để "export" không bị hiểu là một user_id
+    @router.get("/export", response_class=StreamingResponse,
+                dependencies=[Depends(requires_permission("user:read_all"))]) # Yêu cầu quyền user:read_all
+    async def export_users(
+        format: Annotated[Literal["ndjson", "csv"], Query(description="Định dạng export")] = "ndjson",
+        gzip: Annotated[bool, Query(description="Nén gzip (Content-Encoding: gzip)")] = False,
         user_service: UserService = Depends(get_user_service)
     ):
         """
-        Lấy danh sách tất cả người dùng (chỉ dành cho người có quyền 'user:read_all').
+        Export toàn bộ người dùng dạng stream NDJSON hoặc CSV (chỉ dành cho người có quyền 'user:read_all').
+        Dữ liệu được ghi theo từng batch nên bộ nhớ không tăng theo số lượng người dùng.
         """
-        return await user_service.get_all_users()
+        media_type, extension = EXPORT_FORMATS[format]
+        headers = {"Content-Disposition": f'attachment; filename="users.{extension}"'}
+        body = user_service.stream_users_export(format)
+        if gzip:
+            body = gzip_stream(body)
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(body, media_type=media_type, headers=headers)
 
     @router.get("/{user_id}", response_model=UserInResponse,
                 dependencies=[Depends(requires_permission("user:read_all"))]) # Yêu cầu quyền user:read_all
@@ -0,0 +1,170 @@
+# app/core/admission.py
+
+import asyncio
+import itertools
+import math
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.core.security import default_hashing_pool_size
+
+
+class AdmissionRejected(Exception):
+    """Request bị từ chối vì hàng đợi quá dài; `retry_after` là số giây client nên chờ."""
+
+    def __init__(self, class_name: str, retry_after: int):
+        super().__init__(f"Admission rejected for '{class_name}' (retry after {retry_after}s)")
+        self.class_name = class_name
+        self.retry_after = retry_after
+
+
+class AdmissionClass:
+    """
+    Một lớp endpoint tốn CPU (bcrypt):
+    - `priority`: số nhỏ hơn được cấp slot trước khi có slot trống.
+    - `max_concurrency`: số request của lớp này được chạy đồng thời.
+    - `max_wait_seconds`: ngân sách chờ; request có thời gian chờ ước lượng vượt ngân sách bị từ chối ngay,
+      request đang chờ quá ngân sách (deadline) bị bỏ khỏi hàng đợi.
+    """
+
+    def __init__(self, name: str, priority: int, max_concurrency: int, max_wait_seconds: float):
+        self.name = name
+        self.priority = priority
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+
+class _Waiter:
+    __slots__ = ("admission_class", "sequence", "future")
+
+    def __init__(self, admission_class: AdmissionClass, sequence: int, future: asyncio.Future):
+        self.admission_class = admission_class
+        self.sequence = sequence
+        self.future = future
+
+
+class AdmissionController:
+    """
+    Điều tiết các endpoint băm mật khẩu trước khi công việc được đẩy vào process pool:
+    - Tổng số slot (`capacity`) và giới hạn riêng của từng lớp.
+    - Hàng đợi có giới hạn (`max_queue`), ưu tiên theo priority rồi FIFO.
+    - Thời gian chờ ước lượng = (số request ưu tiên bằng/cao hơn đang chờ + 1) / số slot * thời gian phục vụ
+      trung bình (EWMA); vượt ngân sách của lớp thì từ chối ngay với Retry-After thay vì xếp hàng
+      một công việc mà client sẽ timeout trước khi nó chạy xong.
+    Chỉ dùng trên event loop (không cần lock).
+    """
+
+    def __init__(self, capacity: int, classes: List[AdmissionClass], max_queue: int, initial_service_seconds: float = 0.25):
+        self.capacity = max(1, capacity)
+        self.classes: Dict[str, AdmissionClass] = {c.name: c for c in classes}
+        self.max_queue = max_queue
+        self.service_seconds = initial_service_seconds # EWMA thời gian giữ slot
+        self._in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+
+    def _has_room(self, admission_class: AdmissionClass) -> bool:
+        return self._in_flight < self.capacity and admission_class.in_flight < admission_class.max_concurrency
+
+    def _grant(self, admission_class: AdmissionClass) -> None:
+        self._in_flight += 1
+        admission_class.in_flight += 1
+        admission_class.admitted += 1
+
+    def expected_wait(self, admission_class: AdmissionClass) -> float:
+        ahead = sum(1 for w in self._waiters if w.admission_class.priority <= admission_class.priority)
+        slots = min(self.capacity, admission_class.max_concurrency)
+        return (ahead + 1) / slots * self.service_seconds
+
+    def _reject(self, admission_class: AdmissionClass, expected_wait: float) -> AdmissionRejected:
+        admission_class.rejected += 1
+        return AdmissionRejected(admission_class.name, max(1, math.ceil(expected_wait)))
+
+    async def acquire(self, class_name: str) -> None:
+        """Chờ tới khi được cấp slot; raise AdmissionRejected nếu hàng đợi quá dài hoặc hết deadline."""
+        admission_class = self.classes[class_name]
+        ahead_of_me = any(w.admission_class.priority <= admission_class.priority for w in self._waiters)
+        if not ahead_of_me and self._has_room(admission_class):
+            self._grant(admission_class)
+            return
+
+        expected_wait = self.expected_wait(admission_class)
+        if expected_wait > admission_class.max_wait_seconds or len(self._waiters) >= self.max_queue:
+            raise self._reject(admission_class, expected_wait)
+
+        waiter = _Waiter(admission_class, next(self._sequence), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=admission_class.max_wait_seconds)
+        except asyncio.TimeoutError:
+            if waiter.future.done(): # Được cấp slot đúng lúc hết hạn: vẫn dùng slot đó
+                return
+            self._waiters.remove(waiter)
+            admission_class.expired += 1
+            raise self._reject(admission_class, self.expected_wait(admission_class))
+        except asyncio.CancelledError: # Client ngắt kết nối khi đang chờ
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.future.done():
+                self.release(class_name, 0.0, observe=False)
+            raise
+
+    def release(self, class_name: str, service_seconds: float, observe: bool = True) -> None:
+        """Trả slot, cập nhật EWMA thời gian phục vụ và cấp slot cho request ưu tiên nhất đang chờ."""
+        admission_class = self.classes[class_name]
+        self._in_flight -= 1
+        admission_class.in_flight -= 1
+        if observe:
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * service_seconds
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._waiters and self._in_flight < self.capacity:
+            eligible = [w for w in self._waiters if self._has_room(w.admission_class)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: (w.admission_class.priority, w.sequence))
+            self._waiters.remove(waiter)
+            self._grant(waiter.admission_class)
+            waiter.future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "service_ms": round(self.service_seconds * 1000, 3),
+            "classes": {
+                name: {"in_flight": c.in_flight, "admitted": c.admitted, "rejected": c.rejected, "expired": c.expired}
+                for name, c in self.classes.items()
+            },
+        }
+
+
+def build_admission_controller() -> AdmissionController:
+    """
+    Tạo controller theo Settings. Mặc định số slot = 2 x số process băm mật khẩu của worker này (mỗi request còn có
+    phần I/O với Mongo nên giữ pool luôn bận mà không xếp hàng quá nhiều việc trong pool).
+    Ưu tiên: đăng nhập > đổi/đặt lại mật khẩu > đăng ký; hai lớp sau chỉ được dùng một nửa số slot
+    để một đợt đăng ký hàng loạt không chiếm hết chỗ của đăng nhập.
+    """
+    capacity = settings.ADMISSION_MAX_CONCURRENCY
+    if capacity is None:
+        capacity = 2 * (settings.PASSWORD_HASH_POOL_SIZE or default_hashing_pool_size())
+    half = max(1, capacity // 2)
+    return AdmissionController(
+        capacity,
+        [
+            AdmissionClass("login", priority=0, max_concurrency=capacity, max_wait_seconds=settings.ADMISSION_LOGIN_MAX_WAIT_SECONDS),
+            AdmissionClass("password", priority=1, max_concurrency=half, max_wait_seconds=settings.ADMISSION_PASSWORD_MAX_WAIT_SECONDS),
+            AdmissionClass("register", priority=2, max_concurrency=half, max_wait_seconds=settings.ADMISSION_REGISTER_MAX_WAIT_SECONDS),
+        ],
+        max_queue=settings.ADMISSION_MAX_QUEUE,
+    )
+
+
+admission_controller = build_admission_controller()
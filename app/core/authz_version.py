@@ -0,0 +1,72 @@
+# app/core/authz_version.py
+
+import asyncio
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.repository.permissions_version import get_permissions_version_db, increment_permissions_version_db
+
+# Giá trị permissions version mà process này biết (xem app/repository/permissions_version.py).
+# Được làm mới định kỳ bởi task nền trong lifespan để kiểm tra token ở chế độ stateless
+# không cần round trip nào tới Mongo.
+class PermissionsVersionHolder:
+    current: Optional[int] = None
+    refresher_task: Optional[asyncio.Task] = None
+
+permissions_version_holder = PermissionsVersionHolder()
+
+
+def observe_permissions_version(version: int) -> None:
+    """Ghi nhận một giá trị version vừa đọc/ghi từ DB (chỉ tăng, không giảm)."""
+    if permissions_version_holder.current is None or version > permissions_version_holder.current:
+        permissions_version_holder.current = version
+
+def is_permissions_version_current(token_version: Optional[int]) -> bool:
+    """Claims trong token còn dùng được nếu version của token không cũ hơn version process đang biết."""
+    current = permissions_version_holder.current
+    return token_version is not None and current is not None and token_version >= current
+
+async def refresh_permissions_version(db: AsyncIOMotorClient) -> int:
+    """Đọc lại version từ DB."""
+    version = await get_permissions_version_db(db)
+    observe_permissions_version(version)
+    return version
+
+async def bump_permissions_version(db: AsyncIOMotorClient) -> int:
+    """Gọi sau mỗi thay đổi dữ liệu phân quyền: token phát hành trước đó sẽ bị coi là cũ."""
+    version = await increment_permissions_version_db(db)
+    observe_permissions_version(version)
+    return version
+
+async def current_permissions_version(db: AsyncIOMotorClient) -> int:
+    """Trả về version đang biết, đọc từ DB nếu process chưa biết giá trị nào."""
+    if permissions_version_holder.current is None:
+        return await refresh_permissions_version(db)
+    return permissions_version_holder.current
+
+async def _refresh_permissions_version_forever(db: AsyncIOMotorClient):
+    while True:
+        await asyncio.sleep(settings.PERMISSIONS_VERSION_REFRESH_SECONDS)
+        try:
+            await refresh_permissions_version(db)
+        except Exception as e:
+            print(f"Failed to refresh permissions version: {e}")
+
+async def start_permissions_version_refresher(db: AsyncIOMotorClient):
+    """Đọc version ban đầu và khởi động task làm mới định kỳ (chỉ cần ở chế độ stateless)."""
+    version = await refresh_permissions_version(db)
+    print(f"Stateless authorization enabled (permissions version {version}).")
+    permissions_version_holder.refresher_task = asyncio.create_task(_refresh_permissions_version_forever(db))
+
+async def stop_permissions_version_refresher():
+    """Dừng task làm mới version."""
+    task = permissions_version_holder.refresher_task
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        permissions_version_holder.refresher_task = None
@@ -0,0 +1,46 @@
+# app/core/bloom.py
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Bloom filter cho chuỗi: kiểm tra "chắc chắn không có" mà không cần giữ bản thân các phần tử.
+    - Không bao giờ có false negative; false positive xấp xỉ `error_rate` khi số phần tử <= `capacity`.
+    - Số bit và số hàm băm được tính theo công thức chuẩn: m = -n*ln(p)/ln(2)^2, k = m/n*ln(2).
+    - k vị trí bit được sinh từ một digest blake2b bằng double hashing (h1 + i*h2).
+    Không hỗ trợ xóa phần tử; khi vượt capacity cần dựng lại filter mới.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate phải nằm trong khoảng (0, 1).")
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1 # Số lẻ để các vị trí không lặp lại sớm
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._bits)
@@ -0,0 +1,121 @@
+# app/core/bookkeeping.py
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.repository.user import apply_login_bookkeeping_db
+
+
+class LoginBookkeepingBuffer:
+    """
+    Bộ đệm ghi trễ cho các cập nhật không quan trọng sau khi đăng nhập thành công (last_login_at, login_count).
+    - Các lần đăng nhập của cùng một user được gộp trong bộ nhớ: (last_login_at mới nhất, số lần đăng nhập).
+    - Task nền flush định kỳ, hoặc sớm hơn khi số user đang chờ đạt ngưỡng, bằng một bulk_write không theo thứ tự.
+    - Khi dừng (shutdown), phần còn lại được flush hết.
+    Nếu buffer chưa được khởi động (script, test), `record_login` trả về False để caller ghi trực tiếp.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Tuple[datetime, int]] = {}
+        self._db: Optional[AsyncIOMotorClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_requested = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._stopping = False
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.flushed_updates = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def record_login(self, user_id: str, at: Optional[datetime] = None) -> bool:
+        """Ghi nhận một lần đăng nhập thành công vào buffer. Trả về False nếu buffer không chạy."""
+        if not self.running:
+            return False
+        at = at or datetime.now(timezone.utc)
+        previous = self._pending.get(user_id)
+        if previous is None:
+            self._pending[user_id] = (at, 1)
+        else:
+            self._pending[user_id] = (max(previous[0], at), previous[1] + 1)
+        if len(self._pending) >= settings.BOOKKEEPING_FLUSH_MAX_PENDING:
+            self._flush_requested.set()
+        return True
+
+    async def flush(self) -> int:
+        """Ghi toàn bộ cập nhật đang chờ xuống DB. Nếu lỗi, các cập nhật được gộp lại vào buffer để thử lại."""
+        async with self._flush_lock:
+            if not self._pending or self._db is None:
+                return 0
+            batch, self._pending = self._pending, {}
+            started = time.perf_counter()
+            try:
+                await apply_login_bookkeeping_db(batch, self._db)
+            except Exception as e:
+                self.failed_flushes += 1
+                for user_id, (at, count) in batch.items():
+                    previous = self._pending.get(user_id)
+                    if previous is not None:
+                        at, count = max(previous[0], at), previous[1] + count
+                    self._pending[user_id] = (at, count)
+                print(f"Failed to flush login bookkeeping ({len(batch)} users): {e}")
+                return 0
+            self.last_flush_ms = (time.perf_counter() - started) * 1000
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            self.flushes += 1
+            self.flushed_updates += len(batch)
+            return len(batch)
+
+    async def _flush_forever(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=settings.BOOKKEEPING_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    def start(self, db: AsyncIOMotorClient) -> None:
+        self._db = db
+        self._stopping = False
+        self._flush_requested = asyncio.Event() # Gắn với event loop hiện tại
+        self._task = asyncio.create_task(self._flush_forever())
+        print("Login bookkeeping write-behind buffer started.")
+
+    async def stop(self) -> None:
+        """
+        Dừng task nền và flush phần còn lại.
+        Không cancel task để không làm gián đoạn một bulk_write đang chạy (batch đó sẽ bị mất).
+        """
+        task, self._task = self._task, None
+        if task is None:
+            return
+        pending = len(self._pending)
+        self._stopping = True
+        self._flush_requested.set()
+        await task
+        await self.flush()
+        print(f"Login bookkeeping buffer stopped ({pending} pending updates drained, {len(self._pending)} left).")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queue_depth": len(self._pending),
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flushed_updates": self.flushed_updates,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
+
+
+login_bookkeeping = LoginBookkeepingBuffer()
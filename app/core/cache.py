@@ -0,0 +1,131 @@
+# app/core/cache.py
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
+
+
+class LRUCache:
+    """
+    Cache trong process có giới hạn kích thước (LRU) và TTL, kèm bộ đếm hit/miss/eviction.
+
+    Mỗi entry chỉ là một tuple (expires_at, value) trong OrderedDict để tiết kiệm bộ nhớ.
+    `version()` trả về một số tăng dần sau mỗi lần invalidate: lấy version TRƯỚC khi đọc DB rồi truyền
+    vào `set()`, nếu trong lúc đó có invalidate thì kết quả (có thể đã cũ) sẽ không được lưu vào cache.
+    Không an toàn giữa nhiều thread; được thiết kế để dùng trên event loop.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl_seconds: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._hit_counter = CACHE_LOOKUPS.labels(name, "hit")
+        self._miss_counter = CACHE_LOOKUPS.labels(name, "miss")
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Lấy giá trị còn hạn theo key, đồng thời đánh dấu là vừa được dùng."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            self._miss_counter.inc()
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            self._miss_counter.inc()
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        self._hit_counter.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None, expires_at: Optional[float] = None) -> bool:
+        """
+        Lưu giá trị vào cache.
+        - version: version lấy trước khi đọc dữ liệu; bỏ qua nếu đã có invalidate xảy ra sau đó.
+        - expires_at: thời điểm hết hạn riêng (theo time.monotonic), mặc định là now + ttl_seconds.
+        Trả về True nếu giá trị được lưu.
+        """
+        if self.maxsize <= 0:
+            return False
+        if version is not None and version != self._version:
+            return False
+        if expires_at is None:
+            expires_at = time.monotonic() + self.ttl_seconds
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        """Xóa một entry và vô hiệu hóa các lần `set()` đang dở dang."""
+        self._version += 1
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Xóa toàn bộ cache (ví dụ khi vai trò/quyền hạn thay đổi)."""
+        self._version += 1
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+# Cache các principal (UserInResponse đã populate roles/permissions) theo user id,
+# dùng bởi get_current_user để tránh 3 round trip Mongo cho mỗi request.
+principal_cache = LRUCache(
+    "principal",
+    maxsize=settings.PRINCIPAL_CACHE_MAX_SIZE if settings.PRINCIPAL_CACHE_ENABLED else 0,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+def invalidate_principal(user_id: str) -> None:
+    """Gọi sau khi tài liệu user thay đổi hoặc bị xóa."""
+    principal_cache.invalidate(user_id)
+
+def invalidate_all_principals() -> None:
+    """Gọi sau khi vai trò hoặc quyền hạn thay đổi: không biết trước user nào bị ảnh hưởng."""
+    principal_cache.clear()
+
+
+# Cache token epoch theo user id (một số nguyên mỗi user), dùng bởi get_token_claims để so sánh với claim `tep`
+token_epoch_cache = LRUCache(
+    "token_epoch",
+    maxsize=settings.TOKEN_EPOCH_CACHE_MAX_SIZE,
+    ttl_seconds=settings.TOKEN_EPOCH_CACHE_TTL_SECONDS,
+)
+
+
+# Cache claims của access token đã xác minh, key là digest của token (xem decode_token_cached).
+# TTL chỉ áp dụng cho token không có `exp`; token có `exp` hết hạn trong cache đúng lúc hết hạn thật.
+token_cache = LRUCache(
+    "token",
+    maxsize=settings.TOKEN_CACHE_MAX_SIZE if settings.TOKEN_CACHE_ENABLED else 0,
+    ttl_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
@@ -2,7 +2,7 @@
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
-from typing import Optional
+from typing import Optional, List
 
 class Settings(BaseSettings):
     # Cấu hình để load biến môi trường từ .env file
@@ -18,10 +18,51 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256" # Thuật toán mã hóa JWT
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30 # Thời gian sống của Access Token (phút)
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7 # Thời gian sống của Refresh Token: 7 ngày (phút)
+    # Ký access/refresh token bằng khóa bất đối xứng (ES256, có kid, nhiều khóa để xoay vòng).
+    # Nếu đặt, ALGORITHM/SECRET_KEY chỉ còn dùng cho token đặt lại mật khẩu và xác minh email.
+    JWT_SIGNING_KEYS_FILE: Optional[str] = None # Đường dẫn file keyring JSON (xem app/core/keyring.py)
+    JWKS_CACHE_MAX_AGE_SECONDS: int = 300 # Cache-Control max-age của /.well-known/jwks.json
 
     MAX_FAILED_LOGIN_ATTEMPTS: int = 5 # Số lần đăng nhập sai tối đa trước khi khóa tài khoản
     LOCKOUT_DURATION_MINUTES: int = 15 # Thời gian tài khoản bị khóa sau khi đạt giới hạn (phút)
 
+    # Giới hạn tần suất đăng nhập (sliding window), kiểm tra trước mọi truy vấn DB và bcrypt
+    LOGIN_RATE_LIMIT_ENABLED: bool = True
+    LOGIN_RATE_LIMIT_BACKEND: str = "memory" # "memory" (theo process) hoặc "mongo" (dùng chung giữa các worker/node)
+    LOGIN_RATE_LIMIT_WINDOW_SECONDS: int = 60 # Độ dài cửa sổ (giây)
+    LOGIN_RATE_LIMIT_PER_IP: int = 30 # Số lần thử tối đa mỗi cửa sổ từ một địa chỉ IP
+    LOGIN_RATE_LIMIT_PER_USERNAME: int = 10 # Số lần thử tối đa mỗi cửa sổ cho một username
+    # Số proxy tin cậy đứng trước ứng dụng (router của platform = 1, xem Procfile): IP client lấy từ
+    # X-Forwarded-For ở vị trí thứ N tính từ cuối (phần client tự gửi không được tin). 0 = dùng IP kết nối.
+    TRUSTED_PROXY_HOPS: int = 0
+    TRUSTED_PROXY_IPS: List[str] = [] # IP/CIDR của proxy; rỗng = tin mọi kết nối (khi ứng dụng chỉ truy cập được qua proxy)
+    RATE_LIMIT_MEMORY_SHARDS: int = 16 # Số shard của backend "memory"
+    RATE_LIMIT_MEMORY_MAX_KEYS: int = 100000 # Số key tối đa của backend "memory" (chia đều cho các shard)
+
+    # Admission control cho các endpoint băm mật khẩu (login > đổi/đặt lại mật khẩu > đăng ký)
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENCY: Optional[int] = None # Số request băm chạy đồng thời trong mỗi worker (None = 2 x PASSWORD_HASH_POOL_SIZE)
+    ADMISSION_MAX_QUEUE: int = 200 # Số request tối đa được xếp hàng chờ slot
+    ADMISSION_LOGIN_MAX_WAIT_SECONDS: float = 2.0 # Ngân sách chờ của login/reactivate (giây), vượt quá thì 503
+    ADMISSION_PASSWORD_MAX_WAIT_SECONDS: float = 2.0 # Ngân sách chờ của change/reset password (giây)
+    ADMISSION_REGISTER_MAX_WAIT_SECONDS: float = 1.0 # Ngân sách chờ của register (giây), bị loại bỏ trước tiên
+
+    # Cấu hình process pool dùng để băm/xác minh mật khẩu (tránh chặn event loop).
+    # Mỗi worker gunicorn có pool riêng: tổng số process băm trên máy = PASSWORD_HASH_POOL_SIZE x WEB_CONCURRENCY.
+    WEB_CONCURRENCY: int = 1 # Số worker trên mỗi máy; gunicorn cũng lấy biến này làm --workers mặc định (xem Procfile)
+    PASSWORD_HASH_POOL_SIZE: Optional[int] = None # Số process băm mật khẩu của mỗi worker (None = số CPU của máy / WEB_CONCURRENCY, 0 = dùng thread pool mặc định)
+
+    # Cấu hình thuật toán băm mật khẩu (xem app/core/password_hashing.py)
+    PASSWORD_HASH_SCHEMES: List[str] = ["bcrypt"] # Thuật toán đầu tiên dùng để băm, các thuật toán sau chỉ để xác minh hash cũ
+    PASSWORD_HASH_TARGET_MS: Optional[float] = None # Nếu đặt, tự động tinh chỉnh chi phí lúc khởi động để verify mất khoảng chừng này (ms)
+    BCRYPT_ROUNDS: int = 12
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536 # KiB
+    ARGON2_PARALLELISM: int = 4
+    SCRYPT_ROUNDS: int = 16 # log2(N)
+    SCRYPT_BLOCK_SIZE: int = 8
+    SCRYPT_PARALLELISM: int = 1
+
     # Thêm cấu hình cho token đặt lại mật khẩu và xác minh email
     RESET_PASSWORD_TOKEN_EXPIRE_MINUTES: int = 15 # Thời gian sống của token đặt lại mật khẩu (phút)
     EMAIL_VERIFICATION_TOKEN_EXPIRE_MINUTES: int = 60 # Thời gian sống của token xác minh email (phút)
@@ -31,6 +72,67 @@ class Settings(BaseSettings):
     MONGODB_DB_NAME: str = Field(..., description="MongoDB database name. MUST be set in .env") # Bắt buộc phải có
     
     MONGODB_MAX_POOL_SIZE: int = 100 # Giá trị mặc định cho pool size của MongoDB driver
+    MONGODB_ENSURE_INDEXES: bool = True # Tạo index còn thiếu và báo cáo drift khi khởi động (xem app/core/indexes.py)
+    # Mongo riêng cho test suite và công cụ kiểm tra query plan (xóa/seed dữ liệu): không bao giờ dùng MONGODB_URI
+    TEST_MONGODB_URI: str = "mongodb://localhost:27017"
+
+    # Phân trang cho các endpoint danh sách (users, roles, permissions)
+    PAGINATION_DEFAULT_LIMIT: int = 50 # Số phần tử mỗi trang nếu client không truyền limit
+    PAGINATION_MAX_LIMIT: int = 200 # Số phần tử tối đa mỗi trang
+    EXPORT_BATCH_SIZE: int = 1000 # Batch size của Motor cursor và số dòng mỗi chunk khi export người dùng
+
+    # Cache principal (user + roles + permissions) trong process cho get_current_user
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000 # Số user tối đa được cache
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60 # Thời gian sống của một entry (giây)
+
+    # Cache claims của access token đã xác minh (bỏ qua kiểm tra chữ ký cho token lặp lại)
+    TOKEN_CACHE_ENABLED: bool = True
+    TOKEN_CACHE_MAX_SIZE: int = 10000 # Số token tối đa được cache; mỗi entry hết hạn đúng lúc token hết hạn
+
+    # Chế độ phân quyền stateless: access token mang roles/permissions và permissions version,
+    # requires_permission kiểm tra trực tiếp từ token và chỉ đọc DB khi version đã cũ
+    STATELESS_AUTHZ_ENABLED: bool = False
+    PERMISSIONS_VERSION_REFRESH_SECONDS: float = 5 # Chu kỳ làm mới permissions version từ DB (giây)
+
+    # Ghi trễ (write-behind) các cập nhật không quan trọng khi đăng nhập (last_login_at, login_count)
+    BOOKKEEPING_WRITE_BEHIND_ENABLED: bool = True
+    BOOKKEEPING_FLUSH_INTERVAL_SECONDS: float = 5 # Chu kỳ flush (giây)
+    BOOKKEEPING_FLUSH_MAX_PENDING: int = 1000 # Flush sớm khi số user đang chờ đạt ngưỡng này
+
+    # Refresh token xoay vòng: mỗi refresh token chỉ dùng được một lần, dùng lại sẽ thu hồi cả family.
+    # Các family bị thu hồi được giữ trong Bloom filter để kiểm tra token không cần đọc DB.
+    REFRESH_REVOCATION_SYNC_SECONDS: float = 10 # Chu kỳ nạp các family bị thu hồi ở worker khác (giây)
+    REFRESH_REVOCATION_BLOOM_CAPACITY: int = 100000 # Số family bị thu hồi tối đa trước khi dựng lại filter
+    REFRESH_REVOCATION_BLOOM_ERROR_RATE: float = 0.001 # Tỷ lệ false positive (mỗi lần là một query xác nhận)
+
+    # Token epoch theo user: token mang claim `tep`, bị từ chối khi epoch của user đã tăng
+    # (đổi/đặt lại mật khẩu, vô hiệu hóa tài khoản, thu hồi theo vai trò)
+    TOKEN_EPOCH_CACHE_MAX_SIZE: int = 100000 # Số user tối đa được cache epoch
+    TOKEN_EPOCH_CACHE_TTL_SECONDS: float = 30 # Độ trễ tối đa để thu hồi ở worker khác có hiệu lực (giây)
+
+    # Invalidation bus: đồng bộ cache trong process giữa các worker/node qua change stream
+    # (users/roles/permissions), hoặc polling permissions version và users version trên mongod standalone
+    INVALIDATION_BUS_ENABLED: bool = True
+    INVALIDATION_POLL_SECONDS: float = 2 # Chu kỳ polling khi không có change stream (giây)
+    INVALIDATION_FANOUT_MAX_USERS: int = 10000 # Vai trò có nhiều user hơn thì xóa toàn bộ principal cache
+    INVALIDATION_RESUME_TOKEN_SAVE_SECONDS: float = 5 # Khoảng cách tối thiểu giữa hai lần lưu resume token (giây)
+
+    # Token introspection (POST /auth/introspect, kiểu RFC 7662)
+    TOKEN_INTROSPECTION_MAX_TOKENS: int = 100 # Số token tối đa mỗi request
+
+    # API kiểm tra quyền hàng loạt (POST /authz/check)
+    AUTHZ_CHECK_MAX_ITEMS: int = 500 # Số cặp (subject, permission) tối đa mỗi request
+    AUTHZ_CATALOG_RELOAD_SECONDS: float = 5 # Khoảng cách tối thiểu giữa hai lần nạp lại catalog khi gặp quyền hạn lạ
+
+    # Prometheus /metrics (chạy nhiều worker: đặt PROMETHEUS_MULTIPROC_DIR, xem gunicorn.conf.py)
+    METRICS_ENABLED: bool = True # Middleware đo HTTP, listener lệnh/pool của Mongo và endpoint /metrics
+    METRICS_MAX_MONGO_COLLECTIONS: int = 50 # Số collection tối đa có nhãn riêng, các collection sau gộp vào "other"
+
+    # Đo thời gian jwt/db/hash/serialize của từng request (xem app/core/request_timing.py).
+    # DEBUG_MODE bật thêm header Server-Timing và X-DB-Roundtrips trong response.
+    SERVER_TIMING_ENABLED: bool = False
+    SLOW_REQUEST_LOG_MS: float = 500 # Request chậm hơn ngưỡng này (ms) được ghi một dòng log JSON
 
     # Email settings (Nếu có tính năng gửi email xác thực/reset mật khẩu)
     SMTP_SERVER: Optional[str] = None
@@ -2,6 +2,16 @@
 
 from motor.motor_asyncio import AsyncIOMotorClient
 from app.core.config import settings
+from app.core.security import pwd_context, init_hashing_pool, close_hashing_pool
+from app.core.password_hashing import configure_password_context
+from app.core.authz_version import start_permissions_version_refresher, stop_permissions_version_refresher
+from app.core.permission_catalog import load_permission_catalog
+from app.core.indexes import ensure_indexes, verify_unique_indexes
+from app.core.bookkeeping import login_bookkeeping
+from app.core.revocation import revoked_families
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import mongo_event_listeners
+from app.core.request_timing import request_timing_listeners
 from contextlib import asynccontextmanager # Thêm import này
 from typing import Optional
 from fastapi import FastAPI
@@ -20,7 +30,11 @@ async def init_mongo():
     """Khởi tạo kết nối MongoDB."""
     print("Initializing MongoDB client...")
     try:
-        mongo_client_holder.client = AsyncIOMotorClient(settings.MONGODB_URI, uuidRepresentation="standard")
+        mongo_client_holder.client = AsyncIOMotorClient(
+            settings.MONGODB_URI,
+            uuidRepresentation="standard",
+            event_listeners=mongo_event_listeners() + request_timing_listeners(), # /metrics và Server-Timing
+        )
         # Thử kết nối để kiểm tra
         await mongo_client_holder.client.admin.command('ping') 
         print("MongoDB client initialized successfully.")
@@ -45,5 +59,23 @@ async def get_database() -> AsyncIOMotorClient:
 @asynccontextmanager
 async def lifespan(app: FastAPI): # app: FastAPI là cần thiết cho lifespan
     await init_mongo()
+    if settings.MONGODB_ENSURE_INDEXES:
+        await ensure_indexes(await get_database())
+    await verify_unique_indexes(await get_database()) # Dừng khởi động nếu index unique bị thiếu/drift
+    configure_password_context(pwd_context) # Phải chạy trước khi tạo pool để process con nhận cấu hình đã autotune
+    await init_hashing_pool()
+    if settings.INVALIDATION_BUS_ENABLED:
+        await invalidation_bus.start(await get_database()) # Trước khi nạp catalog để không bỏ sót thay đổi
+    await load_permission_catalog(await get_database())
+    await revoked_families.start(await get_database())
+    if settings.STATELESS_AUTHZ_ENABLED:
+        await start_permissions_version_refresher(await get_database())
+    if settings.BOOKKEEPING_WRITE_BEHIND_ENABLED:
+        login_bookkeeping.start(await get_database())
     yield
+    await login_bookkeeping.stop() # Flush các cập nhật còn lại trước khi đóng kết nối Mongo
+    await stop_permissions_version_refresher()
+    await revoked_families.stop()
+    await invalidation_bus.stop()
+    close_hashing_pool()
     await close_mongo()
\ No newline at end of file
@@ -0,0 +1,76 @@
+# app/core/export.py
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List
+
+# Các trường (theo thứ tự cột CSV) của một dòng export người dùng; roles/permissions là tên, không phải ID
+USER_EXPORT_FIELDS = [
+    "id",
+    "username",
+    "email",
+    "full_name",
+    "address",
+    "phone_number",
+    "is_active",
+    "is_superuser",
+    "roles",
+    "permissions",
+    "created_at",
+    "updated_at",
+    "last_login_at",
+    "email_verified_at",
+]
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def encode_ndjson(records: List[Dict[str, Any]]) -> bytes:
+    """Mỗi bản ghi là một dòng JSON."""
+    return "".join(
+        json.dumps(record, ensure_ascii=False, default=_json_default, separators=(",", ":")) + "\n"
+        for record in records
+    ).encode("utf-8")
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return "|".join(value) # Danh sách tên vai trò/quyền hạn nằm trong một ô, phân cách bằng "|"
+    return value
+
+
+def encode_csv(records: List[Dict[str, Any]], include_header: bool = False) -> bytes:
+    """Mã hóa một nhóm bản ghi thành các dòng CSV (header chỉ ghi ở chunk đầu tiên)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(USER_EXPORT_FIELDS)
+    for record in records:
+        writer.writerow([_csv_value(record.get(field)) for field in USER_EXPORT_FIELDS])
+    return buffer.getvalue().encode("utf-8")
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Nén gzip từng chunk khi stream (wbits=31 tạo header/trailer gzip), không giữ toàn bộ dữ liệu trong bộ nhớ."""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,163 @@
+# app/core/indexes.py
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+# Các tùy chọn index được so sánh khi kiểm tra drift
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+class IndexSpec:
+    """
+    Khai báo một index của collection:
+    - `keys`: danh sách (field, direction) giống tham số của create_index.
+    - `options`: unique, sparse, expireAfterSeconds, partialFilterExpression, ...
+    Tên index mặc định theo quy ước của MongoDB ("username_1", "created_at_1__id_1", ...).
+    """
+    def __init__(self, keys: Sequence[Tuple[str, Any]], name: Optional[str] = None, **options: Any):
+        self.keys = list(keys)
+        self.name = name or "_".join(f"{field}_{direction}" for field, direction in self.keys)
+        self.options = options
+
+    def describe(self) -> str:
+        options = ", ".join(f"{key}={value}" for key, value in self.options.items())
+        return f"{self.name} {dict(self.keys)}" + (f" ({options})" if options else "")
+
+
+# Registry index theo collection; module khác có thể bổ sung bằng register_indexes()
+INDEX_REGISTRY: Dict[str, List[IndexSpec]] = {}
+
+def register_indexes(collection_name: str, *specs: IndexSpec) -> None:
+    """Khai báo thêm index cho một collection."""
+    INDEX_REGISTRY.setdefault(collection_name, []).extend(specs)
+
+register_indexes(
+    "users",
+    IndexSpec([("username", 1)], unique=True),
+    IndexSpec([("email", 1)], unique=True),
+    # Multikey: find_users_with_role/bump_token_epoch_for_role (tiền tố role_ids) và lọc role_id + keyset theo _id
+    IndexSpec([("role_ids", 1), ("_id", 1)]),
+    IndexSpec([("role_ids", 1), ("created_at", 1), ("_id", 1)]), # Lọc role_id + keyset theo created_at
+    IndexSpec([("is_active", 1), ("_id", 1)]), # Lọc is_active + keyset theo _id
+    IndexSpec([("is_active", 1), ("created_at", 1), ("_id", 1)]), # Lọc is_active + keyset theo created_at
+    IndexSpec([("created_at", 1), ("_id", 1)]), # Keyset theo created_at và lọc khoảng thời gian tạo
+)
+register_indexes(
+    "roles",
+    IndexSpec([("name", 1)], unique=True),
+    # Multikey: find_roles_with_permission (tiền tố permission_ids) và lọc permission_id + keyset theo _id
+    IndexSpec([("permission_ids", 1), ("_id", 1)]),
+    IndexSpec([("permission_ids", 1), ("created_at", 1), ("_id", 1)]), # Lọc permission_id + keyset theo created_at
+    IndexSpec([("created_at", 1), ("_id", 1)]),
+)
+register_indexes(
+    "permissions",
+    IndexSpec([("name", 1)], unique=True),
+    IndexSpec([("created_at", 1), ("_id", 1)]),
+)
+
+register_indexes(
+    "refresh_tokens",
+    IndexSpec([("expires_at", 1)], expireAfterSeconds=0), # TTL: Mongo tự xóa bản ghi khi refresh token hết hạn
+    IndexSpec([("family_id", 1)]), # Thu hồi cả family khi phát hiện dùng lại
+    IndexSpec([("revoked_at", 1)], sparse=True), # Chỉ chứa bản ghi đã bị thu hồi (nạp Bloom filter)
+)
+
+register_indexes(
+    "rate_limits",
+    IndexSpec([("expires_at", 1)], expireAfterSeconds=0), # Bộ đếm của backend "mongo" tự hết hạn
+)
+
+
+def _option_drift(spec: IndexSpec, existing: Dict[str, Any]) -> List[str]:
+    """So sánh keys và các tùy chọn quan trọng của index đã có với khai báo."""
+    problems = []
+    existing_keys = [(field, direction) for field, direction in existing.get("key", [])]
+    if existing_keys != spec.keys:
+        problems.append(f"keys {existing_keys} != {spec.keys}")
+    for option in _COMPARED_OPTIONS:
+        expected = spec.options.get(option)
+        actual = existing.get(option)
+        if option == "unique" or option == "sparse":
+            expected, actual = bool(expected), bool(actual)
+        if expected != actual:
+            problems.append(f"{option}={actual!r}, expected {expected!r}")
+    return problems
+
+
+async def ensure_indexes(db: AsyncIOMotorClient) -> Dict[str, List[str]]:
+    """
+    Tạo các index còn thiếu theo registry và báo cáo drift (gọi trong lifespan):
+    - "created": index vừa được tạo.
+    - "drift": index cùng tên nhưng khác keys/tùy chọn (không tự drop, cần xử lý thủ công).
+    - "unmanaged": index có trong DB nhưng không được khai báo.
+    - "failed": không tạo được (ví dụ dữ liệu đang trùng lặp với index unique).
+    """
+    report: Dict[str, List[str]] = {"created": [], "drift": [], "unmanaged": [], "failed": []}
+    for collection_name, specs in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        existing_indexes = await collection.index_information()
+        for spec in specs:
+            label = f"{collection_name}.{spec.name}"
+            existing = existing_indexes.get(spec.name)
+            if existing is not None:
+                problems = _option_drift(spec, existing)
+                if problems:
+                    report["drift"].append(f"{label}: {'; '.join(problems)}")
+                continue
+            try:
+                await collection.create_index(spec.keys, name=spec.name, **spec.options)
+                report["created"].append(label)
+            except OperationFailure as e:
+                report["failed"].append(f"{label}: {e}")
+        declared = {spec.name for spec in specs} | {"_id_"}
+        for name in existing_indexes:
+            if name not in declared:
+                report["unmanaged"].append(f"{collection_name}.{name}")
+
+    print(f"Indexes ensured: {len(report['created'])} created.")
+    for kind in ("drift", "unmanaged", "failed"):
+        for item in report[kind]:
+            print(f"Cảnh báo index ({kind}): {item}")
+    return report
+
+
+class MissingUniqueIndexError(RuntimeError):
+    """Index unique bắt buộc không tồn tại hoặc khác khai báo: ứng dụng không được khởi động."""
+
+
+async def verify_unique_indexes(db: AsyncIOMotorClient) -> None:
+    """
+    Kiểm tra mọi index unique trong registry đã tồn tại và khớp khai báo (gọi trong lifespan, kể cả khi
+    MONGODB_ENSURE_INDEXES tắt). Tính duy nhất của username/email, tên vai trò/quyền hạn chỉ dựa vào các
+    index này (register_new_user không kiểm tra trùng lặp trước), nên thiếu index là lỗi khởi động.
+    """
+    problems: List[str] = []
+    for collection_name, specs in INDEX_REGISTRY.items():
+        unique_specs = [spec for spec in specs if spec.options.get("unique")]
+        if not unique_specs:
+            continue
+        existing_indexes = await db[collection_name].index_information()
+        for spec in unique_specs:
+            label = f"{collection_name}.{spec.name}"
+            existing = existing_indexes.get(spec.name)
+            if existing is None:
+                problems.append(f"{label}: không tồn tại")
+                continue
+            drift = _option_drift(spec, existing)
+            if drift:
+                problems.append(f"{label}: {'; '.join(drift)}")
+    if problems:
+        raise MissingUniqueIndexError(
+            "Thiếu index unique bắt buộc (kiểm tra dữ liệu trùng lặp rồi tạo lại index): " + ", ".join(problems)
+        )
+
+
+def duplicate_key_field(error: DuplicateKeyError) -> Optional[str]:
+    """Tên trường gây trùng lặp trong DuplicateKeyError (theo keyPattern), None nếu không xác định được."""
+    key_pattern = (error.details or {}).get("keyPattern")
+    if key_pattern:
+        return next(iter(key_pattern))
+    return None
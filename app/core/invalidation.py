@@ -0,0 +1,244 @@
+# app/core/invalidation.py
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.cache import principal_cache, token_epoch_cache
+from app.core.config import settings
+from app.core.permission_catalog import permission_catalog, load_permission_catalog
+from app.repository.invalidation import (
+    get_resume_token_db,
+    save_resume_token_db,
+    clear_resume_token_db,
+    get_invalidation_versions_db,
+)
+from app.repository.permission import get_permission_by_id
+from app.repository.role import get_role_by_id, get_role_ids_with_permission
+from app.repository.user import get_user_ids_with_roles, BOOKKEEPING_USER_FIELDS
+
+WATCHED_COLLECTIONS = ("users", "roles", "permissions")
+
+# Các trường user được ghi thường xuyên nhưng không ảnh hưởng tới principal/epoch đang cache
+# (bookkeeping đăng nhập): update chỉ chạm vào các trường này không gây invalidate
+IGNORED_USER_FIELDS = BOOKKEEPING_USER_FIELDS
+
+# Resume token đã trôi khỏi oplog
+_CHANGE_STREAM_HISTORY_LOST_CODES = {286, 280}
+
+
+class InvalidationBus:
+    """
+    Đồng bộ các cache trong process (principal, token epoch, permission catalog) giữa các worker/node:
+    - Chế độ "change_stream": tail change stream của users/roles/permissions và invalidate chính xác
+      từng key; thay đổi vai trò được fan out tới các user có vai trò đó qua index role_ids,
+      thay đổi quyền hạn tới các vai trò qua index permission_ids.
+    - Chế độ "polling" (mongod standalone không có change stream): đọc permissions version và users version
+      định kỳ; permissions version đổi thì xóa toàn bộ cache và nạp lại catalog, users version đổi (token epoch,
+      profile) thì xóa principal cache và token epoch cache.
+    Resume token được lưu vào DB (có throttle) để khi task watch khởi động lại không bỏ sót sự kiện
+    và không phải xóa toàn bộ cache; chỉ khi token đã trôi khỏi oplog mới phải flush toàn bộ.
+    """
+
+    def __init__(self):
+        self.mode: Optional[str] = None
+        self._db: Optional[AsyncIOMotorClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stream_ready: Optional[asyncio.Future] = None
+        self._resume_token: Optional[Dict[str, Any]] = None
+        self._resume_token_saved_at = 0.0
+        self._resume_token_dirty = False
+        self._polled_versions: Optional[Tuple[int, int]] = None
+        self.events = 0
+        self.invalidated_keys = 0
+        self.full_flushes = 0
+        self.errors = 0
+
+    # --- Áp dụng invalidation ---
+
+    def _invalidate_users(self, user_ids: List[str]) -> None:
+        for user_id in user_ids:
+            principal_cache.invalidate(user_id)
+            token_epoch_cache.invalidate(user_id)
+        self.invalidated_keys += len(user_ids)
+
+    async def _fan_out_roles(self, role_ids: List[str]) -> None:
+        """Invalidate principal của các user có vai trò bị thay đổi; quá nhiều thì xóa toàn bộ."""
+        if not role_ids:
+            return
+        limit = settings.INVALIDATION_FANOUT_MAX_USERS
+        user_ids = await get_user_ids_with_roles(role_ids, self._db, limit)
+        if len(user_ids) > limit:
+            principal_cache.clear()
+            self.full_flushes += 1
+        else:
+            self._invalidate_users(user_ids)
+
+    def flush_users(self) -> None:
+        """Xóa principal cache và token epoch cache (không biết user nào đã thay đổi)."""
+        principal_cache.clear()
+        token_epoch_cache.clear()
+        self.full_flushes += 1
+
+    async def flush_all(self) -> None:
+        """Xóa toàn bộ cache và nạp lại catalog (khi không biết chính xác cái gì đã thay đổi)."""
+        principal_cache.clear()
+        token_epoch_cache.clear()
+        await load_permission_catalog(self._db)
+        self.full_flushes += 1
+
+    async def handle_change(self, change: Dict[str, Any]) -> None:
+        """Áp dụng một sự kiện change stream (insert/update/replace/delete) vào các cache."""
+        self.events += 1
+        collection = change.get("ns", {}).get("coll")
+        operation = change.get("operationType")
+        document_key = change.get("documentKey") or {}
+        if "_id" not in document_key:
+            if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+                await self.flush_all()
+            return
+        document_id = str(document_key["_id"])
+
+        if collection == "users":
+            if operation == "insert":
+                return
+            if operation == "update":
+                description = change.get("updateDescription") or {}
+                changed_fields = set(description.get("updatedFields") or {}) | set(description.get("removedFields") or [])
+                if changed_fields and changed_fields <= IGNORED_USER_FIELDS:
+                    return
+            self._invalidate_users([document_id])
+
+        elif collection == "roles":
+            role = await get_role_by_id(document_id, self._db)
+            if role is None:
+                permission_catalog.remove_role(document_id)
+            else:
+                permission_catalog.upsert_role(document_id, role.permission_ids)
+            if operation != "insert": # Vai trò mới chưa được gán cho ai
+                await self._fan_out_roles([document_id])
+
+        elif collection == "permissions":
+            permission = await get_permission_by_id(document_id, self._db)
+            if permission is None:
+                permission_catalog.remove_permission(document_id)
+            else:
+                permission_catalog.upsert_permission(document_id, permission.name)
+            if operation != "insert":
+                await self._fan_out_roles(await get_role_ids_with_permission(document_id, self._db))
+
+    # --- Change stream ---
+
+    async def _save_resume_token(self, force: bool = False) -> None:
+        if not self._resume_token_dirty or self._resume_token is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._resume_token_saved_at < settings.INVALIDATION_RESUME_TOKEN_SAVE_SECONDS:
+            return
+        await save_resume_token_db(self._resume_token, self._db)
+        self._resume_token_saved_at = now
+        self._resume_token_dirty = False
+
+    async def _watch_forever(self) -> None:
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+        while True:
+            try:
+                async with self._db.watch(pipeline, resume_after=self._resume_token, max_await_time_ms=1000) as stream:
+                    while stream.alive:
+                        change = await stream.try_next()
+                        if not self._stream_ready.done(): # Lần try_next đầu tiên mới thực sự mở stream
+                            self._stream_ready.set_result("change_stream")
+                        if change is not None:
+                            await self.handle_change(change)
+                        # Resume token tiến lên cả khi không có sự kiện (post-batch resume token)
+                        if stream.resume_token is not None and stream.resume_token != self._resume_token:
+                            self._resume_token = stream.resume_token
+                            self._resume_token_dirty = True
+                        await self._save_resume_token()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                code = getattr(e, "code", None)
+                if code in _CHANGE_STREAM_HISTORY_LOST_CODES and self._resume_token is not None:
+                    # Không thể tiếp tục từ token đã lưu: bắt đầu lại từ hiện tại
+                    self._resume_token = None
+                    await clear_resume_token_db(self._db)
+                    if self._stream_ready.done():
+                        print("Invalidation bus: resume token is no longer in the oplog, flushing all caches.")
+                        await self.flush_all()
+                    continue
+                if not self._stream_ready.done():
+                    # Standalone mongod (code 40573), thiếu quyền changeStream, driver/mock không hỗ trợ...
+                    print(f"Invalidation bus: change streams unavailable ({e}), falling back to polling.")
+                    self._stream_ready.set_result("polling")
+                    return
+                self.errors += 1
+                print(f"Invalidation bus: change stream error, resuming: {e}")
+                await asyncio.sleep(1)
+
+    # --- Polling (standalone mongod) ---
+
+    async def poll_once(self) -> None:
+        """Đọc permissions version và users version, áp dụng invalidation nếu version nào đã đổi."""
+        versions = await get_invalidation_versions_db(self._db)
+        if self._polled_versions is not None and versions != self._polled_versions:
+            self.events += 1
+            if versions[0] != self._polled_versions[0]:
+                await self.flush_all()
+            else:
+                self.flush_users()
+        self._polled_versions = versions
+
+    async def _poll_forever(self) -> None:
+        while True:
+            await asyncio.sleep(settings.INVALIDATION_POLL_SECONDS)
+            try:
+                await self.poll_once()
+            except Exception as e:
+                self.errors += 1
+                print(f"Invalidation bus: failed to poll versions: {e}")
+
+    # --- Vòng đời ---
+
+    async def start(self, db: AsyncIOMotorClient) -> None:
+        """
+        Mở change stream (tiếp tục từ resume token đã lưu nếu có); nếu không được hỗ trợ thì chuyển sang polling.
+        Gọi TRƯỚC khi nạp permission catalog để không bỏ sót thay đổi xảy ra trong lúc nạp.
+        """
+        self._db = db
+        self._resume_token = await get_resume_token_db(db)
+        self._stream_ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._watch_forever())
+        self.mode = await self._stream_ready
+        if self.mode == "polling":
+            self._polled_versions = await get_invalidation_versions_db(db)
+            self._task = asyncio.create_task(self._poll_forever())
+        print(f"Cache invalidation bus started ({self.mode}{', resumed' if self._resume_token else ''}).")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.mode == "change_stream":
+            try:
+                await self._save_resume_token(force=True)
+            except Exception as e:
+                print(f"Invalidation bus: failed to save resume token: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "events": self.events,
+            "invalidated_keys": self.invalidated_keys,
+            "full_flushes": self.full_flushes,
+            "errors": self.errors,
+        }
+
+
+invalidation_bus = InvalidationBus()
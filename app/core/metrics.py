@@ -0,0 +1,166 @@
+# app/core/metrics.py
+
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+
+from app.core.config import settings
+
+# Chạy nhiều worker (gunicorn): đặt biến môi trường PROMETHEUS_MULTIPROC_DIR trỏ tới một thư mục rỗng
+# TRƯỚC khi worker import app (xem gunicorn.conf.py); mỗi process ghi giá trị vào file mmap riêng
+# và /metrics gộp lại từ thư mục đó nên scrape vào worker nào cũng thấy số liệu của cả service.
+MULTIPROCESS_MODE = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# Các nhãn đều lấy từ tập giá trị hữu hạn (route template, tên lệnh trong danh sách dưới đây...) để số series không tăng theo dữ liệu
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+_HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Thời gian xử lý HTTP request theo route template và status.",
+    ["method", "route", "status"],
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "Thời gian thực thi lệnh Mongo theo collection và lệnh.",
+    ["collection", "command", "outcome"], buckets=_FAST_BUCKETS,
+)
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongo_pool_checkout_wait_seconds", "Thời gian chờ lấy connection từ pool của driver.",
+    ["outcome"], buckets=_FAST_BUCKETS,
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds", "Thời gian băm/xác minh mật khẩu (gồm cả thời gian chờ trong process pool).",
+    ["operation"], buckets=_HASH_BUCKETS,
+)
+JWT_DURATION = Histogram(
+    "jwt_duration_seconds", "Thời gian ký/xác minh JWT (không tính các lần đọc từ token cache).",
+    ["operation"], buckets=_FAST_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Số lần tra cứu các cache trong process; hit ratio = hit / (hit + miss).",
+    ["cache", "result"],
+)
+
+# Lệnh Mongo được ghi nhãn riêng; các lệnh khác (handshake, auth, lệnh quản trị...) gộp vào "other"
+TRACKED_COMMANDS = {
+    "find", "getMore", "insert", "update", "delete", "findAndModify", "aggregate",
+    "count", "countDocuments", "distinct", "createIndexes", "listIndexes", "ping",
+}
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    Ghi thời gian mỗi lệnh Mongo (duration do driver đo) vào histogram theo collection/lệnh.
+    Collection chỉ có trong sự kiện started nên được giữ tạm theo (connection_id, request_id)
+    tới khi nhận sự kiện succeeded/failed. Callback chạy trên thread của driver.
+    """
+
+    def __init__(self, max_collections: int):
+        self._pending: Dict[Tuple[Any, int], Tuple[str, str]] = {}
+        self._collections: set = set()
+        self._max_collections = max_collections
+        self._lock = threading.Lock()
+
+    def _collection_label(self, event: monitoring.CommandStartedEvent) -> str:
+        command = event.command
+        name = command.get("collection") if event.command_name == "getMore" else command.get(event.command_name)
+        if not isinstance(name, str):
+            return ""
+        with self._lock:
+            if name in self._collections:
+                return name
+            if len(self._collections) < self._max_collections:
+                self._collections.add(name)
+                return name
+        return "other"
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if event.command_name in TRACKED_COMMANDS:
+            labels = (self._collection_label(event), event.command_name)
+        else:
+            labels = ("", "other")
+        self._pending[(event.connection_id, event.request_id)] = labels
+
+    def _finish(self, event, outcome: str) -> None:
+        labels = self._pending.pop((event.connection_id, event.request_id), None)
+        if labels is not None:
+            MONGO_COMMAND_DURATION.labels(labels[0], labels[1], outcome).observe(event.duration_micros / 1_000_000)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, "ok")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, "error")
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Ghi thời gian chờ checkout connection (pool cạn sẽ thể hiện ở đây trước khi thấy ở latency của lệnh)."""
+
+    def connection_checked_out(self, event: monitoring.ConnectionCheckedOutEvent) -> None:
+        MONGO_POOL_CHECKOUT_WAIT.labels("ok").observe(event.duration)
+
+    def connection_check_out_failed(self, event: monitoring.ConnectionCheckOutFailedEvent) -> None:
+        MONGO_POOL_CHECKOUT_WAIT.labels(event.reason).observe(event.duration)
+
+    # Các sự kiện còn lại không cần ghi nhận
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_check_out_started(self, event): pass
+    def connection_checked_in(self, event): pass
+
+
+def mongo_event_listeners() -> list:
+    """Listener truyền vào AsyncIOMotorClient(event_listeners=...) trong init_mongo."""
+    if not settings.METRICS_ENABLED:
+        return []
+    return [MongoCommandMetrics(settings.METRICS_MAX_MONGO_COLLECTIONS), MongoPoolMetrics()]
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware đo thời gian mỗi HTTP request. Nhãn route là path template của APIRoute
+    (ví dụ /api/v1/users/{user_id}) do router của FastAPI gắn vào scope; request không khớp route nào
+    được gộp thành "unmatched" để path tùy ý của client không tạo series mới.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Nội dung text exposition cho /metrics (gộp mọi worker nếu chạy multiprocess)."""
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
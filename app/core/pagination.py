@@ -0,0 +1,116 @@
+# app/core/pagination.py
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.core.config import settings
+
+# Các trường được phép dùng làm khóa sắp xếp (keyset); `_id` luôn là khóa phụ để thứ tự là duy nhất
+SORT_FIELDS = ("_id", "created_at")
+SORT_ORDERS = ("asc", "desc")
+
+
+class InvalidCursorError(ValueError):
+    """Cursor không giải mã được hoặc không khớp với cách sắp xếp của request."""
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    """Giới hạn số phần tử mỗi trang trong khoảng [1, PAGINATION_MAX_LIMIT]."""
+    if limit is None:
+        limit = settings.PAGINATION_DEFAULT_LIMIT
+    return max(1, min(limit, settings.PAGINATION_MAX_LIMIT))
+
+
+def encode_cursor(sort_by: str, order: str, doc: Dict[str, Any]) -> str:
+    """
+    Tạo cursor "mờ" (opaque) từ tài liệu cuối cùng của trang: base64 của JSON chứa
+    khóa sắp xếp, chiều sắp xếp, giá trị khóa và `_id` của tài liệu đó.
+    """
+    value = doc.get(sort_by)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, ObjectId):
+        value = str(value)
+    payload = {"s": sort_by, "o": order, "v": value, "id": str(doc["_id"])}
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, order: str) -> Tuple[Any, ObjectId]:
+    """Giải mã cursor, trả về (giá trị khóa sắp xếp, ObjectId). Raise InvalidCursorError nếu không hợp lệ."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        last_id = ObjectId(payload["id"])
+        value = payload["v"]
+        if payload["s"] != sort_by or payload["o"] != order:
+            raise InvalidCursorError("Cursor không khớp với cách sắp xếp hiện tại.")
+        if sort_by == "_id":
+            value = last_id
+        elif sort_by == "created_at":
+            value = datetime.fromisoformat(value)
+    except InvalidCursorError:
+        raise
+    except Exception as e:
+        raise InvalidCursorError("Cursor phân trang không hợp lệ.") from e
+    return value, last_id
+
+
+def keyset_filter(sort_by: str, order: str, cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    Điều kiện "sau cursor" cho keyset pagination:
+    - sort theo _id: {_id: {$gt: last_id}}
+    - sort theo created_at: (created_at > v) OR (created_at == v AND _id > last_id)
+    """
+    if not cursor:
+        return {}
+    value, last_id = decode_cursor(cursor, sort_by, order)
+    op = "$gt" if order == "asc" else "$lt"
+    if sort_by == "_id":
+        return {"_id": {op: last_id}}
+    return {"$or": [{sort_by: {op: value}}, {sort_by: value, "_id": {op: last_id}}]}
+
+
+def created_range_filter(created_after: Optional[datetime], created_before: Optional[datetime]) -> Dict[str, Any]:
+    """Lọc theo khoảng thời gian tạo [created_after, created_before)."""
+    created_range: Dict[str, Any] = {}
+    if created_after is not None:
+        created_range["$gte"] = created_after
+    if created_before is not None:
+        created_range["$lt"] = created_before
+    return {"created_at": created_range} if created_range else {}
+
+
+async def paginate(
+    collection: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_by: str = "_id",
+    order: str = "asc",
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Đọc một trang tài liệu bằng keyset pagination (không dùng skip).
+    Đọc dư một phần tử để biết còn trang sau hay không; trả về (docs, next_cursor).
+    """
+    if sort_by not in SORT_FIELDS:
+        raise InvalidCursorError(f"Không thể sắp xếp theo '{sort_by}'.")
+    if order not in SORT_ORDERS:
+        raise InvalidCursorError(f"Chiều sắp xếp '{order}' không hợp lệ.")
+    conditions = [c for c in (query, keyset_filter(sort_by, order, cursor)) if c]
+    full_query: Dict[str, Any] = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+
+    direction = 1 if order == "asc" else -1
+    sort = [(sort_by, direction)] if sort_by == "_id" else [(sort_by, direction), ("_id", direction)]
+    docs = await collection.find(full_query).sort(sort).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(sort_by, order, docs[-1])
+    return docs, next_cursor
@@ -0,0 +1,161 @@
+# app/core/password_hashing.py
+
+import time
+from typing import Callable, Dict, Any, List, Optional, Iterable
+
+from passlib.context import CryptContext
+from passlib.registry import get_crypt_handler
+
+from app.core.config import settings
+
+
+class HasherSpec:
+    """
+    Mô tả một thuật toán băm mật khẩu trong registry:
+    - `options_from_settings`: các tham số lấy từ Settings (rounds, memory_cost, ...).
+    - `rounds_candidates`: các giá trị chi phí (`rounds` của passlib) được thử khi tự động tinh chỉnh.
+    - `install_hint`: gợi ý cài đặt nếu backend của thuật toán chưa có.
+    """
+    def __init__(
+        self,
+        scheme: str,
+        options_from_settings: Callable[[], Dict[str, Any]],
+        rounds_candidates: Iterable[int],
+        install_hint: Optional[str] = None,
+    ):
+        self.scheme = scheme
+        self.options_from_settings = options_from_settings
+        self.rounds_candidates = list(rounds_candidates)
+        self.install_hint = install_hint
+
+
+HASHER_REGISTRY: Dict[str, HasherSpec] = {}
+
+def register_hasher(spec: HasherSpec) -> None:
+    """Đăng ký (hoặc ghi đè) một thuật toán băm trong registry."""
+    HASHER_REGISTRY[spec.scheme] = spec
+
+register_hasher(HasherSpec(
+    scheme="bcrypt",
+    options_from_settings=lambda: {"rounds": settings.BCRYPT_ROUNDS},
+    rounds_candidates=range(10, 17),
+))
+register_hasher(HasherSpec(
+    scheme="argon2",
+    # passlib dùng `rounds` làm alias cho time_cost của argon2
+    options_from_settings=lambda: {
+        "rounds": settings.ARGON2_TIME_COST,
+        "memory_cost": settings.ARGON2_MEMORY_COST,
+        "parallelism": settings.ARGON2_PARALLELISM,
+    },
+    rounds_candidates=range(1, 11),
+    install_hint="pip install argon2-cffi",
+))
+register_hasher(HasherSpec(
+    scheme="scrypt",
+    # `rounds` của scrypt là log2(N)
+    options_from_settings=lambda: {
+        "rounds": settings.SCRYPT_ROUNDS,
+        "block_size": settings.SCRYPT_BLOCK_SIZE,
+        "parallelism": settings.SCRYPT_PARALLELISM,
+    },
+    rounds_candidates=range(12, 19),
+))
+
+
+def _get_spec(scheme: str) -> HasherSpec:
+    spec = HASHER_REGISTRY.get(scheme)
+    if spec is None:
+        raise ValueError(
+            f"Thuật toán băm mật khẩu '{scheme}' không được hỗ trợ. "
+            f"Các thuật toán có sẵn: {', '.join(sorted(HASHER_REGISTRY))}."
+        )
+    if not get_crypt_handler(scheme).has_backend():
+        hint = f" ({spec.install_hint})" if spec.install_hint else ""
+        raise RuntimeError(f"Thiếu backend cho thuật toán băm mật khẩu '{scheme}'{hint}.")
+    return spec
+
+
+def build_crypt_context_kwargs(
+    schemes: Optional[List[str]] = None,
+    rounds_overrides: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    """
+    Tạo tham số cho CryptContext từ Settings.
+    - Thuật toán đầu tiên trong danh sách được dùng để băm mật khẩu mới.
+    - Các thuật toán còn lại chỉ dùng để xác minh hash cũ và bị đánh dấu deprecated,
+      nên `needs_update` sẽ trả về True để rehash sau khi đăng nhập thành công.
+    - Hash của thuật toán chính có chi phí thấp hơn cấu hình cũng bị coi là cần cập nhật (min_rounds).
+    """
+    schemes = schemes or settings.PASSWORD_HASH_SCHEMES
+    rounds_overrides = rounds_overrides or {}
+    kwargs: Dict[str, Any] = {"schemes": list(schemes), "deprecated": "auto"}
+    for scheme in schemes:
+        options = _get_spec(scheme).options_from_settings()
+        if scheme in rounds_overrides:
+            options["rounds"] = rounds_overrides[scheme]
+        for key, value in options.items():
+            kwargs[f"{scheme}__{key}"] = value
+    primary = schemes[0]
+    kwargs[f"{primary}__min_rounds"] = kwargs[f"{primary}__rounds"]
+    return kwargs
+
+
+def measure_verify_ms(context: CryptContext, samples: int = 3) -> float:
+    """Đo thời gian verify (ms, lấy giá trị nhỏ nhất của nhiều lần đo) với cấu hình của context."""
+    hashed = context.hash("autotune-benchmark-password")
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.verify("autotune-benchmark-password", hashed)
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def autotune_rounds(scheme: str, target_ms: float) -> int:
+    """
+    Chọn giá trị `rounds` lớn nhất của thuật toán mà thời gian verify vẫn không vượt quá target_ms.
+    Chi phí tăng đơn điệu theo rounds nên dừng ngay khi vượt ngưỡng.
+    Luôn trả về ít nhất ứng viên nhỏ nhất trong registry.
+    """
+    spec = _get_spec(scheme)
+    chosen = spec.rounds_candidates[0]
+    for rounds in spec.rounds_candidates:
+        context = CryptContext(**build_crypt_context_kwargs([scheme], {scheme: rounds}))
+        elapsed_ms = measure_verify_ms(context)
+        print(f"  {scheme} rounds={rounds}: verify {elapsed_ms:.1f}ms")
+        if elapsed_ms > target_ms:
+            break
+        chosen = rounds
+    return chosen
+
+
+def configure_password_context(context: CryptContext) -> None:
+    """
+    Nạp lại cấu hình cho CryptContext dùng chung (gọi trong lifespan, trước khi tạo process pool).
+    Nếu PASSWORD_HASH_TARGET_MS được đặt, chi phí của thuật toán chính được tự động tinh chỉnh
+    để thời gian verify xấp xỉ mục tiêu trên máy hiện tại.
+    """
+    rounds_overrides: Dict[str, int] = {}
+    primary = settings.PASSWORD_HASH_SCHEMES[0]
+    if settings.PASSWORD_HASH_TARGET_MS:
+        print(f"Autotuning {primary} cost for a {settings.PASSWORD_HASH_TARGET_MS}ms verify target...")
+        rounds_overrides[primary] = autotune_rounds(primary, settings.PASSWORD_HASH_TARGET_MS)
+        print(f"Selected {primary} rounds={rounds_overrides[primary]}.")
+    context.load(build_crypt_context_kwargs(rounds_overrides=rounds_overrides))
+
+
+def describe_hash(context: CryptContext, hashed_password: str) -> str:
+    """Mô tả ngắn gọn thuật toán và chi phí của một hash, dùng cho báo cáo phân bố hash."""
+    try:
+        scheme = context.identify(hashed_password)
+    except ValueError:
+        scheme = None
+    if scheme is None:
+        return "unknown"
+    parsed = get_crypt_handler(scheme).from_string(hashed_password)
+    if scheme == "argon2":
+        return f"argon2 t={parsed.rounds} m={parsed.memory_cost} p={parsed.parallelism}"
+    if scheme == "scrypt":
+        return f"scrypt ln={parsed.rounds} r={parsed.block_size} p={parsed.parallelism}"
+    return f"{scheme} rounds={parsed.rounds}"
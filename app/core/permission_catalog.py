@@ -0,0 +1,159 @@
+# app/core/permission_catalog.py
+
+from typing import Dict, Iterable, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.repository.permission import get_all_permissions_db
+from app.repository.role import get_all_roles_db
+
+
+class PermissionCatalog:
+    """
+    Danh mục quyền hạn trong process, biên dịch quyền hạn thành bitmask:
+    - Mỗi permission id được gán một chỉ số bit cố định khi lần đầu gặp (không tái sử dụng khi bị xóa),
+      nên đổi tên quyền hạn không làm thay đổi các mask đã tính.
+    - Mỗi vai trò được tính sẵn thành một số nguyên là OR các bit quyền hạn của nó.
+    - Quyền hiệu lực của người dùng là OR mask các vai trò, mỗi lần kiểm tra chỉ là một phép AND.
+    `generation` tăng sau mỗi thay đổi để các dependency có thể cache mask yêu cầu đã biên dịch.
+    """
+
+    def __init__(self):
+        self._bit_by_permission_id: Dict[str, int] = {}
+        self._permission_name_by_id: Dict[str, str] = {}
+        self._bit_by_name: Dict[str, int] = {}
+        self._role_permission_ids: Dict[str, List[str]] = {}
+        self._role_masks: Dict[str, int] = {}
+        self._next_index = 0
+        self.generation = 0
+
+    def load(self, permissions: Iterable, roles: Iterable) -> None:
+        """Nạp toàn bộ quyền hạn và vai trò (PermissionDBModel/RoleDBModel)."""
+        for permission in permissions:
+            self.upsert_permission(str(permission.id), permission.name)
+        for role in roles:
+            self.upsert_role(str(role.id), role.permission_ids)
+
+    # --- Cập nhật tăng dần khi PermissionService/RoleService thay đổi dữ liệu ---
+
+    def upsert_permission(self, permission_id: str, name: str) -> None:
+        """Thêm quyền hạn mới hoặc cập nhật tên (giữ nguyên bit)."""
+        bit = self._bit_by_permission_id.get(permission_id)
+        if bit is None:
+            bit = 1 << self._next_index
+            self._next_index += 1
+            self._bit_by_permission_id[permission_id] = bit
+            # Vai trò đã tham chiếu permission id này trước khi nó được biết (dữ liệu nạp không theo thứ tự)
+            for role_id, permission_ids in self._role_permission_ids.items():
+                if permission_id in permission_ids:
+                    self._role_masks[role_id] |= bit
+        old_name = self._permission_name_by_id.get(permission_id)
+        if old_name is not None and old_name != name:
+            self._bit_by_name.pop(old_name, None)
+        self._permission_name_by_id[permission_id] = name
+        self._bit_by_name[name] = bit
+        self.generation += 1
+
+    def remove_permission(self, permission_id: str) -> None:
+        """Xóa quyền hạn: bit bị bỏ khỏi mọi vai trò và không được cấp lại."""
+        bit = self._bit_by_permission_id.pop(permission_id, None)
+        name = self._permission_name_by_id.pop(permission_id, None)
+        if name is not None:
+            self._bit_by_name.pop(name, None)
+        if bit is not None:
+            for role_id in self._role_masks:
+                self._role_masks[role_id] &= ~bit
+        self.generation += 1
+
+    def upsert_role(self, role_id: str, permission_ids: List[str]) -> None:
+        """Tính lại mask của một vai trò từ danh sách permission id."""
+        self._role_permission_ids[role_id] = list(permission_ids)
+        mask = 0
+        for permission_id in permission_ids:
+            mask |= self._bit_by_permission_id.get(permission_id, 0)
+        self._role_masks[role_id] = mask
+        self.generation += 1
+
+    def remove_role(self, role_id: str) -> None:
+        self._role_permission_ids.pop(role_id, None)
+        self._role_masks.pop(role_id, None)
+        self.generation += 1
+
+    def retain(self, permission_ids: Iterable[str], role_ids: Iterable[str]) -> None:
+        """Bỏ các quyền hạn/vai trò không còn trong DB (sau khi nạp lại toàn bộ)."""
+        permission_ids, role_ids = set(permission_ids), set(role_ids)
+        for permission_id in [pid for pid in self._bit_by_permission_id if pid not in permission_ids]:
+            self.remove_permission(permission_id)
+        for role_id in [rid for rid in self._role_masks if rid not in role_ids]:
+            self.remove_role(role_id)
+
+    # --- Truy vấn ---
+
+    def bit_for(self, permission_name: str) -> Optional[int]:
+        return self._bit_by_name.get(permission_name)
+
+    def mask_for_roles(self, role_ids: Iterable[str]) -> int:
+        """Quyền hiệu lực của người dùng: OR mask các vai trò."""
+        mask = 0
+        for role_id in role_ids:
+            mask |= self._role_masks.get(role_id, 0)
+        return mask
+
+    def mask_for_names(self, permission_names: Iterable[str]) -> int:
+        """Mask từ danh sách tên quyền hạn (tên chưa biết bị bỏ qua)."""
+        mask = 0
+        for name in permission_names:
+            mask |= self._bit_by_name.get(name, 0)
+        return mask
+
+    def required_mask(self, permission_names: Iterable[str]) -> Optional[int]:
+        """Mask của các quyền được yêu cầu; None nếu có tên chưa có trong catalog."""
+        mask = 0
+        for name in permission_names:
+            bit = self._bit_by_name.get(name)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+
+permission_catalog = PermissionCatalog()
+
+async def load_permission_catalog(db: AsyncIOMotorClient) -> None:
+    """Nạp catalog từ DB (gọi trong lifespan)."""
+    permissions = await get_all_permissions_db(db)
+    roles = await get_all_roles_db(db)
+    permission_catalog.load(permissions, roles)
+    permission_catalog.retain((str(p.id) for p in permissions), (str(r.id) for r in roles))
+    print(f"Permission catalog loaded: {len(permissions)} permissions, {len(roles)} roles.")
+
+
+def principal_permission_mask(principal) -> int:
+    """
+    Mask quyền hiệu lực của principal (UserInResponse hoặc TokenData).
+    UserInResponse mang sẵn mask được tính lúc populate; principal dựng từ token thì tính theo tên.
+    """
+    mask = getattr(principal, "_permission_mask", None)
+    if mask is None:
+        mask = permission_catalog.mask_for_names(principal.permissions)
+    return mask
+
+def principal_has_permissions(principal, permission_names: List[str], require_all: bool = True, required_mask: Optional[int] = None) -> bool:
+    """
+    Kiểm tra principal có tất cả (require_all) hoặc ít nhất một quyền trong danh sách.
+    Superuser luôn được phép. Nếu có tên quyền chưa có trong catalog (ví dụ vừa được tạo ở worker khác),
+    fallback về kiểm tra theo danh sách tên.
+    """
+    if principal.is_superuser:
+        return True
+    if required_mask is None:
+        required_mask = permission_catalog.required_mask(permission_names)
+    if required_mask is None:
+        granted = set(principal.permissions)
+        if require_all:
+            return all(name in granted for name in permission_names)
+        return any(name in granted for name in permission_names)
+    mask = principal_permission_mask(principal)
+    if require_all:
+        return mask & required_mask == required_mask
+    return mask & required_mask != 0
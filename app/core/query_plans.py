@@ -0,0 +1,318 @@
+# app/core/query_plans.py
+
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId, json_util
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import OperationFailure
+
+from app.core.config import settings
+from app.core.indexes import ensure_indexes
+
+# Các trường của command được giữ lại để explain (bỏ lsid, $db, $clusterTime, batchSize, ...)
+EXPLAIN_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "find": ("filter", "sort", "projection", "limit", "skip", "hint", "collation"),
+    "aggregate": ("pipeline", "hint", "collation"),
+    "count": ("query", "limit", "skip", "hint", "collation"),
+    "distinct": ("key", "query", "collation"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+    "findAndModify": ("query", "sort", "update", "remove", "fields", "upsert", "new", "hint", "collation"),
+}
+
+# Giá trị sort/projection được giữ nguyên trong shape (hướng sort ảnh hưởng tới việc chọn index)
+_VERBATIM_KEYS = {"sort", "$sort", "projection", "fields", "$project", "key"}
+
+# Tỷ lệ tài liệu đọc / tài liệu trả về tối đa trước khi bị báo cáo
+DEFAULT_MAX_EXAMINED_RATIO = 10.0
+
+_IGNORED_DATABASES = {"admin", "config", "local"}
+
+
+def _shape(value: Any) -> Any:
+    """Thay mọi giá trị bằng "?", giữ nguyên tên trường và toán tử ($in, $gte, $lookup...)."""
+    if isinstance(value, dict):
+        return {key: value[key] if key in _VERBATIM_KEYS else _shape(value[key]) for key in value}
+    if isinstance(value, (list, tuple)):
+        if all(not isinstance(item, (dict, list, tuple)) for item in value):
+            return ["?"] if value else [] # $in: [a, b, c] và $in: [a] cùng một shape
+        return [_shape(item) for item in value]
+    return "?"
+
+def _explain_body(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: command[field] for field in EXPLAIN_FIELDS[command_name] if field in command}
+
+
+class QueryShape:
+    """
+    Một dạng truy vấn (collection + lệnh + cấu trúc filter/sort/pipeline không kèm giá trị).
+    `example` là thân lệnh thật đầu tiên gặp, dùng để chạy explain.
+    """
+    def __init__(self, collection: str, command: str, example: Dict[str, Any]):
+        self.collection = collection
+        self.command = command
+        self.example = example
+        self.count = 1
+
+    @property
+    def key(self) -> str:
+        return f"{self.collection} {self.command} {json.dumps(_shape(self.example), sort_keys=True)}"
+
+    def is_full_scan_by_design(self) -> bool:
+        """Lệnh không lọc và không sắp xếp (export, get_all_*, dọn dữ liệu): COLLSCAN là chủ ý."""
+        if self.command == "find":
+            return not self.example.get("filter") and not self.example.get("sort")
+        if self.command in ("update", "delete"):
+            statements = self.example.get(f"{self.command}s") or [{}]
+            return not statements[0].get("q")
+        if self.command == "aggregate":
+            pipeline = self.example.get("pipeline") or []
+            return not any(stage.get("$match") or "$sort" in stage for stage in pipeline)
+        if self.command == "count":
+            return not self.example.get("query")
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"collection": self.collection, "command": self.command, "example": self.example, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QueryShape":
+        shape = cls(data["collection"], data["command"], data["example"])
+        shape.count = data.get("count", 1)
+        return shape
+
+
+class QueryShapeRecorder(monitoring.CommandListener):
+    """
+    CommandListener ghi lại mỗi dạng truy vấn một lần (đăng ký bằng monitoring.register trước khi tạo client).
+    Lệnh ghi nhiều statement (update_many/bulk) được tách thành từng statement.
+    """
+
+    def __init__(self):
+        self.shapes: Dict[str, QueryShape] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        command_name = event.command_name
+        if command_name not in EXPLAIN_FIELDS or event.database_name in _IGNORED_DATABASES:
+            return
+        collection = event.command.get(command_name)
+        if not isinstance(collection, str) or collection.startswith("system."):
+            return
+        body = _explain_body(command_name, event.command)
+        if command_name in ("update", "delete"):
+            statements_field = f"{command_name}s"
+            bodies = [{statements_field: [statement]} for statement in body.get(statements_field, [])]
+        else:
+            bodies = [body]
+        for example in bodies:
+            self.add(QueryShape(collection, command_name, example))
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+    def add(self, shape: QueryShape) -> None:
+        key = shape.key
+        with self._lock:
+            existing = self.shapes.get(key)
+            if existing is None:
+                self.shapes[key] = shape
+            else:
+                existing.count += 1
+
+    def dump(self, path: str) -> None:
+        """Ghi các shape ra file (Extended JSON để giữ ObjectId/datetime cho explain)."""
+        with self._lock:
+            data = [shape.to_dict() for shape in self.shapes.values()]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json_util.dumps(data, indent=2))
+
+
+def load_query_shapes(path: str) -> List[QueryShape]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [QueryShape.from_dict(item) for item in json_util.loads(f.read())]
+
+
+# --- Phân tích kết quả explain ---
+
+def _plan_stages(plan: Optional[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
+    """Duyệt cây plan (classic và SBE: winningPlan.queryPlan)."""
+    if not plan:
+        return
+    if "queryPlan" in plan:
+        plan = plan["queryPlan"]
+    yield plan
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+def _explain_sections(explain: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Phần chứa queryPlanner/executionStats: ở gốc hoặc trong stage $cursor của aggregate."""
+    sections = [explain] if "queryPlanner" in explain else []
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            sections.append(stage["$cursor"])
+    return sections
+
+
+class PlanReport:
+    """Kết quả explain của một QueryShape: các stage của winning plan, số tài liệu đọc/trả về và các vấn đề."""
+
+    def __init__(self, shape: QueryShape):
+        self.shape = shape
+        self.stages: List[str] = []
+        self.docs_examined = 0
+        self.keys_examined = 0
+        self.returned = 0
+        self.problems: List[str] = []
+        self.error: Optional[str] = None
+
+    @property
+    def examined_ratio(self) -> float:
+        return self.docs_examined / max(self.returned, 1)
+
+    def describe(self) -> str:
+        shape = self.shape
+        line = f"{shape.collection}.{shape.command} x{shape.count} {json.dumps(_shape(shape.example), sort_keys=True)}"
+        if self.error:
+            return f"{line}\n    explain lỗi: {self.error}"
+        line += (f"\n    plan: {' <- '.join(self.stages) or '?'}; docs examined {self.docs_examined}, "
+                 f"keys examined {self.keys_examined}, returned {self.returned} (ratio {self.examined_ratio:.1f})")
+        return line + "".join(f"\n    VẤN ĐỀ: {problem}" for problem in self.problems)
+
+
+def analyze_explain(shape: QueryShape, explain: Dict[str, Any], max_examined_ratio: float = DEFAULT_MAX_EXAMINED_RATIO) -> PlanReport:
+    """
+    Báo cáo COLLSCAN, SORT trong bộ nhớ, $lookup không dùng index và tỷ lệ docs examined / returned vượt ngưỡng.
+    """
+    report = PlanReport(shape)
+    for section in _explain_sections(explain):
+        for stage in _plan_stages(section.get("queryPlanner", {}).get("winningPlan")):
+            name = stage.get("stage", "?")
+            report.stages.append(f"{name} {stage['indexName']}" if "indexName" in stage else name)
+            if name == "COLLSCAN" and not shape.is_full_scan_by_design():
+                report.problems.append("COLLSCAN: không có index phục vụ filter")
+            elif name == "SORT":
+                report.problems.append(f"SORT trong bộ nhớ theo {stage.get('sortPattern')}")
+            elif name == "EQ_LOOKUP" and stage.get("strategy") != "IndexedLoopJoin":
+                report.problems.append(f"$lookup sang {stage.get('foreignCollection')} không dùng index ({stage.get('strategy')})")
+        stats = section.get("executionStats", {})
+        execution_stages = stats.get("executionStages", {})
+        report.docs_examined += stats.get("totalDocsExamined", 0)
+        report.keys_examined += stats.get("totalKeysExamined", 0)
+        report.returned = max(report.returned, stats.get("nReturned", 0),
+                              execution_stages.get("nWouldModify", 0), execution_stages.get("nWouldDelete", 0))
+    # $lookup chưa được đẩy xuống SBE: executionStats nằm trên chính stage $lookup
+    for stage in explain.get("stages", []):
+        if "$lookup" in stage and stage.get("collectionScans", 0) > 0:
+            report.problems.append(f"$lookup sang {stage['$lookup'].get('from')} quét collection ({stage['collectionScans']} lần)")
+    if report.examined_ratio > max_examined_ratio and not shape.is_full_scan_by_design():
+        report.problems.append(f"đọc {report.docs_examined} tài liệu để trả về {report.returned} (ngưỡng {max_examined_ratio:g})")
+    return report
+
+
+async def explain_shape(shape: QueryShape, db: AsyncIOMotorClient, max_examined_ratio: float = DEFAULT_MAX_EXAMINED_RATIO) -> PlanReport:
+    """Chạy explain (executionStats) cho ví dụ của shape; explain lệnh ghi không sửa dữ liệu."""
+    command = {shape.command: shape.collection, **shape.example}
+    if shape.command == "aggregate":
+        command["cursor"] = {}
+    try:
+        explain = await db.command({"explain": command, "verbosity": "executionStats"})
+    except OperationFailure as e:
+        report = PlanReport(shape)
+        report.error = str(e)
+        return report
+    return analyze_explain(shape, explain, max_examined_ratio)
+
+
+async def check_query_shapes(
+    shapes: Iterable[QueryShape],
+    db: AsyncIOMotorClient,
+    max_examined_ratio: float = DEFAULT_MAX_EXAMINED_RATIO,
+) -> List[PlanReport]:
+    """Explain mọi shape; trả về các báo cáo sắp theo collection/lệnh."""
+    reports = [await explain_shape(shape, db, max_examined_ratio) for shape in shapes]
+    return sorted(reports, key=lambda report: (report.shape.collection, report.shape.command, report.shape.key))
+
+
+def format_plan_reports(reports: List[PlanReport], verbose: bool = False) -> str:
+    """Văn bản báo cáo: mặc định chỉ liệt kê shape có vấn đề hoặc explain lỗi."""
+    flagged = [report for report in reports if report.problems or report.error]
+    lines = [f"Query plans: {len(reports)} shapes, {len(flagged)} có vấn đề."]
+    lines += [report.describe() for report in (reports if verbose else flagged)]
+    return "\n".join(lines)
+
+
+# --- Database mẫu cho explain ---
+
+async def seed_query_plan_database(db: AsyncIOMotorClient, users: int = 2000, roles: int = 20, permissions: int = 60) -> None:
+    """
+    Tạo index theo registry và dữ liệu giả đủ lớn để planner chọn plan như trên dữ liệu thật
+    (trên collection rỗng, COLLSCAN và IXSCAN đều "rẻ" như nhau).
+    """
+    await ensure_indexes(db)
+    now = datetime.now(timezone.utc)
+    permission_ids = [ObjectId() for _ in range(permissions)]
+    await db["permissions"].insert_many([
+        {"_id": permission_id, "name": f"seed:permission_{i}", "description": None,
+         "created_at": now - timedelta(minutes=i), "updated_at": now}
+        for i, permission_id in enumerate(permission_ids)
+    ])
+    role_ids = [ObjectId() for _ in range(roles)]
+    await db["roles"].insert_many([
+        {"_id": role_id, "name": f"seed_role_{i}", "description": None,
+         "permission_ids": [str(permission_id) for permission_id in permission_ids[i::roles]],
+         "created_at": now - timedelta(minutes=i), "updated_at": now}
+        for i, role_id in enumerate(role_ids)
+    ])
+    await db["users"].insert_many([
+        {"username": f"seed_user_{i}", "email": f"seed_user_{i}@example.com", "hashed_password": "!",
+         "is_active": i % 10 != 0, "is_superuser": False, "role_ids": [str(role_ids[i % roles])],
+         "failed_login_attempts": 0, "login_count": 0, "token_epoch": 0,
+         "created_at": now - timedelta(seconds=i), "updated_at": now}
+        for i in range(users)
+    ])
+    await db["refresh_tokens"].insert_many([
+        {"_id": f"seed_token_{i}", "user_id": f"seed_user_{i % users}", "family_id": f"seed_family_{i // 2}",
+         "created_at": now, "expires_at": now + timedelta(days=1)}
+        for i in range(users)
+    ])
+
+
+def query_plan_client() -> AsyncIOMotorClient:
+    """
+    Client tới TEST_MONGODB_URI (mongod local/kiểm thử). Công cụ này xóa và seed database nên
+    từ chối chạy nếu TEST_MONGODB_URI trùng MONGODB_URI của ứng dụng.
+    """
+    if settings.TEST_MONGODB_URI == settings.MONGODB_URI:
+        raise RuntimeError("TEST_MONGODB_URI trùng MONGODB_URI: không seed/xóa database trên Mongo của ứng dụng.")
+    return AsyncIOMotorClient(settings.TEST_MONGODB_URI, uuidRepresentation="standard", serverSelectionTimeoutMS=5000)
+
+
+async def check_on_seeded_database(
+    shapes: Iterable[QueryShape],
+    database_name: str,
+    users: int = 2000,
+    max_examined_ratio: float = DEFAULT_MAX_EXAMINED_RATIO,
+) -> List[PlanReport]:
+    """
+    Tạo database tạm `database_name` trên TEST_MONGODB_URI (xóa trước và sau khi kiểm tra),
+    seed dữ liệu rồi explain mọi shape.
+    """
+    client = query_plan_client()
+    try:
+        await client.drop_database(database_name)
+        db = client[database_name]
+        await seed_query_plan_database(db, users=users)
+        return await check_query_shapes(shapes, db, max_examined_ratio)
+    finally:
+        await client.drop_database(database_name)
+        client.close()
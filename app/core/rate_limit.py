@@ -0,0 +1,174 @@
+# app/core/rate_limit.py
+
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+
+RATE_LIMIT_BACKENDS = ("memory", "mongo")
+
+
+def sliding_window_decision(
+    previous_count: int, current_count: int, elapsed: float, window_seconds: float, limit: int
+) -> Tuple[bool, int]:
+    """
+    Thuật toán sliding window counter: số request ước lượng trong cửa sổ trượt là
+    previous_count * (phần cửa sổ trước còn nằm trong cửa sổ trượt) + current_count
+    (current_count đã bao gồm request hiện tại).
+    Trả về (được phép?, Retry-After tính bằng giây nếu bị từ chối).
+    """
+    fraction = min(max(elapsed / window_seconds, 0.0), 1.0)
+    estimated = previous_count * (1 - fraction) + current_count
+    if estimated <= limit:
+        return True, 0
+    # Thời điểm sớm nhất mà request tiếp theo (giả sử không có request nào khác) lọt vào giới hạn
+    headroom = limit - 1 - current_count
+    if headroom >= 0 and previous_count > 0:
+        retry_after = window_seconds * (1 - headroom / previous_count) - elapsed
+    else:
+        next_window_fraction = max(0.0, 1 - (limit - 1) / current_count) if current_count else 0.0
+        retry_after = (window_seconds - elapsed) + window_seconds * next_window_fraction
+    return False, max(1, math.ceil(retry_after))
+
+
+class MemoryRateLimitBackend:
+    """
+    Bộ đếm trong process, chia thành nhiều shard theo hash của key: mỗi shard là một dict
+    key -> (chỉ số cửa sổ, số đếm cửa sổ trước, số đếm cửa sổ hiện tại). Khi một shard vượt quá
+    số key cho phép, chỉ shard đó được dọn các key đã hết hạn (chi phí dọn dẹp không tăng theo tổng số key).
+    Chỉ nhất quán trong một process: N worker cho phép tối đa N lần giới hạn.
+    """
+
+    def __init__(self, shard_count: int, max_keys: int):
+        self._shards: List[Dict[str, Tuple[int, int, int]]] = [{} for _ in range(max(1, shard_count))]
+        self._max_keys_per_shard = max(1, max_keys // len(self._shards))
+
+    async def hit(self, key: str, window_seconds: int, now: float, db: Optional[AsyncIOMotorClient] = None) -> Tuple[int, int]:
+        """Ghi nhận một request; trả về (số đếm cửa sổ trước, số đếm cửa sổ hiện tại)."""
+        shard = self._shards[hash(key) % len(self._shards)]
+        window = int(now // window_seconds)
+        entry = shard.get(key)
+        if entry is None or entry[0] < window - 1:
+            previous_count, current_count = 0, 1
+        elif entry[0] == window - 1:
+            previous_count, current_count = entry[2], 1
+        else:
+            previous_count, current_count = entry[1], entry[2] + 1
+        shard[key] = (window, previous_count, current_count)
+        if len(shard) > self._max_keys_per_shard:
+            self._prune(shard, window)
+        return previous_count, current_count
+
+    def _prune(self, shard: Dict[str, Tuple[int, int, int]], window: int) -> None:
+        for key in [k for k, entry in shard.items() if entry[0] < window - 1]:
+            del shard[key]
+        # Vẫn đầy (nhiều key đang hoạt động): bỏ các key cũ nhất theo thứ tự chèn
+        while len(shard) > self._max_keys_per_shard:
+            del shard[next(iter(shard))]
+
+    def key_count(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+
+class MongoRateLimitBackend:
+    """
+    Bộ đếm dùng chung giữa các worker/node trong collection "rate_limits" (một tài liệu mỗi key,
+    TTL index trên expires_at). Mỗi request là một find_one_and_update với update pipeline:
+    dịch cửa sổ (nếu cần) và tăng số đếm một cách atomic trong một round trip.
+    """
+
+    async def hit(self, key: str, window_seconds: int, now: float, db: Optional[AsyncIOMotorClient] = None) -> Tuple[int, int]:
+        window = int(now // window_seconds)
+        rate_limits_collection = db["rate_limits"]
+        doc = await rate_limits_collection.find_one_and_update(
+            {"_id": key},
+            [{"$set": {
+                "p": {"$switch": {
+                    "branches": [
+                        {"case": {"$eq": ["$w", window]}, "then": "$p"},
+                        {"case": {"$eq": ["$w", window - 1]}, "then": "$c"},
+                    ],
+                    "default": 0,
+                }},
+                "c": {"$cond": [{"$eq": ["$w", window]}, {"$add": ["$c", 1]}, 1]},
+                "w": window,
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=2 * window_seconds),
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc.get("p", 0), doc["c"]
+
+    def key_count(self) -> Optional[int]:
+        return None
+
+
+class RateLimiter:
+    """
+    Giới hạn tần suất theo nhiều key cùng lúc (ví dụ theo IP và theo username).
+    Một request bị từ chối nếu vượt giới hạn của bất kỳ key nào; mọi key đều được đếm
+    (kể cả request bị từ chối, để kẻ tấn công tiếp tục bị chặn khi vẫn gửi request).
+    """
+
+    def __init__(self, backend, window_seconds: int):
+        self.backend = backend
+        self.window_seconds = window_seconds
+        self.allowed = 0
+        self.rejected = 0
+        self.backend_errors = 0
+
+    async def check(self, rules: Sequence[Tuple[str, int]], db: Optional[AsyncIOMotorClient] = None) -> Optional[int]:
+        """
+        `rules`: danh sách (key, giới hạn mỗi cửa sổ). Trả về None nếu được phép,
+        ngược lại số giây Retry-After (lớn nhất trong các key bị vượt).
+        """
+        now = time.time()
+        elapsed = now % self.window_seconds
+        retry_after: Optional[int] = None
+        for key, limit in rules:
+            try:
+                previous_count, current_count = await self.backend.hit(key, self.window_seconds, now, db)
+            except Exception as e:
+                # Backend lỗi (ví dụ Mongo không phản hồi): không chặn đăng nhập vì lỗi của bộ đếm
+                self.backend_errors += 1
+                print(f"Rate limiter backend error for '{key}': {e}")
+                continue
+            allowed, key_retry_after = sliding_window_decision(previous_count, current_count, elapsed, self.window_seconds, limit)
+            if not allowed:
+                retry_after = max(retry_after or 0, key_retry_after)
+        if retry_after is None:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "keys": self.backend.key_count(),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "backend_errors": self.backend_errors,
+        }
+
+
+def build_rate_limiter() -> RateLimiter:
+    """Tạo limiter đăng nhập theo Settings."""
+    if settings.LOGIN_RATE_LIMIT_BACKEND not in RATE_LIMIT_BACKENDS:
+        raise ValueError(
+            f"LOGIN_RATE_LIMIT_BACKEND '{settings.LOGIN_RATE_LIMIT_BACKEND}' không được hỗ trợ. "
+            f"Các backend có sẵn: {', '.join(RATE_LIMIT_BACKENDS)}."
+        )
+    if settings.LOGIN_RATE_LIMIT_BACKEND == "mongo":
+        backend = MongoRateLimitBackend()
+    else:
+        backend = MemoryRateLimitBackend(settings.RATE_LIMIT_MEMORY_SHARDS, settings.RATE_LIMIT_MEMORY_MAX_KEYS)
+    return RateLimiter(backend, settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS)
+
+
+login_rate_limiter = build_rate_limiter()
@@ -0,0 +1,166 @@
+# app/core/request_timing.py
+
+import asyncio
+import json
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+from app.core.config import settings
+
+# Thứ tự các mục trong header Server-Timing
+TIMING_NAMES = ("jwt", "db", "hash", "serialize")
+
+
+class RequestTiming:
+    """
+    Tổng thời gian (giây) và số lần của từng loại công việc trong một request.
+    `add()` có thể được gọi từ thread của driver Mongo (Motor copy context sang executor) nên có lock.
+    """
+
+    __slots__ = ("started_at", "endpoint_done_at", "totals", "counts", "_lock")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.endpoint_done_at: Optional[float] = None
+        self.totals: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def server_timing_header(self, total_seconds: float) -> str:
+        entries: List[str] = []
+        for name in TIMING_NAMES:
+            if name in self.totals:
+                entry = f"{name};dur={self.totals[name] * 1000:.2f}"
+                if name == "db":
+                    entry += f';desc="{self.counts[name]} round trips"'
+                entries.append(entry)
+        entries.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(entries)
+
+
+# None khi SERVER_TIMING_ENABLED tắt: mọi điểm đo chỉ tốn một lần ContextVar.get()
+_current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+def record_timing(name: str, seconds: float) -> None:
+    """Cộng thời gian vào request hiện tại (không làm gì nếu không có request nào đang được đo)."""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+class RequestTimingCommandListener(monitoring.CommandListener):
+    """Mỗi lệnh Mongo hoàn tất là một round trip, cộng vào mục "db" của request đã gửi lệnh."""
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        record_timing("db", event.duration_micros / 1_000_000)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        record_timing("db", event.duration_micros / 1_000_000)
+
+
+def request_timing_listeners() -> list:
+    """Listener truyền vào AsyncIOMotorClient(event_listeners=...) trong init_mongo."""
+    return [RequestTimingCommandListener()] if settings.SERVER_TIMING_ENABLED else []
+
+
+class TimedRoute(APIRoute):
+    """
+    APIRoute đo phần "serialize": từ lúc endpoint trả về tới khi Response đã được tạo
+    (validate response_model bằng Pydantic và render JSON). Dùng qua APIRouter(route_class=TimedRoute).
+    """
+
+    def get_route_handler(self) -> Callable:
+        if not settings.SERVER_TIMING_ENABLED:
+            return super().get_route_handler()
+        # dependant đã được phân tích từ endpoint gốc: thay call không ảnh hưởng tới việc đọc tham số
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            async def timed_endpoint(*args, **kwargs):
+                try:
+                    return await endpoint(*args, **kwargs)
+                finally:
+                    _mark_endpoint_done()
+        else:
+            def timed_endpoint(*args, **kwargs):
+                try:
+                    return endpoint(*args, **kwargs)
+                finally:
+                    _mark_endpoint_done()
+        self.dependant.call = timed_endpoint
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timing = _current_timing.get()
+            if timing is not None and timing.endpoint_done_at is not None:
+                timing.add("serialize", time.perf_counter() - timing.endpoint_done_at)
+            return response
+
+        return timed_handler
+
+
+def _mark_endpoint_done() -> None:
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.endpoint_done_at = time.perf_counter()
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware tạo RequestTiming cho mỗi HTTP request:
+    - DEBUG_MODE: thêm header Server-Timing (jwt, db kèm số round trip, hash, serialize, total) và X-DB-Roundtrips.
+    - Request chậm hơn SLOW_REQUEST_LOG_MS: ghi một dòng log JSON với cùng các số liệu.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timing = RequestTiming()
+        context_token = _current_timing.set(timing)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.DEBUG_MODE:
+                    total_seconds = time.perf_counter() - timing.started_at
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timing.server_timing_header(total_seconds).encode()))
+                    headers.append((b"x-db-roundtrips", str(timing.counts.get("db", 0)).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timing.reset(context_token)
+            duration_ms = (time.perf_counter() - timing.started_at) * 1000
+            if duration_ms >= settings.SLOW_REQUEST_LOG_MS:
+                route = scope.get("route")
+                print(json.dumps({
+                    "event": "slow_request",
+                    "method": scope["method"],
+                    "route": getattr(route, "path", scope["path"]),
+                    "status": status_code,
+                    "duration_ms": round(duration_ms, 2),
+                    **{f"{name}_ms": round(timing.totals[name] * 1000, 2) for name in TIMING_NAMES if name in timing.totals},
+                    "db_roundtrips": timing.counts.get("db", 0),
+                }))
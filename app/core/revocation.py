@@ -0,0 +1,117 @@
+# app/core/revocation.py
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.bloom import BloomFilter
+from app.core.config import settings
+from app.repository.refresh_token import (
+    get_revoked_family_ids,
+    is_refresh_token_family_revoked_db,
+    revoke_refresh_token_family,
+)
+
+
+class RevokedFamilies:
+    """
+    Tập các refresh token family đã bị thu hồi, giữ trong process dưới dạng Bloom filter.
+    Access token và refresh token đều mang `fid`; trên đường nóng (mỗi request có bearer token),
+    family không có trong filter chắc chắn chưa bị thu hồi nên không tốn round trip nào.
+    Chỉ khi filter trả lời "có thể" mới đọc DB để xác nhận (false positive ~ error_rate).
+    Thu hồi ở worker khác được nạp bằng task đồng bộ định kỳ (độ trễ tối đa một chu kỳ).
+    """
+
+    def __init__(self):
+        self._filter = self._new_filter()
+        self._synced_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.db_confirmations = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def _new_filter() -> BloomFilter:
+        return BloomFilter(settings.REFRESH_REVOCATION_BLOOM_CAPACITY, settings.REFRESH_REVOCATION_BLOOM_ERROR_RATE)
+
+    def add(self, family_id: str) -> None:
+        self._filter.add(family_id)
+
+    def might_be_revoked(self, family_id: str) -> bool:
+        return family_id in self._filter
+
+    async def is_revoked(self, family_id: str, db: AsyncIOMotorClient) -> bool:
+        """Kiểm tra family đã bị thu hồi chưa: Bloom filter trước, DB chỉ khi filter báo có thể."""
+        self.checks += 1
+        if not self.might_be_revoked(family_id):
+            return False
+        self.db_confirmations += 1
+        revoked = await is_refresh_token_family_revoked_db(family_id, db)
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    async def revoke(self, family_id: str, db: AsyncIOMotorClient) -> int:
+        """Thu hồi cả family trong DB và đưa vào filter của process này ngay lập tức."""
+        revoked_count = await revoke_refresh_token_family(family_id, db)
+        self.add(family_id)
+        return revoked_count
+
+    async def sync(self, db: AsyncIOMotorClient) -> int:
+        """
+        Nạp các family bị thu hồi từ DB. Lần đầu (hoặc khi filter đã đầy) dựng lại toàn bộ filter,
+        các lần sau chỉ đọc phần mới, chồng lấn một chu kỳ để bù lệch đồng hồ giữa các worker.
+        """
+        started_at = datetime.now(timezone.utc)
+        if self._synced_at is None or self._filter.is_full:
+            family_ids = await get_revoked_family_ids(db)
+            new_filter = self._new_filter()
+            for family_id in family_ids:
+                new_filter.add(family_id)
+            self._filter = new_filter
+        else:
+            since = self._synced_at - timedelta(seconds=settings.REFRESH_REVOCATION_SYNC_SECONDS)
+            family_ids = await get_revoked_family_ids(db, since=since)
+            for family_id in family_ids:
+                if family_id not in self._filter:
+                    self._filter.add(family_id)
+        self._synced_at = started_at
+        return len(family_ids)
+
+    async def _sync_forever(self, db: AsyncIOMotorClient):
+        while True:
+            await asyncio.sleep(settings.REFRESH_REVOCATION_SYNC_SECONDS)
+            try:
+                await self.sync(db)
+            except Exception as e:
+                print(f"Failed to sync revoked refresh token families: {e}")
+
+    async def start(self, db: AsyncIOMotorClient) -> None:
+        count = await self.sync(db)
+        print(f"Revoked refresh token families loaded: {count} ({self._filter.size_bytes} bytes Bloom filter).")
+        self._task = asyncio.create_task(self._sync_forever(db))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": "revoked_families",
+            "size": self._filter.count,
+            "capacity": self._filter.capacity,
+            "bytes": self._filter.size_bytes,
+            "checks": self.checks,
+            "db_confirmations": self.db_confirmations,
+            "false_positives": self.false_positives,
+        }
+
+
+revoked_families = RevokedFamilies()
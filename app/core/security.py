@@ -1,5 +1,12 @@
 # app/core/security.py
 
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
@@ -7,8 +14,14 @@ from typing import Optional, Dict, Any
 
 from app.schemas.token import TokenData # Import TokenData
 from app.core.config import settings # Import settings
+from app.core.password_hashing import build_crypt_context_kwargs
+from app.core.cache import token_cache
+from app.core.keyring import KeyRing, load_keyring
+from app.core.metrics import PASSWORD_HASH_DURATION, JWT_DURATION
+from app.core.request_timing import record_timing
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cấu hình thuật toán/chi phí lấy từ Settings; lifespan có thể nạp lại sau khi autotune
+pwd_context = CryptContext(**build_crypt_context_kwargs())
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -16,6 +29,101 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Kiểm tra hash có dùng thuật toán cũ hoặc chi phí thấp hơn cấu hình hiện tại không (không tốn CPU đáng kể)."""
+    return pwd_context.needs_update(hashed_password)
+
+# Process pool dành riêng cho bcrypt: mỗi lần verify/hash tốn ~200ms CPU,
+# chạy trực tiếp trong handler async sẽ làm đứng toàn bộ event loop của worker.
+class HashingPoolHolder:
+    executor: Optional[ProcessPoolExecutor] = None
+
+hashing_pool_holder = HashingPoolHolder()
+
+def _init_hashing_worker(context_config: str) -> None:
+    """Chạy trong mỗi process con: dùng cùng cấu hình CryptContext (đã autotune) với process cha."""
+    pwd_context.load(context_config)
+
+def _warm_up_hashing_worker() -> int:
+    """Hàm rỗng để buộc process con khởi động (và import module này) trước request đầu tiên."""
+    return os.getpid()
+
+def default_hashing_pool_size() -> int:
+    """Số process băm mặc định của một worker: chia đều CPU của máy cho WEB_CONCURRENCY worker (tối thiểu 1)."""
+    return max(1, (os.cpu_count() or 1) // max(1, settings.WEB_CONCURRENCY))
+
+async def init_hashing_pool():
+    """Khởi tạo process pool cho việc băm/xác minh mật khẩu."""
+    pool_size = settings.PASSWORD_HASH_POOL_SIZE
+    if pool_size is None:
+        pool_size = default_hashing_pool_size()
+    if pool_size <= 0:
+        print("Password hashing pool disabled, falling back to the default thread pool.")
+        return
+
+    print(f"Initializing password hashing pool with {pool_size} processes...")
+    # Dùng 'spawn' thay vì 'fork': process cha đã có các thread của Motor, fork lúc này không an toàn.
+    hashing_pool_holder.executor = ProcessPoolExecutor(
+        max_workers=pool_size,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_hashing_worker,
+        initargs=(pwd_context.to_string(),),
+    )
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(
+        loop.run_in_executor(hashing_pool_holder.executor, _warm_up_hashing_worker)
+        for _ in range(pool_size)
+    ))
+    print("Password hashing pool initialized successfully.")
+
+def close_hashing_pool():
+    """Đóng process pool băm mật khẩu."""
+    if hashing_pool_holder.executor:
+        print("Shutting down password hashing pool...")
+        hashing_pool_holder.executor.shutdown(wait=True, cancel_futures=True)
+        hashing_pool_holder.executor = None
+        print("Password hashing pool shut down.")
+
+def _observe(histogram, operation: str, timing_name: str, started: float) -> None:
+    """Ghi thời gian vào histogram /metrics và vào Server-Timing của request hiện tại."""
+    elapsed = time.perf_counter() - started
+    histogram.labels(operation).observe(elapsed)
+    record_timing(timing_name, elapsed)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Phiên bản awaitable của verify_password, chạy trong process pool.
+    Nếu pool chưa được khởi tạo (script, test), dùng thread pool mặc định của event loop.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(hashing_pool_holder.executor, verify_password, plain_password, hashed_password)
+    finally:
+        _observe(PASSWORD_HASH_DURATION, "verify", "hash", started)
+
+async def get_password_hash_async(password: str) -> str:
+    """Phiên bản awaitable của get_password_hash, chạy trong process pool."""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(hashing_pool_holder.executor, get_password_hash, password)
+    finally:
+        _observe(PASSWORD_HASH_DURATION, "hash", "hash", started)
+
+# Keyring ký bất đối xứng (ES256, ...) khi JWT_SIGNING_KEYS_FILE được cấu hình: các service khác
+# xác minh token bằng public key lấy từ /.well-known/jwks.json. None = ký HS256 bằng SECRET_KEY như cũ.
+token_keyring: Optional[KeyRing] = load_keyring(settings.JWT_SIGNING_KEYS_FILE) if settings.JWT_SIGNING_KEYS_FILE else None
+
+def _encode_token(to_encode: Dict[str, Any]) -> str:
+    started = time.perf_counter()
+    try:
+        if token_keyring is not None:
+            return token_keyring.sign(to_encode)
+        return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    finally:
+        _observe(JWT_DURATION, "encode", "jwt", started)
+
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -23,7 +131,7 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = _encode_token(to_encode)
     return encoded_jwt
 
 def create_refresh_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
@@ -33,9 +141,42 @@ def create_refresh_token(data: Dict[str, Any], expires_delta: Optional[timedelta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = _encode_token(to_encode)
     return encoded_jwt
 
+def new_token_id() -> str:
+    """ID ngẫu nhiên (128 bit) cho claim `jti` và `fid` của refresh token."""
+    return secrets.token_urlsafe(16)
+
+def hash_token_id(token_id: str) -> str:
+    """Hash của jti dùng làm khóa lưu trong DB (không lưu jti gốc)."""
+    return hashlib.sha256(token_id.encode()).hexdigest()
+
 def decode_token(token: str, secret_key: str) -> Dict[str, Any]:
-    """Giải mã token JWT."""
-    return jwt.decode(token, secret_key, algorithms=[settings.ALGORITHM])
\ No newline at end of file
+    """Giải mã token JWT (theo kid của keyring nếu có, ngược lại HS256 bằng secret_key)."""
+    started = time.perf_counter()
+    try:
+        if token_keyring is not None:
+            return token_keyring.verify(token)
+        return jwt.decode(token, secret_key, algorithms=[settings.ALGORITHM])
+    finally:
+        _observe(JWT_DURATION, "decode", "jwt", started)
+
+def decode_token_cached(token: str, secret_key: str) -> Dict[str, Any]:
+    """
+    Giống decode_token nhưng dùng token_cache: một client gửi cùng bearer token cho rất nhiều request,
+    nên chỉ lần đầu phải kiểm tra chữ ký và parse JSON. Key là blake2b digest của token (không giữ token gốc),
+    entry hết hạn đúng theo claim `exp`. Token không hợp lệ không được cache (vẫn raise JWTError).
+    Cache dùng chung cho cả process, giả định process chỉ xác minh token bằng một khóa.
+    """
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    claims = token_cache.get(key)
+    if claims is not None:
+        return dict(claims)
+    claims = decode_token(token, secret_key)
+    expires_at = None
+    exp = claims.get("exp")
+    if isinstance(exp, (int, float)):
+        expires_at = time.monotonic() + (exp - time.time())
+    token_cache.set(key, claims, expires_at=expires_at)
+    return dict(claims)
@@ -0,0 +1,30 @@
+# app/core/token_epoch.py
+
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.cache import token_epoch_cache
+from app.repository.user import get_token_epoch_db
+
+# Mỗi user có một số nguyên `token_epoch` (mặc định 0) trong tài liệu users. Token được phát hành với
+# claim `tep` = epoch tại thời điểm đó; tăng epoch (đổi/đặt lại mật khẩu, vô hiệu hóa tài khoản,
+# thu hồi theo vai trò) làm mọi token cũ của user mất hiệu lực mà không cần denylist theo token.
+# Epoch được cache theo user nên mỗi request chỉ tốn một phép so sánh số nguyên.
+
+
+async def current_token_epoch(user_id: str, db: AsyncIOMotorClient) -> Optional[int]:
+    """Epoch hiện tại của user (từ cache, đọc DB khi miss). None nếu user không tồn tại."""
+    cache_version = token_epoch_cache.version() # Lấy trước khi đọc DB để không cache giá trị đã bị invalidate
+    epoch = token_epoch_cache.get(user_id)
+    if epoch is not None:
+        return epoch
+    epoch = await get_token_epoch_db(user_id, db)
+    if epoch is not None:
+        token_epoch_cache.set(user_id, epoch, version=cache_version)
+    return epoch
+
+async def is_token_epoch_current(claims: Dict[str, Any], db: AsyncIOMotorClient) -> bool:
+    """Token còn hiệu lực nếu `tep` (0 với token phát hành trước khi có epoch) bằng epoch hiện tại của user."""
+    epoch = await current_token_epoch(claims["sub"], db)
+    return epoch is not None and claims.get("tep", 0) >= epoch
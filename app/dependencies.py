@@ -1,19 +1,31 @@
 # app/dependencies.py
 
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple, Union
+import hashlib
+import ipaddress
+import time
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from motor.motor_asyncio import AsyncIOMotorClient
 from jose import JWTError # Thêm import này
 
 from app.core.database import get_database
-from app.core.security import decode_token # Hàm để giải mã JWT
+from app.core.security import decode_token_cached # Hàm để giải mã JWT (có cache claims đã xác minh)
 from app.core.config import settings # Để lấy SECRET_KEY
+from app.core.authz_version import is_permissions_version_current
+from app.core.permission_catalog import permission_catalog, principal_has_permissions
+from app.core.revocation import revoked_families
+from app.core.token_epoch import is_token_epoch_current
+from app.core.rate_limit import login_rate_limiter
+from app.core.admission import admission_controller, AdmissionRejected
 from app.schemas.token import TokenData # Để xử lý dữ liệu từ token
 from app.schemas.user import UserInResponse # Để trả về thông tin user đã xác thực
 
 from app.services.user_service import UserService
 from app.services.role_service import RoleService
 from app.services.permission_service import PermissionService
+from app.services.authz_service import AuthzService
 
 # Khởi tạo OAuth2PasswordBearer để tự động trích xuất token từ Header Authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login") # tokenUrl là endpoint để lấy token
@@ -28,13 +40,113 @@ def get_role_service(db: AsyncIOMotorClient = Depends(get_database)) -> RoleServ
 def get_permission_service(db: AsyncIOMotorClient = Depends(get_database)) -> PermissionService:
     return PermissionService(db)
 
+def get_authz_service(db: AsyncIOMotorClient = Depends(get_database)) -> AuthzService:
+    return AuthzService(db)
+
+
+def client_ip(request: Request) -> str:
+    """
+    IP của client. Sau TRUSTED_PROXY_HOPS proxy tin cậy, mỗi proxy nối IP mà nó nhận kết nối vào cuối
+    X-Forwarded-For nên chỉ lấy phần tử thứ N từ cuối; các phần tử trước đó do client tự gửi (giả mạo được).
+    """
+    peer = request.client.host if request.client else "unknown"
+    hops = settings.TRUSTED_PROXY_HOPS
+    if hops <= 0:
+        return peer
+    if settings.TRUSTED_PROXY_IPS:
+        try:
+            peer_address = ipaddress.ip_address(peer)
+        except ValueError:
+            return peer
+        if not any(peer_address in ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXY_IPS):
+            return peer # Kết nối không đến từ proxy tin cậy: bỏ qua X-Forwarded-For
+    forwarded = [host.strip() for host in request.headers.get("x-forwarded-for", "").split(",") if host.strip()]
+    if len(forwarded) < hops:
+        return peer
+    return forwarded[-hops]
+
+
+# Giới hạn tần suất đăng nhập: chạy trước khi endpoint đọc DB hay chạy bcrypt
+async def enforce_login_rate_limit(
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncIOMotorClient = Depends(get_database)
+) -> None:
+    """
+    Từ chối với 429 + Retry-After khi IP hoặc username vượt giới hạn (LOGIN_RATE_LIMIT_*).
+    IP lấy theo client_ip (X-Forwarded-For của proxy tin cậy, xem TRUSTED_PROXY_HOPS).
+    Username được chuẩn hóa chữ thường và băm trước khi làm key.
+    """
+    if not settings.LOGIN_RATE_LIMIT_ENABLED:
+        return
+    username_key = hashlib.blake2b(form_data.username.strip().lower().encode(), digest_size=16).hexdigest()
+    retry_after = await login_rate_limiter.check(
+        [
+            (f"login:ip:{client_ip(request)}", settings.LOGIN_RATE_LIMIT_PER_IP),
+            (f"login:user:{username_key}", settings.LOGIN_RATE_LIMIT_PER_USERNAME),
+        ],
+        db,
+    )
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Quá nhiều lần đăng nhập. Vui lòng thử lại sau {retry_after} giây.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+# Điều tiết các endpoint băm mật khẩu. Ví dụ: dependencies=[Depends(admission("login"))]
+@asynccontextmanager
+async def _admission_slot(class_name: str):
+    """
+    Giữ một slot của admission controller trong suốt request; khi hàng đợi quá dài
+    trả về 503 + Retry-After ngay thay vì để request chờ trong pool băm.
+    """
+    if not settings.ADMISSION_CONTROL_ENABLED:
+        yield
+        return
+    try:
+        await admission_controller.acquire(class_name)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Hệ thống đang quá tải. Vui lòng thử lại sau {e.retry_after} giây.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        admission_controller.release(class_name, time.perf_counter() - started)
+
+def admission(class_name: str, authenticated: bool = False):
+    """
+    `authenticated=True`: chỉ xin slot sau khi get_current_active_user thành công, để request không có
+    token hợp lệ bị từ chối (401) mà không chiếm hay xếp hàng slot của người dùng thật.
+    """
+    if authenticated:
+        async def authenticated_admission_slot(current_user: UserInResponse = Depends(get_current_active_user)):
+            async with _admission_slot(class_name):
+                yield
+        return authenticated_admission_slot
+
+    async def admission_slot():
+        async with _admission_slot(class_name):
+            yield
+    return admission_slot
+
 
 # Dependencies cho Xác thực và Ủy quyền
 
-async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> str:
+async def get_token_claims(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncIOMotorClient = Depends(get_database)
+) -> Dict[str, Any]:
     """
-    Dependency để lấy ID người dùng từ Access Token.
-    Ném HTTPException nếu token không hợp lệ hoặc hết hạn.
+    Dependency để giải mã và xác minh Access Token, trả về toàn bộ claims.
+    Ném HTTPException nếu token không hợp lệ, hết hạn, không phải access token (refresh token,
+    token reset mật khẩu...), thuộc một refresh token family đã bị thu hồi, hoặc phát hành trước
+    lần tăng token epoch gần nhất của user.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -42,15 +154,28 @@ async def get_current_user_id(token: str = Depends(oauth2_scheme)) -> str:
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = decode_token(token, settings.SECRET_KEY)
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        # Bạn có thể thêm kiểm tra is_active, is_superuser ở đây nếu muốn kiểm tra nhanh từ token payload
-        # hoặc để Service layer làm việc đó sau khi lấy user từ DB.
-        return user_id
+        payload = decode_token_cached(token, settings.SECRET_KEY)
     except JWTError: # Bao gồm lỗi giải mã hoặc hết hạn
         raise credentials_exception
+    if payload.get("sub") is None or payload.get("type") is not None:
+        raise credentials_exception
+    # Bloom filter trong process: chỉ đọc DB khi family có thể đã bị thu hồi
+    family_id = payload.get("fid")
+    if family_id and await revoked_families.is_revoked(family_id, db):
+        raise credentials_exception
+    # Epoch của user được cache: thường chỉ là một phép so sánh số nguyên
+    if not await is_token_epoch_current(payload, db):
+        raise credentials_exception
+    return payload
+
+async def get_current_user_id(claims: Dict[str, Any] = Depends(get_token_claims)) -> str:
+    """
+    Dependency để lấy ID người dùng từ Access Token.
+    Ném HTTPException nếu token không hợp lệ hoặc hết hạn.
+    """
+    # Bạn có thể thêm kiểm tra is_active, is_superuser ở đây nếu muốn kiểm tra nhanh từ token payload
+    # hoặc để Service layer làm việc đó sau khi lấy user từ DB.
+    return claims["sub"]
 
 async def get_current_user(
     user_id: str = Depends(get_current_user_id),
@@ -83,16 +208,75 @@ async def get_current_active_superuser(current_user: UserInResponse = Depends(ge
         )
     return current_user
 
+async def get_current_principal(
+    claims: Dict[str, Any] = Depends(get_token_claims),
+    user_service: UserService = Depends(get_user_service)
+) -> Union[UserInResponse, TokenData]:
+    """
+    Dependency trả về principal dùng cho kiểm tra quyền hạn.
+    - Ở chế độ STATELESS_AUTHZ_ENABLED, nếu token mang claims phân quyền với permissions version
+      chưa cũ, principal được dựng trực tiếp từ token (không có I/O tới DB).
+    - Ngược lại (hoặc version đã cũ), fallback về get_current_user (đọc DB / principal cache).
+    Cả hai loại principal đều có `permissions`, `roles` và `is_superuser`.
+    """
+    if settings.STATELESS_AUTHZ_ENABLED and is_permissions_version_current(claims.get("pv")):
+        return TokenData(
+            user_id=claims["sub"],
+            username=claims.get("username"),
+            is_superuser=claims.get("is_superuser", False),
+            roles=claims.get("roles", []),
+            permissions=claims.get("perms", []),
+            permissions_version=claims["pv"],
+        )
+    return await get_current_user(claims["sub"], user_service)
+
+def _compiled_required_mask(permission_names: Tuple[str, ...]):
+    """
+    Trả về hàm lấy mask yêu cầu đã biên dịch, chỉ tính lại khi catalog thay đổi (theo generation).
+    """
+    compiled: Dict[str, Any] = {"generation": None, "mask": None}
+    def required_mask() -> Optional[int]:
+        if compiled["generation"] != permission_catalog.generation:
+            compiled["mask"] = permission_catalog.required_mask(permission_names)
+            compiled["generation"] = permission_catalog.generation
+        return compiled["mask"]
+    return required_mask
+
 # Dependency để kiểm tra quyền hạn cụ thể
 # Ví dụ: requires_permission("admin:create_users")
 def requires_permission(permission_name: str):
-    async def permission_checker(current_user: UserInResponse = Depends(get_current_user)):
-        # Kiểm tra xem người dùng có quyền này không
-        # Lưu ý: current_user.permissions đã được populate bởi UserService
-        if permission_name not in current_user.permissions and not current_user.is_superuser:
+    required_mask = _compiled_required_mask((permission_name,))
+    async def permission_checker(current_user: Union[UserInResponse, TokenData] = Depends(get_current_principal)):
+        # Kiểm tra xem người dùng có quyền này không bằng một phép AND trên bitmask
+        # Lưu ý: mask của current_user được tính bởi UserService hoặc từ claims của token
+        if not principal_has_permissions(current_user, [permission_name], required_mask=required_mask()):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Bạn không có quyền '{permission_name}'."
             )
         return current_user
-    return permission_checker
\ No newline at end of file
+    return permission_checker
+
+# Ví dụ: requires_all("role:read_all", "permission:read_all")
+def requires_all(*permission_names: str):
+    required_mask = _compiled_required_mask(permission_names)
+    async def permission_checker(current_user: Union[UserInResponse, TokenData] = Depends(get_current_principal)):
+        if not principal_has_permissions(current_user, list(permission_names), require_all=True, required_mask=required_mask()):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Bạn cần có tất cả các quyền: {', '.join(permission_names)}."
+            )
+        return current_user
+    return permission_checker
+
+# Ví dụ: requires_any("article:update_own", "article:update_any")
+def requires_any(*permission_names: str):
+    required_mask = _compiled_required_mask(permission_names)
+    async def permission_checker(current_user: Union[UserInResponse, TokenData] = Depends(get_current_principal)):
+        if not principal_has_permissions(current_user, list(permission_names), require_all=False, required_mask=required_mask()):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Bạn cần có ít nhất một trong các quyền: {', '.join(permission_names)}."
+            )
+        return current_user
+    return permission_checker
@@ -19,7 +19,10 @@ class UserDBModel(BaseModel):
     updated_at: datetime
     last_login_at: Optional[datetime] = None
     failed_login_attempts: int = 0
+    login_count: int = 0 # Tổng số lần đăng nhập thành công (ghi trễ, xem app/core/bookkeeping.py)
+    token_epoch: int = 0 # Tăng để vô hiệu hóa mọi token đã phát hành (xem app/core/token_epoch.py)
     lockout_until: Optional[datetime] = None
+    email_verified_at: Optional[datetime] = None # Thời điểm xác minh email (None = chưa xác minh)
     role_ids: List[str] = Field(default_factory=list) # List of string ObjectIds
 
     model_config = ConfigDict(populate_by_name=True, arbitrary_types_allowed=True, from_attributes=True)
\ No newline at end of file
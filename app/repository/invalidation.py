@@ -0,0 +1,47 @@
+# app/repository/invalidation.py
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.repository.permissions_version import PERMISSIONS_VERSION_DOC_ID
+
+# Resume token của change stream dùng cho invalidation bus (xem app/core/invalidation.py),
+# lưu trong collection "meta" cùng với permissions version.
+RESUME_TOKEN_DOC_ID = "invalidation_resume_token"
+# "users version": tăng khi token epoch hoặc dữ liệu principal của người dùng thay đổi mà permissions version
+# không tăng (đổi mật khẩu/email/username, thu hồi theo vai trò). Chế độ polling theo dõi cả hai version.
+USERS_VERSION_DOC_ID = "users_version"
+
+async def get_resume_token_db(db: AsyncIOMotorClient) -> Optional[Dict[str, Any]]:
+    """Đọc resume token đã lưu (None nếu chưa có)."""
+    meta_collection = db["meta"]
+    doc = await meta_collection.find_one({"_id": RESUME_TOKEN_DOC_ID})
+    return doc["token"] if doc else None
+
+async def save_resume_token_db(token: Dict[str, Any], db: AsyncIOMotorClient) -> None:
+    """Lưu resume token mới nhất (ghi đè)."""
+    meta_collection = db["meta"]
+    await meta_collection.update_one(
+        {"_id": RESUME_TOKEN_DOC_ID},
+        {"$set": {"token": token, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+async def clear_resume_token_db(db: AsyncIOMotorClient) -> None:
+    """Xóa resume token (khi token đã quá cũ so với oplog)."""
+    meta_collection = db["meta"]
+    await meta_collection.delete_one({"_id": RESUME_TOKEN_DOC_ID})
+
+async def increment_users_version_db(db: AsyncIOMotorClient) -> None:
+    """Tăng users version một cách atomic."""
+    meta_collection = db["meta"]
+    await meta_collection.update_one({"_id": USERS_VERSION_DOC_ID}, {"$inc": {"value": 1}}, upsert=True)
+
+async def get_invalidation_versions_db(db: AsyncIOMotorClient) -> Tuple[int, int]:
+    """Đọc (permissions version, users version) bằng một query (0 nếu chưa có)."""
+    meta_collection = db["meta"]
+    cursor = meta_collection.find({"_id": {"$in": [PERMISSIONS_VERSION_DOC_ID, USERS_VERSION_DOC_ID]}})
+    values = {doc["_id"]: doc["value"] async for doc in cursor}
+    return values.get(PERMISSIONS_VERSION_DOC_ID, 0), values.get(USERS_VERSION_DOC_ID, 0)
@@ -1,11 +1,14 @@
 # app/repository/permission.py
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from bson import ObjectId
 from datetime import datetime, timezone
 
 from app.models.permission import PermissionDBModel # Chỉ tương tác với Database Model
+from app.core.cache import invalidate_all_principals
+from app.core.pagination import paginate, created_range_filter
+from app.core.authz_version import bump_permissions_version
 
 async def get_permission_by_id(permission_id: str, db: AsyncIOMotorClient) -> Optional[PermissionDBModel]:
     """Lấy thông tin quyền hạn từ DB bằng ID."""
@@ -59,7 +62,9 @@ async def update_permission_db(permission_id: str, update_data: Dict[str, Any],
         {"_id": ObjectId(permission_id)},
         {"$set": update_data}
     )
+    invalidate_all_principals()
     if result.modified_count > 0:
+        await bump_permissions_version(db)
         updated_permission_doc = await permissions_collection.find_one({"_id": ObjectId(permission_id)})
         if updated_permission_doc:
             # Chuyển đổi ObjectId sang str trước khi validate
@@ -73,6 +78,9 @@ async def delete_permission_db(permission_id: str, db: AsyncIOMotorClient) -> bo
     if not ObjectId.is_valid(permission_id):
         return False
     result = await permissions_collection.delete_one({"_id": ObjectId(permission_id)})
+    invalidate_all_principals()
+    if result.deleted_count > 0:
+        await bump_permissions_version(db)
     return result.deleted_count > 0
 
 async def get_permissions_by_ids(permission_ids: List[str], db: AsyncIOMotorClient) -> List[PermissionDBModel]:
@@ -92,6 +100,22 @@ async def get_all_permissions_db(db: AsyncIOMotorClient) -> List[PermissionDBMod
     # Chuyển đổi ObjectId sang str cho mỗi tài liệu trước khi validate
     return [PermissionDBModel.model_validate({**doc, "_id": str(doc["_id"])}) async for doc in permissions_cursor]
 
+
+async def list_permissions_db(
+    db: AsyncIOMotorClient,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_by: str = "_id",
+    order: str = "asc",
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> Tuple[List[PermissionDBModel], Optional[str]]:
+    """Lấy một trang quyền hạn (keyset pagination); trả về (permissions, next_cursor)."""
+    permissions_collection = db["permissions"]
+    query = created_range_filter(created_after, created_before)
+    docs, next_cursor = await paginate(permissions_collection, query, limit, cursor, sort_by, order)
+    return [PermissionDBModel.model_validate({**doc, "_id": str(doc["_id"])}) for doc in docs], next_cursor
+
 async def find_roles_with_permission(permission_id: str, db: AsyncIOMotorClient) -> bool:
     """Kiểm tra xem có vai trò nào có quyền hạn này không."""
     roles_collection = db["roles"]
@@ -0,0 +1,25 @@
+# app/repository/permissions_version.py
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+# Tài liệu duy nhất lưu "permissions version": tăng mỗi khi dữ liệu phân quyền thay đổi
+# (vai trò, quyền hạn, hoặc role_ids/is_superuser/is_active của người dùng).
+PERMISSIONS_VERSION_DOC_ID = "permissions_version"
+
+async def get_permissions_version_db(db: AsyncIOMotorClient) -> int:
+    """Đọc permissions version hiện tại từ DB (0 nếu chưa có)."""
+    meta_collection = db["meta"]
+    doc = await meta_collection.find_one({"_id": PERMISSIONS_VERSION_DOC_ID})
+    return doc["value"] if doc else 0
+
+async def increment_permissions_version_db(db: AsyncIOMotorClient) -> int:
+    """Tăng permissions version một cách atomic và trả về giá trị mới."""
+    meta_collection = db["meta"]
+    doc = await meta_collection.find_one_and_update(
+        {"_id": PERMISSIONS_VERSION_DOC_ID},
+        {"$inc": {"value": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["value"]
@@ -0,0 +1,68 @@
+# app/repository/refresh_token.py
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Mỗi refresh token đã phát hành có một tài liệu trong collection "refresh_tokens":
+#   _id: sha256 của jti (không lưu token/jti gốc), family_id, user_id, expires_at (TTL index),
+#   used_at: có khi token đã được dùng để xoay vòng, revoked_at: có khi cả family bị thu hồi.
+# Các trường used_at/revoked_at chỉ được set khi cần để index sparse trên revoked_at luôn nhỏ.
+
+async def create_refresh_token_record(
+    token_hash: str, family_id: str, user_id: str, expires_at: datetime, db: AsyncIOMotorClient
+) -> None:
+    """Lưu bản ghi của một refresh token vừa phát hành."""
+    refresh_tokens_collection = db["refresh_tokens"]
+    await refresh_tokens_collection.insert_one({
+        "_id": token_hash,
+        "family_id": family_id,
+        "user_id": user_id,
+        "created_at": datetime.now(timezone.utc),
+        "expires_at": expires_at,
+    })
+
+async def consume_refresh_token(token_hash: str, db: AsyncIOMotorClient) -> Optional[Dict[str, Any]]:
+    """
+    Đánh dấu refresh token đã dùng một cách atomic (một round trip).
+    Trả về bản ghi nếu token còn hiệu lực (chưa dùng, family chưa bị thu hồi), ngược lại None.
+    """
+    refresh_tokens_collection = db["refresh_tokens"]
+    return await refresh_tokens_collection.find_one_and_update(
+        {"_id": token_hash, "used_at": {"$exists": False}, "revoked_at": {"$exists": False}},
+        {"$set": {"used_at": datetime.now(timezone.utc)}},
+    )
+
+async def get_refresh_token_record(token_hash: str, db: AsyncIOMotorClient) -> Optional[Dict[str, Any]]:
+    """Đọc bản ghi refresh token (dùng để phân biệt token bị dùng lại với token không tồn tại/đã hết hạn)."""
+    refresh_tokens_collection = db["refresh_tokens"]
+    return await refresh_tokens_collection.find_one({"_id": token_hash}, {"family_id": 1, "used_at": 1, "revoked_at": 1})
+
+async def get_refresh_token_records(token_hashes: List[str], db: AsyncIOMotorClient) -> Dict[str, Dict[str, Any]]:
+    """Đọc nhiều bản ghi refresh token bằng một query $in (introspection); trả về map hash -> bản ghi."""
+    refresh_tokens_collection = db["refresh_tokens"]
+    cursor = refresh_tokens_collection.find({"_id": {"$in": token_hashes}}, {"used_at": 1, "revoked_at": 1})
+    return {doc["_id"]: doc async for doc in cursor}
+
+async def revoke_refresh_token_family(family_id: str, db: AsyncIOMotorClient) -> int:
+    """Thu hồi mọi refresh token của một family. Trả về số bản ghi bị thu hồi."""
+    refresh_tokens_collection = db["refresh_tokens"]
+    result = await refresh_tokens_collection.update_many(
+        {"family_id": family_id, "revoked_at": {"$exists": False}},
+        {"$set": {"revoked_at": datetime.now(timezone.utc)}},
+    )
+    return result.modified_count
+
+async def is_refresh_token_family_revoked_db(family_id: str, db: AsyncIOMotorClient) -> bool:
+    refresh_tokens_collection = db["refresh_tokens"]
+    doc = await refresh_tokens_collection.find_one(
+        {"family_id": family_id, "revoked_at": {"$exists": True}}, {"_id": 1}
+    )
+    return doc is not None
+
+async def get_revoked_family_ids(db: AsyncIOMotorClient, since: Optional[datetime] = None) -> List[str]:
+    """Các family bị thu hồi (từ thời điểm `since` nếu có), dùng để nạp Bloom filter."""
+    refresh_tokens_collection = db["refresh_tokens"]
+    query: Dict[str, Any] = {"revoked_at": {"$gte": since} if since else {"$exists": True}}
+    return await refresh_tokens_collection.distinct("family_id", query)
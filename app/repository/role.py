@@ -1,11 +1,14 @@
 # app/repository/role.py
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from bson import ObjectId
 from datetime import datetime, timezone
 
 from app.models.role import RoleDBModel # Chỉ tương tác với Database Model
+from app.core.cache import invalidate_all_principals
+from app.core.pagination import paginate, created_range_filter
+from app.core.authz_version import bump_permissions_version
 
 async def get_role_by_id(role_id: str, db: AsyncIOMotorClient) -> Optional[RoleDBModel]:
     """Lấy thông tin vai trò từ DB bằng ID."""
@@ -59,7 +62,9 @@ async def update_role_db(role_id: str, update_data: Dict[str, Any], db: AsyncIOM
         {"_id": ObjectId(role_id)},
         {"$set": update_data}
     )
+    invalidate_all_principals()
     if result.modified_count > 0:
+        await bump_permissions_version(db)
         updated_role_doc = await roles_collection.find_one({"_id": ObjectId(role_id)})
         if updated_role_doc:
             # Chuyển đổi ObjectId sang str trước khi validate
@@ -73,6 +78,9 @@ async def delete_role_db(role_id: str, db: AsyncIOMotorClient) -> bool:
     if not ObjectId.is_valid(role_id):
         return False
     result = await roles_collection.delete_one({"_id": ObjectId(role_id)})
+    invalidate_all_principals()
+    if result.deleted_count > 0:
+        await bump_permissions_version(db)
     return result.deleted_count > 0
 
 async def get_roles_by_ids(role_ids: List[str], db: AsyncIOMotorClient) -> List[RoleDBModel]:
@@ -92,6 +100,31 @@ async def get_all_roles_db(db: AsyncIOMotorClient) -> List[RoleDBModel]:
     # Chuyển đổi ObjectId sang str cho mỗi tài liệu trước khi validate
     return [RoleDBModel.model_validate({**doc, "_id": str(doc["_id"])}) async for doc in roles_cursor]
 
+
+async def list_roles_db(
+    db: AsyncIOMotorClient,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_by: str = "_id",
+    order: str = "asc",
+    permission_id: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> Tuple[List[RoleDBModel], Optional[str]]:
+    """Lấy một trang vai trò (keyset pagination) kèm các bộ lọc; trả về (roles, next_cursor)."""
+    roles_collection = db["roles"]
+    query: Dict[str, Any] = created_range_filter(created_after, created_before)
+    if permission_id is not None:
+        query["permission_ids"] = permission_id
+    docs, next_cursor = await paginate(roles_collection, query, limit, cursor, sort_by, order)
+    return [RoleDBModel.model_validate({**doc, "_id": str(doc["_id"])}) for doc in docs], next_cursor
+
+async def get_role_ids_with_permission(permission_id: str, db: AsyncIOMotorClient) -> List[str]:
+    """ID các vai trò có quyền hạn này (dùng index permission_ids, chỉ trả về _id)."""
+    roles_collection = db["roles"]
+    roles_cursor = roles_collection.find({"permission_ids": permission_id}, {"_id": 1})
+    return [str(doc["_id"]) async for doc in roles_cursor]
+
 async def find_users_with_role(role_id: str, db: AsyncIOMotorClient) -> bool:
     """Kiểm tra xem có người dùng nào được gán vai trò này không."""
     users_collection = db["users"]
@@ -1,11 +1,21 @@
 # app/repository/user.py
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Iterable, Tuple
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
 from datetime import datetime, timezone
 
 from app.models.user import UserDBModel # Chỉ tương tác với Database Model
+from app.core.cache import invalidate_principal, invalidate_all_principals, token_epoch_cache
+from app.core.pagination import paginate, created_range_filter
+from app.core.authz_version import bump_permissions_version
+from app.repository.invalidation import increment_users_version_db
+
+# Các trường của user mà claims phân quyền trong token phụ thuộc vào
+AUTHZ_USER_FIELDS = ("role_ids", "is_superuser", "is_active")
+# Các trường bookkeeping đăng nhập: không ảnh hưởng tới principal/epoch đang cache
+BOOKKEEPING_USER_FIELDS = {"last_login_at", "login_count", "failed_login_attempts", "lockout_until", "updated_at"}
 
 async def get_user_by_id(user_id: str, db: AsyncIOMotorClient) -> Optional[UserDBModel]:
     """Lấy thông tin người dùng từ DB bằng ID."""
@@ -39,6 +49,73 @@ async def get_user_by_email(email: str, db: AsyncIOMotorClient) -> Optional[User
         return UserDBModel.model_validate(doc_to_validate)
     return None
 
+def _to_object_ids(field_expression: Any) -> Dict[str, Any]:
+    """Biểu thức aggregation chuyển mảng id dạng string (có thể null) thành ObjectId, bỏ qua id không hợp lệ."""
+    return {
+        "$filter": {
+            "input": {
+                "$map": {
+                    "input": {"$ifNull": [field_expression, []]},
+                    "as": "id",
+                    "in": {"$convert": {"input": "$$id", "to": "objectId", "onError": None, "onNull": None}},
+                }
+            },
+            "as": "oid",
+            "cond": {"$ne": ["$$oid", None]},
+        }
+    }
+
+def _user_with_access_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Pipeline lấy user cùng tên các vai trò và tên các quyền hạn (không trùng lặp) trong MỘT round trip.
+    Các $lookup dùng localField/foreignField trên _id nên được phục vụ bởi index _id.
+    """
+    return [
+        {"$match": match},
+        {"$limit": 1},
+        {"$addFields": {"_role_oids": _to_object_ids("$role_ids")}},
+        {"$lookup": {"from": "roles", "localField": "_role_oids", "foreignField": "_id", "as": "_roles"}},
+        {"$addFields": {
+            "_permission_oids": _to_object_ids({
+                "$reduce": {
+                    "input": "$_roles.permission_ids",
+                    "initialValue": [],
+                    "in": {"$setUnion": ["$$value", {"$ifNull": ["$$this", []]}]},
+                }
+            })
+        }},
+        {"$lookup": {"from": "permissions", "localField": "_permission_oids", "foreignField": "_id", "as": "_permissions"}},
+        # Chỉ trả về tên vai trò/quyền hạn, không trả về toàn bộ tài liệu role/permission
+        {"$addFields": {"_role_names": "$_roles.name", "_permission_names": "$_permissions.name"}},
+        {"$project": {"_roles": 0, "_permissions": 0, "_role_oids": 0, "_permission_oids": 0}},
+    ]
+
+async def get_user_with_access(match: Dict[str, Any], db: AsyncIOMotorClient) -> Optional[Tuple[UserDBModel, List[str], List[str]]]:
+    """
+    Lấy người dùng theo điều kiện match, kèm danh sách tên vai trò và tên quyền hạn duy nhất.
+    Trả về (UserDBModel, role_names, permission_names) hoặc None nếu không tìm thấy.
+    """
+    users_collection = db["users"]
+    docs = await users_collection.aggregate(_user_with_access_pipeline(match)).to_list(length=1)
+    if not docs:
+        return None
+    user_doc = docs[0]
+    role_names = user_doc.pop("_role_names", [])
+    permission_names = user_doc.pop("_permission_names", [])
+    # Chuyển đổi ObjectId sang str trước khi validate
+    doc_to_validate = {**user_doc, "_id": str(user_doc["_id"])}
+    return UserDBModel.model_validate(doc_to_validate), role_names, permission_names
+
+async def get_user_with_access_by_id(user_id: str, db: AsyncIOMotorClient) -> Optional[Tuple[UserDBModel, List[str], List[str]]]:
+    """Lấy người dùng theo ID kèm tên vai trò và quyền hạn (một round trip)."""
+    if not ObjectId.is_valid(user_id):
+        return None
+    return await get_user_with_access({"_id": ObjectId(user_id)}, db)
+
+async def get_user_with_access_by_username(username: str, db: AsyncIOMotorClient) -> Optional[Tuple[UserDBModel, List[str], List[str]]]:
+    """Lấy người dùng theo username kèm tên vai trò và quyền hạn (một round trip)."""
+    return await get_user_with_access({"username": username}, db)
+
 async def create_user_db(user_data: Dict[str, Any], db: AsyncIOMotorClient) -> UserDBModel:
     """
     Tạo một người dùng mới trong DB.
@@ -65,10 +142,13 @@ async def create_user_db(user_data: Dict[str, Any], db: AsyncIOMotorClient) -> U
         return UserDBModel.model_validate(doc_to_validate)
     raise Exception("Failed to retrieve inserted user document.") # Should not happen
 
-async def update_user_db(user_id: str, update_data: Dict[str, Any], db: AsyncIOMotorClient) -> Optional[UserDBModel]:
+async def update_user_db(
+    user_id: str, update_data: Dict[str, Any], db: AsyncIOMotorClient, bump_token_epoch: bool = False
+) -> Optional[UserDBModel]:
     """
     Cập nhật thông tin người dùng trong DB.
     Nhận vào dict các trường cần cập nhật.
+    `bump_token_epoch`: tăng token_epoch trong cùng lần ghi để vô hiệu hóa mọi token đã phát hành.
     """
     users_collection = db["users"]
     if not ObjectId.is_valid(user_id):
@@ -76,11 +156,18 @@ async def update_user_db(user_id: str, update_data: Dict[str, Any], db: AsyncIOM
     
     update_data["updated_at"] = datetime.now(timezone.utc) # Tự động cập nhật timestamp
 
-    result = await users_collection.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": update_data}
-    )
+    update: Dict[str, Any] = {"$set": update_data}
+    if bump_token_epoch:
+        update["$inc"] = {"token_epoch": 1}
+    result = await users_collection.update_one({"_id": ObjectId(user_id)}, update)
+    invalidate_principal(user_id)
+    if bump_token_epoch:
+        token_epoch_cache.invalidate(user_id)
     if result.modified_count > 0:
+        if any(field in update_data for field in AUTHZ_USER_FIELDS):
+            await bump_permissions_version(db)
+        elif bump_token_epoch or not set(update_data) <= BOOKKEEPING_USER_FIELDS:
+            await increment_users_version_db(db) # Worker khác ở chế độ polling xóa principal/epoch cache
         updated_user_doc = await users_collection.find_one({"_id": ObjectId(user_id)})
         if updated_user_doc:
             # Chuyển đổi ObjectId sang str trước khi validate
@@ -94,6 +181,9 @@ async def delete_user_db(user_id: str, db: AsyncIOMotorClient) -> bool:
     if not ObjectId.is_valid(user_id):
         return False
     result = await users_collection.delete_one({"_id": ObjectId(user_id)})
+    invalidate_principal(user_id)
+    if result.deleted_count > 0:
+        await bump_permissions_version(db)
     return result.deleted_count > 0
 
 async def update_last_login_at(user_id: str, db: AsyncIOMotorClient) -> None:
@@ -105,6 +195,7 @@ async def update_last_login_at(user_id: str, db: AsyncIOMotorClient) -> None:
         {"_id": ObjectId(user_id)},
         {"$set": {"last_login_at": datetime.now(timezone.utc)}}
     )
+    invalidate_principal(user_id) # last_login_at có trong UserInResponse
 
 async def increment_failed_login_attempts(user_id: str, db: AsyncIOMotorClient) -> None:
     """Tăng số lần đăng nhập thất bại của người dùng."""
@@ -136,9 +227,188 @@ async def clear_user_lockout_and_attempts(user_id: str, db: AsyncIOMotorClient)
         {"$set": {"lockout_until": None, "failed_login_attempts": 0}}
     )
 
+async def record_failed_login(
+    user_id: str,
+    max_attempts: int,
+    lockout_until: datetime,
+    db: AsyncIOMotorClient,
+) -> Optional[Dict[str, Any]]:
+    """
+    Ghi nhận một lần đăng nhập sai bằng MỘT lệnh find_one_and_update nguyên tử (update pipeline):
+    tăng failed_login_attempts và, nếu đạt max_attempts, đặt lockout_until trong cùng lệnh.
+    Các lần đăng nhập sai đồng thời không thể "lọt" qua ngưỡng khóa như khi tăng rồi đọc lại.
+    Trả về {failed_login_attempts, lockout_until} sau khi cập nhật.
+    """
+    users_collection = db["users"]
+    if not ObjectId.is_valid(user_id):
+        return None
+    return await users_collection.find_one_and_update(
+        {"_id": ObjectId(user_id)},
+        [
+            {"$set": {"failed_login_attempts": {"$add": [{"$ifNull": ["$failed_login_attempts", 0]}, 1]}}},
+            {"$set": {"lockout_until": {"$cond": [
+                {"$gte": ["$failed_login_attempts", max_attempts]},
+                lockout_until,
+                "$lockout_until",
+            ]}}},
+        ],
+        projection={"_id": 0, "failed_login_attempts": 1, "lockout_until": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def record_successful_login(user_id: str, db: AsyncIOMotorClient) -> None:
+    """Reset bộ đếm đăng nhập sai/lockout, cập nhật last_login_at và login_count trong một lần ghi."""
+    users_collection = db["users"]
+    if not ObjectId.is_valid(user_id):
+        return
+    await users_collection.update_one(
+        {"_id": ObjectId(user_id)},
+        {
+            "$set": {"failed_login_attempts": 0, "lockout_until": None},
+            "$max": {"last_login_at": datetime.now(timezone.utc)},
+            "$inc": {"login_count": 1},
+        }
+    )
+    invalidate_principal(user_id) # last_login_at có trong UserInResponse
+
+async def apply_login_bookkeeping_db(updates: Dict[str, Tuple[datetime, int]], db: AsyncIOMotorClient) -> int:
+    """
+    Ghi một loạt cập nhật last_login_at/login_count đã gộp theo user (user_id -> (last_login_at, số lần đăng nhập))
+    bằng một bulk_write không theo thứ tự. `$max` đảm bảo last_login_at không bị lùi lại nếu các lần flush chồng nhau.
+    Trả về số tài liệu đã được cập nhật.
+    """
+    users_collection = db["users"]
+    operations = [
+        UpdateOne(
+            {"_id": ObjectId(user_id)},
+            {"$max": {"last_login_at": last_login_at}, "$inc": {"login_count": login_count}},
+        )
+        for user_id, (last_login_at, login_count) in updates.items()
+        if ObjectId.is_valid(user_id)
+    ]
+    if not operations:
+        return 0
+    result = await users_collection.bulk_write(operations, ordered=False)
+    for user_id in updates:
+        invalidate_principal(user_id)
+    return result.modified_count
+
+async def update_password_hash_if_unchanged(user_id: str, old_hashed_password: str, new_hashed_password: str, db: AsyncIOMotorClient) -> bool:
+    """
+    Thay hash mật khẩu (rehash sang thuật toán/chi phí mới) chỉ khi hash trong DB vẫn là hash cũ,
+    để không ghi đè một lần đổi mật khẩu xảy ra đồng thời.
+    """
+    users_collection = db["users"]
+    if not ObjectId.is_valid(user_id):
+        return False
+    result = await users_collection.update_one(
+        {"_id": ObjectId(user_id), "hashed_password": old_hashed_password},
+        {"$set": {"hashed_password": new_hashed_password}}
+    )
+    return result.modified_count > 0
+
+async def iter_password_hashes(db: AsyncIOMotorClient, batch_size: int = 1000) -> AsyncIterator[str]:
+    """Duyệt hash mật khẩu của tất cả người dùng (chỉ lấy trường hashed_password)."""
+    users_collection = db["users"]
+    cursor = users_collection.find({}, {"_id": 0, "hashed_password": 1}).batch_size(batch_size)
+    async for doc in cursor:
+        yield doc.get("hashed_password", "")
+
+async def iter_users_for_export(db: AsyncIOMotorClient, fields: Iterable[str], batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Duyệt toàn bộ người dùng theo _id, chỉ lấy các trường cần export (không bao giờ có hashed_password).
+    Trả về tài liệu thô để tránh chi phí validate Pydantic cho từng dòng.
+    """
+    users_collection = db["users"]
+    projection = {field: 1 for field in fields}
+    cursor = users_collection.find({}, projection).sort("_id", 1).batch_size(batch_size)
+    async for doc in cursor:
+        yield doc
+
+async def get_token_epoch_db(user_id: str, db: AsyncIOMotorClient) -> Optional[int]:
+    """Đọc token_epoch của người dùng (chỉ một trường, theo _id). None nếu người dùng không tồn tại."""
+    users_collection = db["users"]
+    if not ObjectId.is_valid(user_id):
+        return None
+    doc = await users_collection.find_one({"_id": ObjectId(user_id)}, {"token_epoch": 1})
+    if doc is None:
+        return None
+    return doc.get("token_epoch", 0)
+
+async def bump_token_epoch_for_role_db(role_id: str, db: AsyncIOMotorClient) -> int:
+    """
+    Tăng token_epoch của mọi người dùng có vai trò `role_id` bằng một update_many (dùng index role_ids).
+    Trả về số người dùng bị ảnh hưởng.
+    """
+    users_collection = db["users"]
+    result = await users_collection.update_many(
+        {"role_ids": role_id},
+        {"$inc": {"token_epoch": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+    )
+    # Không biết trước user nào có trong cache: xóa toàn bộ để epoch mới có hiệu lực ngay trong process này
+    token_epoch_cache.clear()
+    invalidate_all_principals()
+    if result.modified_count > 0:
+        await increment_users_version_db(db)
+    return result.modified_count
+
+async def get_user_ids_with_roles(role_ids: List[str], db: AsyncIOMotorClient, limit: int) -> List[str]:
+    """
+    ID các người dùng có ít nhất một vai trò trong `role_ids` (dùng index role_ids, chỉ trả về _id).
+    Trả về tối đa `limit + 1` phần tử để caller biết danh sách đã vượt giới hạn.
+    """
+    users_collection = db["users"]
+    users_cursor = users_collection.find({"role_ids": {"$in": role_ids}}, {"_id": 1}).limit(limit + 1)
+    return [str(doc["_id"]) async for doc in users_cursor]
+
+async def get_users_by_ids(user_ids: List[str], db: AsyncIOMotorClient) -> List[UserDBModel]:
+    """Lấy danh sách người dùng theo danh sách ID bằng một query $in."""
+    users_collection = db["users"]
+    obj_ids = [ObjectId(uid) for uid in set(user_ids) if ObjectId.is_valid(uid)]
+    if not obj_ids:
+        return []
+    users_cursor = users_collection.find({"_id": {"$in": obj_ids}})
+    return [UserDBModel.model_validate({**doc, "_id": str(doc["_id"])}) async for doc in users_cursor]
+
+async def get_users_access_by_ids(user_ids: List[str], db: AsyncIOMotorClient) -> Dict[str, Dict[str, Any]]:
+    """
+    Lấy các trường phân quyền (role_ids, is_active, is_superuser) của nhiều người dùng bằng một query $in.
+    Trả về map user_id -> tài liệu (chỉ gồm các trường trên); ID không hợp lệ/không tồn tại bị bỏ qua.
+    """
+    users_collection = db["users"]
+    obj_ids = [ObjectId(uid) for uid in set(user_ids) if ObjectId.is_valid(uid)]
+    if not obj_ids:
+        return {}
+    cursor = users_collection.find(
+        {"_id": {"$in": obj_ids}},
+        {"role_ids": 1, "is_active": 1, "is_superuser": 1},
+    )
+    return {str(doc["_id"]): doc async for doc in cursor}
+
 async def get_all_users_db(db: AsyncIOMotorClient) -> List[UserDBModel]:
     """Lấy tất cả người dùng từ DB."""
     users_collection = db["users"]
     users_cursor = users_collection.find({})
     # Chuyển đổi ObjectId sang str cho mỗi tài liệu trước khi validate
-    return [UserDBModel.model_validate({**doc, "_id": str(doc["_id"])}) async for doc in users_cursor]
\ No newline at end of file
+    return [UserDBModel.model_validate({**doc, "_id": str(doc["_id"])}) async for doc in users_cursor]
+
+async def list_users_db(
+    db: AsyncIOMotorClient,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort_by: str = "_id",
+    order: str = "asc",
+    is_active: Optional[bool] = None,
+    role_id: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+) -> Tuple[List[UserDBModel], Optional[str]]:
+    """Lấy một trang người dùng (keyset pagination) kèm các bộ lọc; trả về (users, next_cursor)."""
+    users_collection = db["users"]
+    query: Dict[str, Any] = created_range_filter(created_after, created_before)
+    if is_active is not None:
+        query["is_active"] = is_active
+    if role_id is not None:
+        query["role_ids"] = role_id
+    docs, next_cursor = await paginate(users_collection, query, limit, cursor, sort_by, order)
+    return [UserDBModel.model_validate({**doc, "_id": str(doc["_id"])}) for doc in docs], next_cursor
\ No newline at end of file
@@ -0,0 +1,37 @@
+# app/schemas/authz.py
+
+from typing import List, Optional
+from pydantic import BaseModel, Field, model_validator
+
+class AuthzCheckItem(BaseModel):
+    subject: str = Field(..., description="ID người dùng cần kiểm tra")
+    permission: str = Field(..., description="Tên quyền hạn, ví dụ 'article:update_any'")
+
+# Có thể gửi nhiều cặp (subject, permission) trong `checks`, hoặc một `subject` với nhiều `permissions`,
+# hoặc cả hai trong cùng một request
+class AuthzCheckRequest(BaseModel):
+    checks: List[AuthzCheckItem] = Field(default_factory=list)
+    subject: Optional[str] = None
+    permissions: List[str] = Field(default_factory=list)
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if self.permissions and not self.subject:
+            raise ValueError("Cần có 'subject' khi gửi 'permissions'.")
+        if not self.checks and not self.permissions:
+            raise ValueError("Cần có ít nhất một kiểm tra trong 'checks' hoặc 'permissions'.")
+        return self
+
+    def items(self) -> List[AuthzCheckItem]:
+        """Danh sách phẳng các cặp (subject, permission) theo thứ tự gửi lên."""
+        return self.checks + [AuthzCheckItem(subject=self.subject, permission=p) for p in self.permissions]
+
+class AuthzCheckResult(BaseModel):
+    subject: str
+    permission: str
+    allowed: bool
+    # granted | superuser | denied | unknown_permission | subject_not_found | subject_inactive
+    reason: str
+
+class AuthzCheckResponse(BaseModel):
+    results: List[AuthzCheckResult] # Cùng thứ tự với các kiểm tra trong request
@@ -0,0 +1,12 @@
+# app/schemas/pagination.py
+
+from typing import Generic, List, Optional, TypeVar
+from pydantic import BaseModel, Field
+
+T = TypeVar("T")
+
+# Schema chung cho response phân trang bằng cursor
+class Page(BaseModel, Generic[T]):
+    items: List[T] = Field(default_factory=list)
+    next_cursor: Optional[str] = None # None nếu đây là trang cuối; truyền lại qua query `cursor` để lấy trang tiếp theo
+    limit: int
@@ -1,7 +1,7 @@
 # app/schemas/token.py
 
-from typing import Optional
-from pydantic import BaseModel
+from typing import Optional, List
+from pydantic import BaseModel, Field
 
 class Token(BaseModel):
     access_token: str
@@ -11,4 +11,25 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     user_id: Optional[str] = None # ID người dùng
     username: Optional[str] = None # Tên người dùng (có thể đưa vào nếu muốn, nhưng sub là đủ)
-    is_superuser: Optional[bool] = False # Cờ siêu quản trị viên (có thể đưa vào token để kiểm tra nhanh)
\ No newline at end of file
+    is_superuser: Optional[bool] = False # Cờ siêu quản trị viên (có thể đưa vào token để kiểm tra nhanh)
+    # Các trường dưới đây chỉ có khi STATELESS_AUTHZ_ENABLED (principal được dựng từ claims của access token)
+    roles: List[str] = Field(default_factory=list) # Tên các vai trò
+    permissions: List[str] = Field(default_factory=list) # Tên các quyền hạn
+    permissions_version: Optional[int] = None # Permissions version tại thời điểm phát hành token
+
+class TokenIntrospectionRequest(BaseModel):
+    tokens: List[str] = Field(..., min_length=1, description="Các token cần introspect")
+
+# Theo RFC 7662: token không hợp lệ/hết hạn/user không hoạt động chỉ trả về {"active": false}
+class TokenIntrospectionResult(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    username: Optional[str] = None
+    token_type: Optional[str] = None # access_token | refresh_token
+    exp: Optional[int] = None
+    is_superuser: Optional[bool] = None
+    roles: Optional[List[str]] = None
+    permissions: Optional[List[str]] = None
+
+class TokenIntrospectionResponse(BaseModel):
+    results: List[TokenIntrospectionResult] # Cùng thứ tự với `tokens` trong request
@@ -2,7 +2,7 @@
 
 from datetime import datetime
 from typing import List, Optional
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, PrivateAttr
 from app.base.base import BaseDomainModel # Import BaseDBModel
 
 # Base Models (dùng cho logic nghiệp vụ nội bộ hoặc cho các Schema khác kế thừa)
@@ -90,6 +90,13 @@ class UserInResponse(BaseModel):
     email_verified_at: Optional[datetime] = None # Thêm trường này
     password_changed_at: Optional[datetime] = None # Thêm trường này
 
+    # Permissions version đọc TRƯỚC khi populate roles/permissions (dùng cho claims của token stateless)
+    _permissions_version: Optional[int] = PrivateAttr(default=None)
+    # Bitmask quyền hiệu lực (OR mask các vai trò, xem app/core/permission_catalog.py)
+    _permission_mask: Optional[int] = PrivateAttr(default=None)
+    # Token epoch của user, được nhúng vào claim `tep` khi phát hành token
+    _token_epoch: int = PrivateAttr(default=0)
+
     class Config:
         from_attributes = True # Cho phép Pydantic đọc từ các thuộc tính của đối tượng (ví dụ: từ UserDBModel)
         json_schema_extra = {
@@ -0,0 +1,71 @@
+# app/services/authz_service.py
+
+import time
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.core.permission_catalog import permission_catalog, load_permission_catalog
+
+# Imports từ tầng repository
+from app.repository.user import get_users_access_by_ids
+
+# Imports từ tầng schemas
+from app.schemas.authz import AuthzCheckRequest, AuthzCheckResponse, AuthzCheckResult
+
+
+class CatalogReloadState:
+    last_reload_at: float = float("-inf")
+
+catalog_reload_state = CatalogReloadState()
+
+
+class AuthzService:
+    def __init__(self, db: AsyncIOMotorClient):
+        self.db = db
+
+    async def check(self, request: AuthzCheckRequest) -> AuthzCheckResponse:
+        """
+        Trả lời nhiều câu hỏi "subject X có quyền Y không" trong một request:
+        - Mọi subject khác nhau được đọc bằng một query $in (chỉ role_ids/is_active/is_superuser).
+        - Quyền hiệu lực là OR mask các vai trò lấy từ permission catalog dùng chung, mỗi kiểm tra là một phép AND.
+        """
+        items = request.items()
+        if len(items) > settings.AUTHZ_CHECK_MAX_ITEMS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Tối đa {settings.AUTHZ_CHECK_MAX_ITEMS} kiểm tra mỗi request.",
+            )
+
+        # Quyền hạn vừa được tạo ở worker khác có thể chưa có trong catalog của process này:
+        # nạp lại catalog, nhưng không quá một lần mỗi AUTHZ_CATALOG_RELOAD_SECONDS
+        if any(permission_catalog.bit_for(item.permission) is None for item in items):
+            now = time.monotonic()
+            if now - catalog_reload_state.last_reload_at >= settings.AUTHZ_CATALOG_RELOAD_SECONDS:
+                catalog_reload_state.last_reload_at = now
+                await load_permission_catalog(self.db)
+
+        users = await get_users_access_by_ids([item.subject for item in items], self.db)
+        masks: Dict[str, int] = {}
+        results: List[AuthzCheckResult] = []
+        for item in items:
+            user = users.get(item.subject)
+            bit: Optional[int] = permission_catalog.bit_for(item.permission)
+            if user is None:
+                allowed, reason = False, "subject_not_found"
+            elif not user.get("is_active", True):
+                allowed, reason = False, "subject_inactive"
+            elif user.get("is_superuser"):
+                allowed, reason = True, "superuser"
+            elif bit is None:
+                allowed, reason = False, "unknown_permission"
+            else:
+                mask = masks.get(item.subject)
+                if mask is None:
+                    mask = masks[item.subject] = permission_catalog.mask_for_roles(user.get("role_ids") or [])
+                allowed = mask & bit != 0
+                reason = "granted" if allowed else "denied"
+            results.append(AuthzCheckResult(subject=item.subject, permission=item.permission, allowed=allowed, reason=reason))
+        return AuthzCheckResponse(results=results)
@@ -1,9 +1,13 @@
 # app/services/permission_service.py
 
+from datetime import datetime
 from typing import Optional, List, Dict, Any
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from app.core.permission_catalog import permission_catalog
+from app.core.pagination import clamp_limit, InvalidCursorError
+
 # Imports từ tầng repository
 from app.repository.permission import (
     get_permission_by_id,
@@ -11,7 +15,7 @@ from app.repository.permission import (
     create_permission_db,
     update_permission_db,
     delete_permission_db,
-    get_all_permissions_db,
+    list_permissions_db,
     find_roles_with_permission # Thêm vào để kiểm tra khi xóa permission
 )
 
@@ -20,6 +24,7 @@ from app.models.permission import PermissionDBModel
 
 # Imports từ tầng schemas
 from app.schemas.permission import PermissionCreate, PermissionInResponse
+from app.schemas.pagination import Page
 
 
 class PermissionService:
@@ -41,6 +46,7 @@ class PermissionService:
         
         permission_data_for_db = permission_in.model_dump()
         new_permission_db_model = await create_permission_db(permission_data_for_db, self.db)
+        permission_catalog.upsert_permission(str(new_permission_db_model.id), new_permission_db_model.name)
         return PermissionInResponse.model_validate(new_permission_db_model)
 
     async def get_permission(self, permission_id: str) -> PermissionInResponse:
@@ -81,6 +87,7 @@ class PermissionService:
         updated_permission_db_model = await update_permission_db(permission_id, update_data, self.db)
         if not updated_permission_db_model:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Không thể cập nhật quyền hạn.")
+        permission_catalog.upsert_permission(permission_id, updated_permission_db_model.name)
         
         return PermissionInResponse.model_validate(updated_permission_db_model)
 
@@ -104,11 +111,28 @@ class PermissionService:
         deleted = await delete_permission_db(permission_id, self.db)
         if not deleted:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Không thể xóa quyền hạn.")
+        permission_catalog.remove_permission(permission_id)
         return deleted
 
-    async def get_all_permissions(self) -> List[PermissionInResponse]:
+    async def list_permissions(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "_id",
+        order: str = "asc",
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Page[PermissionInResponse]:
         """
-        Lấy tất cả quyền hạn.
+        Lấy một trang quyền hạn (keyset pagination).
         """
-        all_permissions_db = await get_all_permissions_db(self.db)
-        return [PermissionInResponse.model_validate(p) for p in all_permissions_db]
\ No newline at end of file
+        limit = clamp_limit(limit)
+        try:
+            permissions_db, next_cursor = await list_permissions_db(
+                self.db, limit, cursor, sort_by, order,
+                created_after=created_after, created_before=created_before,
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        items = [PermissionInResponse.model_validate(p) for p in permissions_db]
+        return Page[PermissionInResponse](items=items, next_cursor=next_cursor, limit=limit)
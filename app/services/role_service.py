@@ -1,9 +1,13 @@
 # app/services/role_service.py
 
+from datetime import datetime
 from typing import Optional, List, Dict, Any
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from app.core.permission_catalog import permission_catalog
+from app.core.pagination import clamp_limit, InvalidCursorError
+
 # Imports từ tầng repository
 from app.repository.role import (
     get_role_by_id,
@@ -11,10 +15,11 @@ from app.repository.role import (
     create_role_db,
     update_role_db,
     delete_role_db,
-    get_all_roles_db,
+    list_roles_db,
     find_users_with_role # Thêm vào để kiểm tra khi xóa role
 )
 from app.repository.permission import get_permissions_by_ids # Để lấy chi tiết quyền hạn từ IDs
+from app.repository.user import bump_token_epoch_for_role_db
 
 # Imports từ tầng models
 from app.models.role import RoleDBModel
@@ -22,7 +27,9 @@ from app.models.permission import PermissionDBModel
 
 # Imports từ tầng schemas
 from app.schemas.role import RoleCreate, RoleInResponse, RoleUpdate
+from app.schemas.pagination import Page
 from app.schemas.permission import PermissionInResponse # Để nhúng chi tiết permission vào RoleInResponse
+from app.schemas.user import MessageResponse
 
 
 class RoleService:
@@ -34,16 +41,31 @@ class RoleService:
         Helper function để chuyển đổi RoleDBModel thành RoleInResponse và populate
         các trường `permissions` dựa trên IDs.
         """
-        permissions_in_response: List[PermissionInResponse] = []
-        if role_db_model.permission_ids:
+        return (await self._populate_roles_permissions_response([role_db_model]))[0]
+
+    async def _populate_roles_permissions_response(self, role_db_models: List[RoleDBModel]) -> List[RoleInResponse]:
+        """
+        Populate `permissions` cho nhiều vai trò bằng một query permissions duy nhất,
+        rồi ghép kết quả trong bộ nhớ qua map id -> PermissionInResponse.
+        """
+        permission_ids = list({permission_id for role in role_db_models for permission_id in role.permission_ids})
+        permissions_by_id: Dict[str, PermissionInResponse] = {}
+        if permission_ids:
             # Lấy thông tin chi tiết của các quyền hạn từ DB
-            permissions_db_models = await get_permissions_by_ids(role_db_model.permission_ids, self.db)
+            permissions_db_models = await get_permissions_by_ids(permission_ids, self.db)
             # Ánh xạ từ PermissionDBModel sang PermissionInResponse Schema
-            permissions_in_response = [PermissionInResponse.model_validate(p) for p in permissions_db_models]
-        
-        role_response = RoleInResponse.model_validate(role_db_model)
-        role_response.permissions = permissions_in_response
-        return role_response
+            permissions_by_id = {str(p.id): PermissionInResponse.model_validate(p) for p in permissions_db_models}
+
+        roles_in_response = []
+        for role_db_model in role_db_models:
+            role_response = RoleInResponse.model_validate(role_db_model)
+            role_response.permissions = [
+                permissions_by_id[permission_id]
+                for permission_id in dict.fromkeys(role_db_model.permission_ids)
+                if permission_id in permissions_by_id
+            ]
+            roles_in_response.append(role_response)
+        return roles_in_response
 
     async def create_new_role(self, role_in: RoleCreate) -> RoleInResponse:
         """
@@ -70,6 +92,7 @@ class RoleService:
 
         role_data_for_db = role_in.model_dump() # Chuyển đổi RoleCreate sang dict
         new_role_db_model = await create_role_db(role_data_for_db, self.db)
+        permission_catalog.upsert_role(str(new_role_db_model.id), new_role_db_model.permission_ids)
         return await self._populate_role_permissions_response(new_role_db_model)
 
     async def get_role(self, role_id: str) -> RoleInResponse:
@@ -117,6 +140,7 @@ class RoleService:
         updated_role_db_model = await update_role_db(role_id, update_data, self.db)
         if not updated_role_db_model:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Không thể cập nhật vai trò.")
+        permission_catalog.upsert_role(role_id, updated_role_db_model.permission_ids)
         
         return await self._populate_role_permissions_response(updated_role_db_model)
 
@@ -141,14 +165,41 @@ class RoleService:
         deleted = await delete_role_db(role_id, self.db)
         if not deleted:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Không thể xóa vai trò.")
+        permission_catalog.remove_role(role_id)
         return deleted
 
-    async def get_all_roles(self) -> List[RoleInResponse]:
+    async def revoke_role_tokens(self, role_id: str) -> MessageResponse:
         """
-        Lấy tất cả vai trò.
+        Thu hồi mọi token của các người dùng có vai trò này (ví dụ khi vai trò bị lạm dụng):
+        tăng token_epoch của họ bằng một update_many, người dùng phải đăng nhập lại.
         """
-        all_roles_db = await get_all_roles_db(self.db)
-        roles_in_response = []
-        for role_db in all_roles_db:
-            roles_in_response.append(await self._populate_role_permissions_response(role_db))
-        return roles_in_response
\ No newline at end of file
+        role_db_model = await get_role_by_id(role_id, self.db)
+        if not role_db_model:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Vai trò không tìm thấy.")
+
+        affected_users = await bump_token_epoch_for_role_db(role_id, self.db)
+        return MessageResponse(message=f"Đã thu hồi token của {affected_users} người dùng có vai trò '{role_db_model.name}'.")
+
+    async def list_roles(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "_id",
+        order: str = "asc",
+        permission_id: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Page[RoleInResponse]:
+        """
+        Lấy một trang vai trò (keyset pagination).
+        """
+        limit = clamp_limit(limit)
+        try:
+            roles_db, next_cursor = await list_roles_db(
+                self.db, limit, cursor, sort_by, order,
+                permission_id=permission_id, created_after=created_after, created_before=created_before,
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        items = await self._populate_roles_permissions_response(roles_db)
+        return Page[RoleInResponse](items=items, next_cursor=next_cursor, limit=limit)
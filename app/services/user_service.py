@@ -1,22 +1,36 @@
 # app/services/user_service.py
 
-from typing import Optional, List, Dict, Any
+import asyncio
+from typing import Optional, List, Dict, Any, Set, AsyncIterator
 from datetime import datetime, timedelta, timezone
 
 from fastapi import HTTPException, status
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
 from jose import jwt, JWTError # Thêm JWTError để bắt lỗi giải mã token
 
 # Imports từ tầng core
 from app.core.security import (
-    get_password_hash,
-    verify_password,
+    get_password_hash_async,
+    verify_password_async,
+    password_needs_rehash,
     create_access_token,
     create_refresh_token,
-    TokenData,
     decode_token,
+    decode_token_cached,
+    new_token_id,
+    hash_token_id,
 )
 from app.core.config import settings
+from app.core.cache import principal_cache
+from app.core.authz_version import current_permissions_version
+from app.core.permission_catalog import permission_catalog
+from app.core.pagination import clamp_limit, InvalidCursorError
+from app.core.indexes import duplicate_key_field
+from app.core.bookkeeping import login_bookkeeping
+from app.core.export import USER_EXPORT_FIELDS, encode_csv, encode_ndjson
+from app.core.revocation import revoked_families
+from app.core.token_epoch import current_token_epoch
 
 # Imports từ tầng repository
 from app.repository.user import (
@@ -25,14 +39,24 @@ from app.repository.user import (
     get_user_by_id,
     create_user_db,
     update_user_db,
-    clear_user_lockout_and_attempts,
-    increment_failed_login_attempts,
-    set_user_lockout,
-    update_last_login_at,
-    get_all_users_db
+    delete_user_db,
+    record_failed_login,
+    record_successful_login,
+    update_password_hash_if_unchanged,
+    get_user_with_access_by_id,
+    get_user_with_access_by_username,
+    list_users_db,
+    iter_users_for_export,
+    get_users_by_ids
 )
-from app.repository.role import get_roles_by_ids
-from app.repository.permission import get_permissions_by_ids
+from app.repository.refresh_token import (
+    create_refresh_token_record,
+    consume_refresh_token,
+    get_refresh_token_record,
+    get_refresh_token_records
+)
+from app.repository.role import get_roles_by_ids, get_all_roles_db
+from app.repository.permission import get_permissions_by_ids, get_all_permissions_db
 
 # Imports từ tầng models (Database Models)
 from app.models.user import UserDBModel
@@ -50,7 +74,18 @@ from app.schemas.user import (
     ChangeEmailRequest,    # Mới
     MessageResponse        # Mới
 )
-from app.schemas.token import Token
+from app.schemas.token import Token, TokenIntrospectionResponse, TokenIntrospectionResult
+from app.schemas.pagination import Page
+
+# Giữ tham chiếu tới các task nền để chúng không bị garbage collect khi đang chạy
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Datetime đọc từ Mongo là naive (UTC); gắn tzinfo để so sánh được với datetime.now(timezone.utc)."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
 
 
 class UserService:
@@ -62,45 +97,89 @@ class UserService:
         Helper function để chuyển đổi UserDBModel thành UserInResponse và populate
         các trường `roles` và `permissions` dựa trên IDs.
         """
-        roles_db_models: List[RoleDBModel] = []
-        permissions_db_models: List[PermissionDBModel] = []
+        return (await self._get_populated_user_responses([user_db_model]))[0]
 
-        if user_db_model.role_ids:
-            roles_db_models = await get_roles_by_ids(user_db_model.role_ids, self.db)
-            
-            all_permission_ids = []
-            for role in roles_db_models:
-                all_permission_ids.extend(role.permission_ids)
-            
-            if all_permission_ids:
-                unique_permission_ids = list(set(all_permission_ids))
-                permissions_db_models = await get_permissions_by_ids(unique_permission_ids, self.db)
+    async def _get_populated_user_responses(self, user_db_models: List[UserDBModel]) -> List[UserInResponse]:
+        """
+        Populate `roles` và `permissions` cho nhiều người dùng cùng lúc:
+        chỉ một query roles và một query permissions cho cả danh sách (thay vì 2 query cho mỗi người dùng),
+        sau đó ghép kết quả trong bộ nhớ qua các map id -> tên.
+        """
+        permissions_version = await self._permissions_version_for_claims()
+
+        role_ids = list({role_id for user in user_db_models for role_id in user.role_ids})
+        roles_db_models: List[RoleDBModel] = await get_roles_by_ids(role_ids, self.db) if role_ids else []
+        roles_by_id: Dict[str, RoleDBModel] = {str(role.id): role for role in roles_db_models}
 
-        roles_in_response = [role.name for role in roles_db_models]
-        permissions_in_response = [permission.name for permission in permissions_db_models]
+        permission_ids = list({permission_id for role in roles_db_models for permission_id in role.permission_ids})
+        permissions_db_models: List[PermissionDBModel] = await get_permissions_by_ids(permission_ids, self.db) if permission_ids else []
+        permission_names_by_id: Dict[str, str] = {str(permission.id): permission.name for permission in permissions_db_models}
 
+        # Dữ liệu vừa đọc từ DB luôn mới nhất: cập nhật catalog để mask tính ra không bị cũ
+        for permission in permissions_db_models:
+            permission_catalog.upsert_permission(str(permission.id), permission.name)
+        for role in roles_db_models:
+            permission_catalog.upsert_role(str(role.id), role.permission_ids)
+
+        users_in_response = []
+        for user_db_model in user_db_models:
+            user_roles = [roles_by_id[role_id] for role_id in dict.fromkeys(user_db_model.role_ids) if role_id in roles_by_id]
+            permission_names = [
+                permission_names_by_id[permission_id]
+                for permission_id in dict.fromkeys(permission_id for role in user_roles for permission_id in role.permission_ids)
+                if permission_id in permission_names_by_id
+            ]
+            users_in_response.append(self._build_user_response(
+                user_db_model,
+                [role.name for role in user_roles],
+                permission_names,
+                permissions_version,
+                permission_mask=permission_catalog.mask_for_roles(str(role.id) for role in user_roles),
+            ))
+        return users_in_response
+
+    async def _permissions_version_for_claims(self) -> Optional[int]:
+        """
+        Permissions version dùng cho claims của token stateless.
+        Phải lấy TRƯỚC khi đọc roles/permissions: nếu dữ liệu đổi trong lúc đọc, token sẽ mang version cũ.
+        """
+        if not settings.STATELESS_AUTHZ_ENABLED:
+            return None
+        return await current_permissions_version(self.db)
+
+    def _build_user_response(
+        self,
+        user_db_model: UserDBModel,
+        role_names: List[str],
+        permission_names: List[str],
+        permissions_version: Optional[int],
+        permission_mask: Optional[int] = None,
+    ) -> UserInResponse:
+        """Dựng UserInResponse từ UserDBModel và tên các vai trò/quyền hạn đã được resolve."""
         user_response = UserInResponse.model_validate(user_db_model)
-        user_response.roles = roles_in_response
-        user_response.permissions = permissions_in_response
-        
+        user_response.roles = role_names
+        user_response.permissions = permission_names
+        user_response._permissions_version = permissions_version
+        if permission_mask is None:
+            permission_mask = permission_catalog.mask_for_names(permission_names)
+        user_response._permission_mask = permission_mask
+        user_response._token_epoch = user_db_model.token_epoch
         return user_response
 
+    async def _get_user_response_by_id(self, user_id: str) -> Optional[UserInResponse]:
+        """Lấy user kèm roles/permissions bằng một aggregation duy nhất (thay vì 3 query nối tiếp)."""
+        permissions_version = await self._permissions_version_for_claims()
+        user_with_access = await get_user_with_access_by_id(user_id, self.db)
+        if not user_with_access:
+            return None
+        user_db_model, role_names, permission_names = user_with_access
+        return self._build_user_response(user_db_model, role_names, permission_names, permissions_version)
+
     async def register_new_user(self, user_in: UserCreate) -> UserInResponse:
         """Logic nghiệp vụ để đăng ký người dùng mới."""
-        existing_user_by_username = await get_user_by_username(user_in.username, self.db)
-        if existing_user_by_username:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Tên người dùng đã tồn tại."
-            )
-        existing_user_by_email = await get_user_by_email(user_in.email, self.db)
-        if existing_user_by_email:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email đã được đăng ký."
-            )
-
-        hashed_password = get_password_hash(user_in.password)
+        # Không kiểm tra trùng lặp trước: index unique trên username/email (app/core/indexes.py)
+        # đảm bảo điều này một cách nguyên tử và DuplicateKeyError được chuyển thành lỗi 400 bên dưới.
+        hashed_password = await get_password_hash_async(user_in.password)
 
         user_data_for_db = user_in.model_dump()
         user_data_for_db["hashed_password"] = hashed_password
@@ -113,12 +192,40 @@ class UserService:
             else:
                 print(f"Cảnh báo: Vai trò mặc định '{settings.DEFAULT_USER_ROLE_NAME}' không tìm thấy trong DB.")
 
-        new_user_db_model = await create_user_db(user_data_for_db, self.db)
+        try:
+            new_user_db_model = await create_user_db(user_data_for_db, self.db)
+        except DuplicateKeyError as e:
+            field = duplicate_key_field(e)
+            if field == "email":
+                detail = "Email đã được đăng ký."
+            elif field == "username":
+                detail = "Tên người dùng đã tồn tại."
+            else:
+                detail = "Tên người dùng hoặc email đã tồn tại."
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
         return await self._get_populated_user_response(new_user_db_model)
 
     async def authenticate_user(self, username: str, password: str) -> UserInResponse:
-        """Logic nghiệp vụ để xác thực người dùng."""
-        user = await get_user_by_username(username, self.db)
+        """
+        Logic nghiệp vụ để xác thực người dùng.
+        Mỗi lần thử chỉ gồm một lần đọc theo index username và tối đa một lần ghi:
+        - Sai mật khẩu: một find_one_and_update nguyên tử (tăng bộ đếm + khóa có điều kiện).
+        - Đúng mật khẩu: last_login_at/login_count được ghi trễ qua login_bookkeeping;
+          chỉ ghi trực tiếp khi cần reset bộ đếm đăng nhập sai/lockout.
+        roles/permissions chỉ được populate (trong cùng lần đọc, bằng aggregation) khi bật
+        STATELESS_AUTHZ_ENABLED, vì chỉ khi đó chúng mới được nhúng vào token.
+        """
+        permissions_version = None
+        role_names: List[str] = []
+        permission_names: List[str] = []
+        if settings.STATELESS_AUTHZ_ENABLED:
+            permissions_version = await self._permissions_version_for_claims()
+            user_with_access = await get_user_with_access_by_username(username, self.db)
+            user = None
+            if user_with_access:
+                user, role_names, permission_names = user_with_access
+        else:
+            user = await get_user_by_username(username, self.db)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -126,22 +233,21 @@ class UserService:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        if user.lockout_until and user.lockout_until > datetime.now(timezone.utc):
-            lockout_remaining = user.lockout_until - datetime.now(timezone.utc)
+        now = datetime.now(timezone.utc)
+        lockout_until = _as_utc(user.lockout_until)
+        if lockout_until and lockout_until > now:
+            lockout_remaining = lockout_until - now
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Tài khoản bị khóa đến {user.lockout_until.isoformat()} UTC ({int(lockout_remaining.total_seconds())} giây còn lại). Vui lòng thử lại sau.",
+                detail=f"Tài khoản bị khóa đến {lockout_until.isoformat()} UTC ({int(lockout_remaining.total_seconds())} giây còn lại). Vui lòng thử lại sau.",
             )
 
-        if not verify_password(password, user.hashed_password):
-            await increment_failed_login_attempts(str(user.id), self.db)
-            
-            updated_user = await get_user_by_username(username, self.db) 
-            
-            if updated_user and updated_user.failed_login_attempts >= settings.MAX_FAILED_LOGIN_ATTEMPTS:
-                lockout_duration = timedelta(minutes=settings.LOCKOUT_DURATION_MINUTES)
-                lockout_until = datetime.now(timezone.utc) + lockout_duration
-                await set_user_lockout(str(updated_user.id), lockout_until, self.db)
+        if not await verify_password_async(password, user.hashed_password):
+            new_lockout_until = datetime.now(timezone.utc) + timedelta(minutes=settings.LOCKOUT_DURATION_MINUTES)
+            login_state = await record_failed_login(
+                str(user.id), settings.MAX_FAILED_LOGIN_ATTEMPTS, new_lockout_until, self.db
+            )
+            if login_state and login_state.get("failed_login_attempts", 0) >= settings.MAX_FAILED_LOGIN_ATTEMPTS:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail=f"Tài khoản của bạn đã bị khóa trong {settings.LOCKOUT_DURATION_MINUTES} phút do quá nhiều lần đăng nhập sai.",
@@ -152,23 +258,74 @@ class UserService:
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        await clear_user_lockout_and_attempts(str(user.id), self.db)
-        await update_last_login_at(str(user.id), self.db)
+        if user.failed_login_attempts or user.lockout_until:
+            # Phải reset bộ đếm ngay (ảnh hưởng tới lần đăng nhập sau), ghi trực tiếp cùng last_login_at
+            await record_successful_login(str(user.id), self.db)
+        elif not login_bookkeeping.record_login(str(user.id)):
+            await record_successful_login(str(user.id), self.db)
+
+        if password_needs_rehash(user.hashed_password):
+            self._schedule_password_rehash(str(user.id), password, user.hashed_password)
         
-        return await self._get_populated_user_response(user)
+        return self._build_user_response(user, role_names, permission_names, permissions_version)
 
-    async def create_auth_tokens(self, user_db_model: UserDBModel) -> Token:
-        """Logic nghiệp vụ để tạo Access Token và Refresh Token."""
+    def _schedule_password_rehash(self, user_id: str, password: str, old_hashed_password: str) -> None:
+        """
+        Rehash mật khẩu sang thuật toán/chi phí hiện tại ở nền, sau khi đăng nhập thành công,
+        để không làm tăng độ trễ của request đăng nhập.
+        """
+        async def rehash():
+            try:
+                new_hashed_password = await get_password_hash_async(password)
+                await update_password_hash_if_unchanged(user_id, old_hashed_password, new_hashed_password, self.db)
+            except Exception as e:
+                print(f"Cảnh báo: Không thể rehash mật khẩu cho người dùng {user_id}: {e}")
+
+        task = asyncio.create_task(rehash())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def create_auth_tokens(
+        self, user_db_model: UserDBModel, family_id: Optional[str] = None, token_epoch: Optional[int] = None
+    ) -> Token:
+        """
+        Logic nghiệp vụ để tạo Access Token và Refresh Token.
+        Refresh token mang `jti` (dùng một lần) và `fid` (family: chuỗi các refresh token xoay vòng từ
+        một lần đăng nhập); hash của jti được lưu vào collection refresh_tokens có TTL.
+        `family_id` = None khi đăng nhập (family mới), hoặc family hiện tại khi xoay vòng.
+        Cả hai token mang claim `tep` (token epoch của user, mặc định lấy từ user_db_model).
+        """
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         refresh_token_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
+        family_id = family_id or new_token_id()
+        token_id = new_token_id()
+        if token_epoch is None:
+            token_epoch = getattr(user_db_model, "_token_epoch", None)
+        if token_epoch is None:
+            token_epoch = getattr(user_db_model, "token_epoch", 0)
         
         access_token_payload = {
             "sub": str(user_db_model.id), 
             "username": user_db_model.username, 
-            "is_superuser": user_db_model.is_superuser
+            "is_superuser": user_db_model.is_superuser,
+            "fid": family_id, # Thu hồi family cũng vô hiệu hóa các access token của nó
+            "tep": token_epoch,
         }
+
+        # Chế độ stateless: nhúng claims phân quyền để requires_permission không cần đọc DB
+        permissions_version = getattr(user_db_model, "_permissions_version", None)
+        if settings.STATELESS_AUTHZ_ENABLED and permissions_version is not None:
+            access_token_payload["roles"] = user_db_model.roles
+            access_token_payload["perms"] = user_db_model.permissions
+            access_token_payload["pv"] = permissions_version
         
-        refresh_token_payload = {"sub": str(user_db_model.id)}
+        refresh_token_payload = {
+            "sub": str(user_db_model.id), "type": "refresh", "jti": token_id, "fid": family_id, "tep": token_epoch
+        }
+        await create_refresh_token_record(
+            hash_token_id(token_id), family_id, str(user_db_model.id),
+            datetime.now(timezone.utc) + refresh_token_expires, self.db,
+        )
         
         access_token = create_access_token(
             data=access_token_payload, expires_delta=access_token_expires
@@ -179,39 +336,152 @@ class UserService:
         return Token(access_token=access_token, refresh_token=refresh_token, token_type="bearer")
 
     async def refresh_access_token(self, refresh_token: str) -> Token:
-        """Logic nghiệp vụ để làm mới Access Token bằng Refresh Token."""
+        """
+        Logic nghiệp vụ để làm mới Access Token bằng Refresh Token (xoay vòng):
+        - Chỉ nhận refresh token (type=refresh, có jti/fid); access token bị từ chối.
+        - Refresh token được đánh dấu đã dùng một cách atomic và được thay bằng token mới cùng family.
+        - Dùng lại một refresh token đã xoay vòng (dấu hiệu token bị lộ) thu hồi cả family:
+          mọi refresh token và access token phát hành từ lần đăng nhập đó đều mất hiệu lực.
+        """
+        invalid_token_exception = HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token không hợp lệ hoặc đã hết hạn.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
         try:
             payload = decode_token(refresh_token, settings.SECRET_KEY)
-            user_id = payload.get("sub")
-            if not user_id:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Refresh token không hợp lệ (thiếu user ID)."
-                )
-            token_data = TokenData(user_id=user_id)
-
         except JWTError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Refresh token không hợp lệ hoặc đã hết hạn.",
-            )
-
-        user = await get_user_by_id(token_data.user_id, self.db)
+            raise invalid_token_exception
+        user_id, token_id, family_id = payload.get("sub"), payload.get("jti"), payload.get("fid")
+        if payload.get("type") != "refresh" or not user_id or not token_id or not family_id:
+            raise invalid_token_exception
+        # Token phát hành trước khi epoch tăng (đổi mật khẩu, thu hồi...) bị từ chối trước khi tiêu thụ
+        token_epoch = await current_token_epoch(user_id, self.db)
+        if token_epoch is None or payload.get("tep", 0) < token_epoch:
+            raise invalid_token_exception
+
+        token_hash = hash_token_id(token_id)
+        if await consume_refresh_token(token_hash, self.db) is None:
+            record = await get_refresh_token_record(token_hash, self.db)
+            if record is not None and "revoked_at" not in record:
+                # Token đã được dùng trước đó: thu hồi cả family
+                revoked_count = await revoked_families.revoke(family_id, self.db)
+                print(f"Refresh token reuse detected for user {user_id}: revoked family {family_id} ({revoked_count} tokens).")
+            raise invalid_token_exception
+
+        # Principal đã populate (qua principal cache) để access token mới mang claims phân quyền ở chế độ stateless
+        user = (await self.get_user_profiles([user_id])).get(user_id)
         if not user or not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Người dùng không tồn tại hoặc không hoạt động.",
             )
         
-        return await self.create_auth_tokens(user)
+        return await self.create_auth_tokens(user, family_id=family_id, token_epoch=token_epoch)
 
     async def get_user_profile(self, user_id: str) -> UserInResponse:
-        """Lấy thông tin profile người dùng."""
-        user_db_model = await get_user_by_id(user_id, self.db)
-        if not user_db_model:
+        """
+        Lấy thông tin profile người dùng.
+        Kết quả được cache theo user id (xem app/core/cache.py); không được sửa đổi object trả về.
+        """
+        cache_version = principal_cache.version() # Lấy trước khi đọc DB để không cache dữ liệu đã bị invalidate
+        cached_user = principal_cache.get(user_id)
+        if cached_user is not None:
+            return cached_user
+
+        user_response = await self._get_user_response_by_id(user_id)
+        if not user_response:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Người dùng không tìm thấy.")
         
-        return await self._get_populated_user_response(user_db_model)
+        principal_cache.set(user_id, user_response, version=cache_version)
+        return user_response
+
+    async def get_user_profiles(self, user_ids: List[str]) -> Dict[str, UserInResponse]:
+        """
+        Phiên bản hàng loạt của get_user_profile: các user có trong principal cache được lấy từ cache,
+        phần còn lại được đọc bằng một query $in và populate chung (một query roles, một query permissions).
+        Trả về map user_id -> UserInResponse; user không tồn tại không có trong kết quả.
+        """
+        cache_version = principal_cache.version()
+        profiles: Dict[str, UserInResponse] = {}
+        missing_ids: List[str] = []
+        for user_id in dict.fromkeys(user_ids):
+            cached_user = principal_cache.get(user_id)
+            if cached_user is not None:
+                profiles[user_id] = cached_user
+            else:
+                missing_ids.append(user_id)
+
+        if missing_ids:
+            user_db_models = await get_users_by_ids(missing_ids, self.db)
+            for user_response in await self._get_populated_user_responses(user_db_models):
+                principal_cache.set(user_response.id, user_response, version=cache_version)
+                profiles[user_response.id] = user_response
+        return profiles
+
+    async def introspect_tokens(self, tokens: List[str]) -> TokenIntrospectionResponse:
+        """
+        Introspection kiểu RFC 7662 cho nhiều token trong một request (dành cho API gateway):
+        - Mỗi token được xác minh chữ ký/exp (qua token cache); token lỗi, hết hạn, thuộc family đã bị
+          thu hồi, có token epoch cũ hoặc không phải access/refresh token (ví dụ token reset mật khẩu) là inactive.
+        - Refresh token chỉ active khi bản ghi trong refresh_tokens còn và chưa được dùng/thu hồi.
+        - Principal của mọi token hợp lệ được resolve một lần qua get_user_profiles; token epoch được so
+          với epoch trong profile đó (không đọc epoch riêng cho từng token).
+        - Token của user không tồn tại hoặc không hoạt động là inactive.
+        """
+        if len(tokens) > settings.TOKEN_INTROSPECTION_MAX_TOKENS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Tối đa {settings.TOKEN_INTROSPECTION_MAX_TOKENS} token mỗi request.",
+            )
+
+        claims_list: List[Optional[Dict[str, Any]]] = []
+        for token in tokens:
+            try:
+                claims = decode_token_cached(token, settings.SECRET_KEY)
+            except JWTError:
+                claims = None
+            if claims is not None and (not claims.get("sub") or claims.get("type") not in (None, "refresh")):
+                claims = None
+            if claims is not None and claims.get("fid") and await revoked_families.is_revoked(claims["fid"], self.db):
+                claims = None
+            claims_list.append(claims)
+
+        # Refresh token đã dùng (xoay vòng), bị thu hồi hoặc đã hết hạn (bản ghi bị TTL xóa) là inactive,
+        # giống /auth/refresh-token. Mọi bản ghi được đọc bằng một query $in.
+        refresh_hashes = {
+            index: hash_token_id(claims["jti"])
+            for index, claims in enumerate(claims_list)
+            if claims is not None and claims.get("type") == "refresh" and claims.get("jti")
+        }
+        records = await get_refresh_token_records(list(set(refresh_hashes.values())), self.db) if refresh_hashes else {}
+        for index, claims in enumerate(claims_list):
+            if claims is None or claims.get("type") != "refresh":
+                continue
+            record = records.get(refresh_hashes.get(index))
+            if record is None or record.get("used_at") or record.get("revoked_at"):
+                claims_list[index] = None
+
+        profiles = await self.get_user_profiles([claims["sub"] for claims in claims_list if claims is not None])
+
+        results: List[TokenIntrospectionResult] = []
+        for claims in claims_list:
+            user = profiles.get(claims["sub"]) if claims is not None else None
+            # Token epoch lấy từ profile đã batch (không đọc epoch theo từng token)
+            if user is None or not user.is_active or claims.get("tep", 0) < user._token_epoch:
+                results.append(TokenIntrospectionResult(active=False))
+                continue
+            results.append(TokenIntrospectionResult(
+                active=True,
+                sub=user.id,
+                username=user.username,
+                token_type="refresh_token" if claims.get("type") == "refresh" else "access_token",
+                exp=claims.get("exp"),
+                is_superuser=user.is_superuser,
+                roles=user.roles,
+                permissions=user.permissions,
+            ))
+        return TokenIntrospectionResponse(results=results)
 
     async def update_user_profile(self, user_id: str, user_update: UserUpdate) -> UserInResponse:
         """Cập nhật thông tin profile người dùng."""
@@ -222,7 +492,7 @@ class UserService:
         update_data = user_update.model_dump(exclude_unset=True)
 
         if "password" in update_data and update_data["password"]:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+            update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
 
         if "role_ids" in update_data and update_data["role_ids"] is not None:
             if update_data["role_ids"]:
@@ -233,20 +503,75 @@ class UserService:
                         detail="Một hoặc nhiều ID vai trò không hợp lệ trong dữ liệu cập nhật."
                     )
 
-        updated_user_db_model = await update_user_db(user_id, update_data, self.db)
+        # Đổi mật khẩu hoặc vô hiệu hóa tài khoản: thu hồi mọi token đã phát hành
+        bump_token_epoch = "hashed_password" in update_data or update_data.get("is_active") is False
+        updated_user_db_model = await update_user_db(user_id, update_data, self.db, bump_token_epoch=bump_token_epoch)
         if not updated_user_db_model:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Không thể cập nhật người dùng.")
         
-        return await self._get_populated_user_response(updated_user_db_model)
+        user_response = await self._get_user_response_by_id(user_id)
+        if not user_response: # Người dùng bị xóa ngay sau khi cập nhật
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Người dùng không tìm thấy.")
+        return user_response
 
-    async def get_all_users(self) -> List[UserInResponse]:
-        """Lấy tất cả người dùng."""
-        all_users_db = await get_all_users_db(self.db)
-        
-        users_in_response = []
-        for user_db in all_users_db:
-            users_in_response.append(await self._get_populated_user_response(user_db))
-        return users_in_response
+    async def list_users(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sort_by: str = "_id",
+        order: str = "asc",
+        is_active: Optional[bool] = None,
+        role_id: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Page[UserInResponse]:
+        """Lấy một trang người dùng (keyset pagination), roles/permissions được populate theo lô."""
+        limit = clamp_limit(limit)
+        try:
+            users_db, next_cursor = await list_users_db(
+                self.db, limit, cursor, sort_by, order,
+                is_active=is_active, role_id=role_id,
+                created_after=created_after, created_before=created_before,
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        items = await self._get_populated_user_responses(users_db)
+        return Page[UserInResponse](items=items, next_cursor=next_cursor, limit=limit)
+
+    async def stream_users_export(self, export_format: str, batch_size: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Stream toàn bộ danh bạ người dùng dưới dạng NDJSON hoặc CSV, mỗi batch của Motor cursor là một chunk.
+        Roles/permissions được nạp một lần thành map id -> tên (2 query), không populate từng người dùng,
+        nên bộ nhớ dùng không phụ thuộc vào số lượng người dùng.
+        """
+        batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+        roles = await get_all_roles_db(self.db)
+        permission_names_by_id = {str(p.id): p.name for p in await get_all_permissions_db(self.db)}
+        role_names_by_id = {str(role.id): role.name for role in roles}
+        role_permission_ids = {str(role.id): role.permission_ids for role in roles}
+
+        db_fields = [field for field in USER_EXPORT_FIELDS if field not in ("id", "roles", "permissions")] + ["role_ids"]
+        records: List[Dict[str, Any]] = []
+        first_chunk = True
+
+        def encode_chunk() -> bytes:
+            if export_format == "csv":
+                return encode_csv(records, include_header=first_chunk)
+            return encode_ndjson(records)
+
+        async for doc in iter_users_for_export(self.db, db_fields, batch_size):
+            role_ids = [role_id for role_id in dict.fromkeys(doc.get("role_ids") or []) if role_id in role_names_by_id]
+            permission_ids = dict.fromkeys(pid for role_id in role_ids for pid in role_permission_ids[role_id])
+            doc["id"] = str(doc["_id"])
+            doc["roles"] = [role_names_by_id[role_id] for role_id in role_ids]
+            doc["permissions"] = [permission_names_by_id[pid] for pid in permission_ids if pid in permission_names_by_id]
+            records.append({field: doc.get(field) for field in USER_EXPORT_FIELDS})
+            if len(records) >= batch_size:
+                yield encode_chunk()
+                records.clear()
+                first_chunk = False
+        if records or first_chunk:
+            yield encode_chunk()
 
     async def delete_user(self, user_id: str) -> bool:
         """Xóa người dùng."""
@@ -313,7 +638,7 @@ class UserService:
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Người dùng không tìm thấy.")
 
-        hashed_new_password = get_password_hash(request.new_password)
+        hashed_new_password = await get_password_hash_async(request.new_password)
         
         update_data = {
             "hashed_password": hashed_new_password,
@@ -321,7 +646,7 @@ class UserService:
             "failed_login_attempts": 0, # Reset attempts
             "lockout_until": None # Clear lockout
         }
-        updated_user = await update_user_db(str(user.id), update_data, self.db)
+        updated_user = await update_user_db(str(user.id), update_data, self.db, bump_token_epoch=True) # Đăng xuất khỏi mọi thiết bị
         
         if not updated_user:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Không thể đặt lại mật khẩu.")
@@ -336,16 +661,16 @@ class UserService:
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Người dùng không tìm thấy.")
 
-        if not verify_password(request.old_password, user.hashed_password):
+        if not await verify_password_async(request.old_password, user.hashed_password):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Mật khẩu cũ không đúng.")
 
-        hashed_new_password = get_password_hash(request.new_password)
+        hashed_new_password = await get_password_hash_async(request.new_password)
         
         update_data = {
             "hashed_password": hashed_new_password,
             "password_changed_at": datetime.now(timezone.utc)
         }
-        updated_user = await update_user_db(str(user.id), update_data, self.db)
+        updated_user = await update_user_db(str(user.id), update_data, self.db, bump_token_epoch=True) # Đăng xuất khỏi mọi thiết bị
 
         if not updated_user:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Không thể thay đổi mật khẩu.")
@@ -364,7 +689,7 @@ class UserService:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tài khoản đã bị vô hiệu hóa.")
 
         update_data = {"is_active": False}
-        updated_user = await update_user_db(str(user.id), update_data, self.db)
+        updated_user = await update_user_db(str(user.id), update_data, self.db, bump_token_epoch=True) # Đăng xuất khỏi mọi thiết bị
 
         if not updated_user:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Không thể vô hiệu hóa tài khoản.")
@@ -385,7 +710,7 @@ class UserService:
         if user.is_active:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tài khoản đã hoạt động.")
 
-        if not verify_password(password, user.hashed_password):
+        if not await verify_password_async(password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Tên người dùng hoặc mật khẩu không đúng.",
@@ -468,7 +793,7 @@ class UserService:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Người dùng không tìm thấy.")
 
         # Xác minh mật khẩu hiện tại của người dùng
-        if not verify_password(request.password, user.hashed_password):
+        if not await verify_password_async(request.password, user.hashed_password):
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Mật khẩu không đúng.")
         
         # Kiểm tra email mới có trùng với email hiện tại không
@@ -0,0 +1,105 @@
+# benchmarks/login_storm.py
+
+"""
+Đo độ trễ p50/p95/p99 của /auth/me trong khi một "cơn bão" đăng nhập đang chạy.
+
+Chạy với server đang hoạt động (ví dụ: uvicorn main:app --workers 1):
+    python -m benchmarks.login_storm --base-url http://localhost:8000 \\
+        --username testuser --password UserPassword123! --storm-concurrency 50 --duration 20
+
+So sánh kết quả khi PASSWORD_HASH_POOL_SIZE=0 (bcrypt chạy trên thread pool mặc định)
+và khi để mặc định (process pool theo số CPU).
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+import httpx
+
+from app.core.config import settings
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Tính percentile theo phương pháp nearest-rank."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> httpx.Response:
+    return await client.post(
+        f"{settings.API_V1_STR}/auth/login",
+        data={"username": username, "password": password},
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+    )
+
+
+async def login_storm_worker(client: httpx.AsyncClient, args: argparse.Namespace, deadline: float, counter: List[int]):
+    """Đăng nhập liên tục cho tới deadline (mỗi lần là một lần bcrypt verify trên server)."""
+    while time.perf_counter() < deadline:
+        await login(client, args.storm_username or args.username, args.storm_password or args.password)
+        counter[0] += 1
+
+
+async def me_probe(client: httpx.AsyncClient, token: str, deadline: float, interval: float, latencies: List[float]):
+    """Gọi /auth/me đều đặn và ghi lại độ trễ (ms)."""
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get(f"{settings.API_V1_STR}/auth/me", headers=headers)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if response.status_code == 200:
+            latencies.append(elapsed_ms)
+        await asyncio.sleep(interval)
+
+
+async def run(args: argparse.Namespace):
+    limits = httpx.Limits(max_connections=args.storm_concurrency + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        response = await login(client, args.username, args.password)
+        response.raise_for_status()
+        token = response.json()["access_token"]
+
+        # Pha 1: đo baseline khi không có tải đăng nhập
+        baseline: List[float] = []
+        await me_probe(client, token, time.perf_counter() + args.baseline_duration, args.probe_interval, baseline)
+
+        # Pha 2: đo /auth/me trong khi login storm đang chạy
+        under_storm: List[float] = []
+        logins = [0]
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(
+            me_probe(client, token, deadline, args.probe_interval, under_storm),
+            *(login_storm_worker(client, args, deadline, logins) for _ in range(args.storm_concurrency)),
+        )
+
+    print(f"Logins completed during storm: {logins[0]} ({logins[0] / args.duration:.1f}/s)")
+    for label, samples in (("baseline", baseline), ("login storm", under_storm)):
+        print(
+            f"/auth/me {label:<12} n={len(samples):<6} "
+            f"p50={percentile(samples, 50):8.2f}ms "
+            f"p95={percentile(samples, 95):8.2f}ms "
+            f"p99={percentile(samples, 99):8.2f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /auth/me p99 latency during a login storm.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", required=True, help="Tài khoản dùng để lấy token cho /auth/me")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--storm-username", help="Tài khoản dùng cho login storm (mặc định giống --username)")
+    parser.add_argument("--storm-password")
+    parser.add_argument("--storm-concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0, help="Thời gian chạy login storm (giây)")
+    parser.add_argument("--baseline-duration", type=float, default=5.0)
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# benchmarks/token_decode.py
+
+"""
+Micro-benchmark: decode_token (kiểm tra chữ ký + parse JSON mỗi lần) so với decode_token_cached
+khi cùng một token được gửi lặp lại.
+
+    python -m benchmarks.token_decode --iterations 100000
+"""
+
+import argparse
+import time
+from datetime import timedelta
+
+from app.core.cache import token_cache
+from app.core.config import settings
+from app.core.security import create_access_token, decode_token, decode_token_cached
+
+
+def bench(label: str, fn, token: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(token, settings.SECRET_KEY)
+    per_call_us = (time.perf_counter() - started) / iterations * 1_000_000
+    print(f"{label:<20} {per_call_us:8.2f}us/call")
+    return per_call_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decode_token vs decode_token_cached.")
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    token = create_access_token(
+        {"sub": "60d5ec49f7e3d1a4e8b8c7c1", "username": "johndoe", "is_superuser": False},
+        expires_delta=timedelta(minutes=30),
+    )
+    plain = bench("decode_token", decode_token, token, args.iterations)
+    cached = bench("decode_token_cached", decode_token_cached, token, args.iterations)
+    print(f"speedup: {plain / cached:.1f}x, cache stats: {token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# benchmarks/user_population.py
+
+"""
+So sánh số round trip và độ trễ khi populate một người dùng (roles + permissions):
+- "chained": get_user_by_username + get_roles_by_ids + get_permissions_by_ids (3 truy vấn nối tiếp).
+- "aggregation": get_user_with_access_by_username (một pipeline $lookup duy nhất).
+
+Chạy trực tiếp với MongoDB (không cần server FastAPI):
+    python -m benchmarks.user_population --username testuser --iterations 500
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.repository.user import get_user_by_username, get_user_with_access_by_username
+from app.repository.role import get_roles_by_ids
+from app.repository.permission import get_permissions_by_ids
+from benchmarks.login_storm import percentile
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Đếm số lệnh gửi tới server (mỗi lệnh là một round trip)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def populate_chained(username: str, db) -> List[str]:
+    """Đường đi cũ của UserService._get_populated_user_response."""
+    user = await get_user_by_username(username, db)
+    roles = await get_roles_by_ids(user.role_ids, db)
+    permission_ids = {permission_id for role in roles for permission_id in role.permission_ids}
+    permissions = await get_permissions_by_ids(list(permission_ids), db)
+    return [permission.name for permission in permissions]
+
+
+async def populate_aggregation(username: str, db) -> List[str]:
+    _, _, permission_names = await get_user_with_access_by_username(username, db)
+    return permission_names
+
+
+async def measure(label: str, fn: Callable[[str, object], Awaitable[List[str]]], args: argparse.Namespace, db, counter: CommandCounter):
+    for _ in range(args.warmup):
+        await fn(args.username, db)
+    latencies: List[float] = []
+    counter.count = 0
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        await fn(args.username, db)
+        latencies.append((time.perf_counter() - started) * 1000)
+    print(
+        f"{label:<12} round trips/call={counter.count / args.iterations:4.1f} "
+        f"p50={percentile(latencies, 50):7.2f}ms "
+        f"p95={percentile(latencies, 95):7.2f}ms "
+        f"p99={percentile(latencies, 99):7.2f}ms"
+    )
+
+
+async def run(args: argparse.Namespace):
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(settings.MONGODB_URI, uuidRepresentation="standard", event_listeners=[counter])
+    try:
+        db = client[settings.MONGODB_DB_NAME]
+        if await get_user_by_username(args.username, db) is None:
+            raise SystemExit(f"Không tìm thấy người dùng '{args.username}'.")
+        chained = sorted(await populate_chained(args.username, db))
+        aggregated = sorted(await populate_aggregation(args.username, db))
+        if chained != aggregated:
+            raise SystemExit(f"Kết quả không khớp: {chained} != {aggregated}")
+        await measure("chained", populate_chained, args, db, counter)
+        await measure("aggregation", populate_aggregation, args, db, counter)
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chained queries vs $lookup aggregation for user population.")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# check_query_plans.py
+
+import argparse
+import asyncio
+
+# Imports từ app.core
+from app.core.config import settings
+from app.core.query_plans import (
+    DEFAULT_MAX_EXAMINED_RATIO,
+    check_on_seeded_database,
+    check_query_shapes,
+    format_plan_reports,
+    load_query_shapes,
+    query_plan_client,
+)
+
+
+async def check_query_plans(args: argparse.Namespace) -> int:
+    """
+    Explain các query shape đã ghi bởi `pytest --query-shapes-out=...` và báo cáo COLLSCAN,
+    SORT trong bộ nhớ, $lookup không dùng index và tỷ lệ docs examined / returned vượt ngưỡng.
+    Chỉ kết nối tới TEST_MONGODB_URI: mặc định explain trên database tạm được seed; `--existing-db` dùng
+    một database có sẵn trên cùng mongod (ví dụ bản sao staging đã restore về local).
+    """
+    shapes = load_query_shapes(args.shapes)
+    if args.existing_db:
+        client = query_plan_client()
+        try:
+            reports = await check_query_shapes(shapes, client[args.existing_db], args.max_ratio)
+        finally:
+            client.close()
+    else:
+        reports = await check_on_seeded_database(shapes, args.db, users=args.users, max_examined_ratio=args.max_ratio)
+
+    print(format_plan_reports(reports, verbose=args.verbose))
+    return 1 if any(report.problems or report.error for report in reports) else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kiểm tra query plan của các truy vấn repository.")
+    parser.add_argument("shapes", help="File JSON tạo bởi pytest --query-shapes-out")
+    parser.add_argument("--db", default=f"{settings.MONGODB_DB_NAME}_query_plans", help="Database tạm trên TEST_MONGODB_URI được seed (bị xóa sau khi chạy)")
+    parser.add_argument("--users", type=int, default=2000, help="Số người dùng giả được seed")
+    parser.add_argument("--existing-db", default=None, help="Explain trên database có sẵn của TEST_MONGODB_URI thay vì seed database tạm")
+    parser.add_argument("--max-ratio", type=float, default=DEFAULT_MAX_EXAMINED_RATIO, help="Tỷ lệ docs examined / returned tối đa")
+    parser.add_argument("--verbose", action="store_true", help="In plan của mọi shape, kể cả shape không có vấn đề")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(check_query_plans(args)))
@@ -0,0 +1,22 @@
+# gunicorn.conf.py
+# Gunicorn tự nạp file này khi chạy từ thư mục gốc của project (xem Procfile).
+
+import os
+import shutil
+import tempfile
+
+# prometheus_client chạy chế độ multiprocess khi biến này có sẵn lúc worker import app:
+# mỗi worker ghi số liệu vào file riêng trong thư mục, /metrics gộp lại (xem app/core/metrics.py)
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus_multiproc_")
+
+def on_starting(server):
+    """Xóa số liệu còn sót lại từ lần chạy trước (các counter sẽ bị cộng dồn nếu giữ lại)."""
+    multiproc_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    """Worker bị restart: đánh dấu process đã chết để dọn file số liệu live của nó."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -8,6 +8,7 @@ from typing import List # Thêm import List
 from app.core.database import init_mongo, close_mongo, get_database
 from app.core.security import get_password_hash
 from app.core.config import settings # RẤT QUAN TRỌNG: Import settings
+from app.core.indexes import ensure_indexes
 
 # Imports từ app.repository
 from app.repository.role import (
@@ -63,6 +64,9 @@ async def initialize_db_data():
     await db["users"].delete_many({})
     print("Existing data cleared.")
 
+    # --- Ensure indexes (unique username/email/role name/permission name, ...) ---
+    await ensure_indexes(db)
+
     # --- Create default Roles ---
     default_roles_data = [
         {"name": "superadmin", "description": "Full access to everything"},
@@ -105,6 +109,7 @@ async def initialize_db_data():
         {"name": "role:read_all", "description": "Read all roles"},
         {"name": "role:update", "description": "Update any role"},
         {"name": "role:delete", "description": "Delete any role"},
+        {"name": "role:revoke_tokens", "description": "Revoke all tokens of users having a role"},
 
         # Permission permissions (to manage permissions themselves)
         {"name": "permission:create", "description": "Create new permissions"},
@@ -112,6 +117,12 @@ async def initialize_db_data():
         {"name": "permission:update", "description": "Update any permission"},
         {"name": "permission:delete", "description": "Delete any permission"},
 
+        # Token introspection (gateway)
+        {"name": "token:introspect", "description": "Introspect access/refresh tokens via /auth/introspect"},
+
+        # Authorization check API (gateway/backend)
+        {"name": "authz:check", "description": "Check permissions of other users via /authz/check"},
+
         # Example content permissions
         {"name": "article:create", "description": "Create articles"},
         {"name": "article:read_all", "description": "Read all articles"},
@@ -151,6 +162,7 @@ async def initialize_db_data():
         existing_permissions["role:read_all"],
         existing_permissions["role:update"],
         existing_permissions["role:delete"],
+        existing_permissions["role:revoke_tokens"],
         existing_permissions["permission:read_all"],
     ]
     await set_permissions_for_role(existing_roles["admin"], admin_perms, db)
@@ -3,6 +3,14 @@
 from fastapi import FastAPI
 from app.core.config import settings
 from app.core.database import lifespan # Import lifespan từ database.py
+from app.core.bookkeeping import login_bookkeeping
+from app.core.cache import principal_cache, token_cache
+from app.core.revocation import revoked_families
+from app.core.invalidation import invalidation_bus
+from app.core.rate_limit import login_rate_limiter
+from app.core.admission import admission_controller
+from app.core.metrics import PrometheusMiddleware
+from app.core.request_timing import ServerTimingMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 
 # THAY ĐỔI: Import các hàm get_router từ mỗi file endpoint
@@ -10,6 +18,9 @@ from app.api.v1.endpoints.auth import get_auth_router
 from app.api.v1.endpoints.users import get_users_router # Đã sửa để import hàm
 from app.api.v1.endpoints.roles import get_roles_router # Đã sửa để import hàm
 from app.api.v1.endpoints.permissions import get_permissions_router # Đã sửa để import hàm
+from app.api.v1.endpoints.authz import get_authz_router
+from app.api.v1.endpoints.jwks import get_jwks_router
+from app.api.v1.endpoints.metrics import get_metrics_router
 
 print("--- main.py: Starting FastAPI app initialization ---")
 
@@ -49,11 +60,33 @@ app.include_router(roles_router_instance, prefix=f"{settings.API_V1_STR}", tags=
 permissions_router_instance = get_permissions_router() # Gọi hàm get_permissions_router()
 app.include_router(permissions_router_instance, prefix=f"{settings.API_V1_STR}", tags=["Permission Management"])
 
+authz_router_instance = get_authz_router()
+app.include_router(authz_router_instance, prefix=f"{settings.API_V1_STR}", tags=["Authorization Checks"])
+
+# JWKS nằm ở gốc (không có API prefix) theo quy ước /.well-known
+app.include_router(get_jwks_router())
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(PrometheusMiddleware) # Thêm sau CORS nên bao ngoài cùng: đo cả thời gian của các middleware khác
+    app.include_router(get_metrics_router()) # /metrics ở gốc cho Prometheus scrape
+
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware) # Server-Timing/X-DB-Roundtrips (DEBUG_MODE) và log request chậm
+
 @app.get("/health", tags=["Health Check"])
 async def health_check():
     """
     Endpoint kiểm tra trạng thái sức khỏe của dịch vụ.
     """
-    return {"status": "ok", "service": "Auth & RBAC Microservice"}
+    return {
+        "status": "ok",
+        "service": "Auth & RBAC Microservice",
+        "login_bookkeeping": login_bookkeeping.stats(), # Độ sâu hàng đợi và độ trễ flush của buffer ghi trễ
+        "caches": [principal_cache.stats(), token_cache.stats()], # Kích thước và hit ratio của các cache trong process
+        "revoked_families": revoked_families.stats(), # Bloom filter các refresh token family bị thu hồi
+        "invalidation_bus": invalidation_bus.stats(), # Chế độ (change_stream/polling) và số invalidation đã áp dụng
+        "login_rate_limiter": login_rate_limiter.stats(), # Số lần đăng nhập bị từ chối với 429
+        "admission": admission_controller.stats(), # Slot/hàng đợi của các endpoint băm mật khẩu, số request bị 503
+    }
 
 print("--- main.py: FastAPI app initialization complete ---")
@@ -0,0 +1,103 @@
+# manage_signing_keys.py
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+# Imports từ app.core
+from app.core.keyring import load_keyring
+
+CURVES = {"ES256": ec.SECP256R1(), "ES384": ec.SECP384R1(), "ES512": ec.SECP521R1()}
+
+
+def _read(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"active_kid": None, "keys": []}
+
+def _write(path: str, data: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.chmod(tmp_path, 0o600) # File chứa private key
+    os.replace(tmp_path, path)
+    load_keyring(path) # Kiểm tra file mới nạp được trước khi kết thúc
+
+
+def generate_key(path: str, kid: str, algorithm: str, activate: bool) -> None:
+    """
+    Thêm một khóa EC mới vào keyring. Mặc định khóa mới chưa được dùng để ký (chỉ được công bố trong JWKS)
+    để các service khác kịp cache public key trước khi token đầu tiên được ký bằng nó.
+    """
+    data = _read(path)
+    if any(entry["kid"] == kid for entry in data["keys"]):
+        raise SystemExit(f"Khóa '{kid}' đã tồn tại.")
+    private_key = ec.generate_private_key(CURVES[algorithm])
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    data["keys"].append({"kid": kid, "alg": algorithm, "private_key": private_pem})
+    if activate or not data.get("active_kid"):
+        data["active_kid"] = kid
+    _write(path, data)
+    print(f"Added key '{kid}' ({algorithm}). Active key: {data['active_kid']}.")
+
+def activate_key(path: str, kid: str) -> None:
+    """Chuyển khóa dùng để ký token mới sang `kid`."""
+    data = _read(path)
+    data["active_kid"] = kid
+    _write(path, data)
+    print(f"Active key: {kid}.")
+
+def retire_key(path: str, kid: str, remove: bool) -> None:
+    """
+    Bỏ private key của một khóa cũ (chỉ giữ public key để xác minh token chưa hết hạn),
+    hoặc xóa hẳn khỏi keyring (và JWKS) với --remove khi mọi token ký bằng nó đã hết hạn.
+    """
+    data = _read(path)
+    if data.get("active_kid") == kid:
+        raise SystemExit("Không thể retire khóa đang active; hãy activate khóa khác trước.")
+    keyring = load_keyring(path)
+    if kid not in keyring.keys:
+        raise SystemExit(f"Không tìm thấy khóa '{kid}'.")
+    if remove:
+        data["keys"] = [entry for entry in data["keys"] if entry["kid"] != kid]
+    else:
+        public_pem = keyring.keys[kid].verifying_key.to_pem().decode()
+        for entry in data["keys"]:
+            if entry["kid"] == kid:
+                entry.pop("private_key", None)
+                entry["public_key"] = public_pem
+    _write(path, data)
+    print(f"Key '{kid}' {'removed' if remove else 'retired (public key only)'}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quản lý keyring ký JWT (JWT_SIGNING_KEYS_FILE).")
+    parser.add_argument("--file", default=os.environ.get("JWT_SIGNING_KEYS_FILE", "jwt_signing_keys.json"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="Tạo khóa mới")
+    generate_parser.add_argument("--kid", default=datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"))
+    generate_parser.add_argument("--alg", default="ES256", choices=sorted(CURVES))
+    generate_parser.add_argument("--activate", action="store_true", help="Dùng khóa mới để ký ngay")
+
+    activate_parser = subparsers.add_parser("activate", help="Đổi khóa dùng để ký")
+    activate_parser.add_argument("kid")
+
+    retire_parser = subparsers.add_parser("retire", help="Bỏ private key hoặc xóa khóa cũ")
+    retire_parser.add_argument("kid")
+    retire_parser.add_argument("--remove", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        generate_key(args.file, args.kid, args.alg, args.activate)
+    elif args.command == "activate":
+        activate_key(args.file, args.kid)
+    else:
+        retire_key(args.file, args.kid, args.remove)
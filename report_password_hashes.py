@@ -0,0 +1,49 @@
+# report_password_hashes.py
+
+import asyncio
+from collections import Counter
+
+from passlib.context import CryptContext
+
+# Imports từ app.core
+from app.core.database import init_mongo, close_mongo, get_database
+from app.core.security import pwd_context
+from app.core.password_hashing import HASHER_REGISTRY, describe_hash
+
+# Imports từ app.repository
+from app.repository.user import iter_password_hashes
+
+async def report_password_hashes():
+    """
+    Báo cáo phân bố thuật toán và chi phí băm mật khẩu trong collection `users`,
+    cùng số hash sẽ được rehash ở lần đăng nhập tiếp theo theo cấu hình hiện tại.
+    """
+    await init_mongo()
+    db = await get_database()
+
+    # Context chỉ dùng để nhận diện hash của mọi thuật toán trong registry
+    identify_context = CryptContext(schemes=list(HASHER_REGISTRY))
+
+    distribution = Counter()
+    needs_update = 0
+    total = 0
+    async for hashed_password in iter_password_hashes(db):
+        total += 1
+        distribution[describe_hash(identify_context, hashed_password)] += 1
+        try:
+            if pwd_context.needs_update(hashed_password):
+                needs_update += 1
+        except ValueError: # Hash không thuộc thuật toán nào đang cấu hình
+            needs_update += 1
+
+    print(f"\nPassword hash distribution across {total} users:")
+    for description, count in distribution.most_common():
+        percentage = (count / total * 100) if total else 0
+        print(f"  {description:<40} {count:>8}  ({percentage:5.1f}%)")
+    print(f"\nCurrent policy: {', '.join(pwd_context.schemes())} (primary: {pwd_context.default_scheme()})")
+    print(f"Hashes that will be rehashed on next login: {needs_update}")
+
+    await close_mongo()
+
+if __name__ == "__main__":
+    asyncio.run(report_password_hashes())
@@ -1,91 +1,151 @@
 # tests/conftest.py
 
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+import pymongo
 import pytest
-import asyncio
-from httpx import AsyncClient
+import pytest_asyncio
+from fastapi import status
+from httpx import ASGITransport, AsyncClient
 from motor.motor_asyncio import AsyncIOMotorClient
-from datetime import datetime, timedelta, timezone
-from typing import Dict # Thêm import Dict
+from pymongo import monitoring
 
 # Import các thành phần của ứng dụng
 from main import app # Import ứng dụng FastAPI chính của bạn
+from app.core.cache import principal_cache, token_epoch_cache
 from app.core.config import settings
-# SỬA ĐỔI DÒNG NÀY: Bỏ 'client as mongo_client_instance'
-from app.core.database import get_database, close_mongo 
-from app.core.security import get_password_hash, create_access_token, create_refresh_token
+from app.core.database import get_database, lifespan
+from app.core.permission_catalog import load_permission_catalog
+from app.repository.permission import create_permission_db
+from app.repository.role import create_role_db
 from app.schemas.token import Token
 from app.schemas.user import UserCreate, UserInResponse
 
-# Đảm bảo pytest-asyncio được cấu hình đúng
-@pytest.fixture(scope="session")
-def event_loop():
-    """Tạo một event loop riêng cho các bài kiểm thử bất đồng bộ."""
-    policy = asyncio.get_event_loop_policy()
-    loop = policy.new_event_loop()
-    yield loop
-    loop.close()
+# Tùy chọn --query-plans / --query-shapes-out (xem tests/query_plan_plugin.py)
+pytest_plugins = ["tests.query_plan_plugin"]
+
+# Các test dùng Mongo chạy trên một database riêng (không bao giờ là database phát triển)
+TEST_DB_NAME = f"{settings.MONGODB_DB_NAME}_test"
+
+
+# --- Ghi lại các lệnh Mongo của một request (dùng cho tests/test_roundtrip_budget.py) ---
+
+# Lệnh bắt tay/xác thực của driver, không phải round trip do code ứng dụng gửi
+IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "saslStart", "saslContinue", "authenticate", "endSessions"}
+
+class CommandRecorder(monitoring.CommandListener):
+    """
+    Listener đăng ký toàn cục (mọi MongoClient tạo sau đó đều dùng): chỉ ghi lại lệnh được gửi trong
+    context đang bật `recording()`. Motor copy context sang thread của driver nên lệnh từ các task
+    nền (bookkeeping, invalidation bus...) không bị tính vào request đang được đo.
+    """
+
+    def __init__(self):
+        self._commands: ContextVar[Optional[List[str]]] = ContextVar("recorded_commands", default=None)
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        commands = self._commands.get()
+        if commands is None or event.command_name in IGNORED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        with self._lock:
+            commands.append(f"{event.command_name} {target}" if isinstance(target, str) else event.command_name)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+    @contextmanager
+    def recording(self) -> Iterator[List[str]]:
+        """`with command_recorder.recording() as commands: ...` (commands là danh sách "lệnh collection")."""
+        commands: List[str] = []
+        token = self._commands.set(commands)
+        try:
+            yield commands
+        finally:
+            self._commands.reset(token)
+
+command_recorder = CommandRecorder()
+monitoring.register(command_recorder)
+
+
+# --- Database ---
 
 @pytest.fixture(scope="session")
-async def test_db_client():
+def mongodb_available():
     """
-    Fixture cung cấp một client MongoDB riêng cho kiểm thử.
-    Sử dụng một database riêng để tránh ảnh hưởng đến database phát triển.
+    Bỏ qua các test cần Mongo nếu không kết nối được tới TEST_MONGODB_URI (mongod local, mặc định
+    mongodb://localhost:27017; các unit test vẫn chạy). Không bao giờ dùng MONGODB_URI trong .env
+    vì test xóa dữ liệu. Database kiểm thử được xóa khi kết thúc session.
     """
-    # Thay đổi tên database để sử dụng cho kiểm thử
-    original_db_name = settings.MONGO_DB_NAME # Lưu tên gốc
-    settings.MONGO_DB_NAME = settings.MONGO_DB_NAME + "_test"
-    print(f"\nUsing test database: {settings.MONGO_DB_NAME}")
-
-    # Khởi tạo một client mới cho test
-    test_client = AsyncIOMotorClient(settings.MONGO_CONNECTION_STRING, uuidRepresentation="standard")
-    
-    # Đảm bảo database client được đóng sau khi tất cả các test hoàn tất
-    yield test_client
-    
-    # Dọn dẹp database kiểm thử sau khi tất cả các test session kết thúc
-    print(f"\nDropping test database: {settings.MONGO_DB_NAME}")
-    await test_client.drop_database(settings.MONGO_DB_NAME)
-    test_client.close()
-    settings.MONGO_DB_NAME = original_db_name # Reset lại tên DB sau khi test xong
-
-@pytest.fixture(scope="function", autouse=True)
-async def clear_test_db(test_db_client: AsyncIOMotorClient):
+    try:
+        sync_client = pymongo.MongoClient(settings.TEST_MONGODB_URI, serverSelectionTimeoutMS=2000)
+        sync_client.admin.command("ping")
+    except Exception as e: # Kể cả lỗi cấu hình URI khi tạo client
+        pytest.skip(f"MongoDB không khả dụng tại TEST_MONGODB_URI: {e}")
+    print(f"\nUsing test database: {TEST_DB_NAME}")
+    yield
+    print(f"\nDropping test database: {TEST_DB_NAME}")
+    sync_client.drop_database(TEST_DB_NAME)
+    sync_client.close()
+
+@pytest.fixture(scope="function")
+def test_settings(monkeypatch, mongodb_available):
+    """Cấu hình dùng trong các test chạy toàn bộ ứng dụng (lifespan) với Mongo."""
+    monkeypatch.setattr(settings, "MONGODB_URI", settings.TEST_MONGODB_URI) # Lifespan kết nối tới mongod kiểm thử
+    monkeypatch.setattr(settings, "MONGODB_DB_NAME", TEST_DB_NAME)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_POOL_SIZE", 0) # Không khởi động process pool cho mỗi test
+    # Các test đăng nhập cùng một username nhiều lần trong vài giây
+    monkeypatch.setattr(settings, "LOGIN_RATE_LIMIT_ENABLED", False)
+    return settings
+
+@pytest_asyncio.fixture(scope="function")
+async def clear_test_db(test_settings):
     """
-    Fixture tự động dọn dẹp tất cả các collections trong database kiểm thử
-    trước mỗi bài kiểm thử.
+    Dọn dẹp tất cả các collections trong database kiểm thử trước mỗi bài kiểm thử
+    (giữ lại index) và xóa các cache trong process.
     """
-    db = test_db_client[settings.MONGO_DB_NAME]
-    print("\nClearing test database collections...")
+    cleanup_client = AsyncIOMotorClient(settings.TEST_MONGODB_URI, uuidRepresentation="standard")
+    db = cleanup_client[TEST_DB_NAME]
     for collection_name in await db.list_collection_names():
-        if collection_name not in ["system.indexes"]: # Tránh xóa các collection hệ thống
+        if not collection_name.startswith("system."): # Tránh xóa các collection hệ thống
             await db[collection_name].delete_many({})
-            print(f"  Cleared collection: {collection_name}")
+    cleanup_client.close()
+    principal_cache.clear()
+    token_epoch_cache.clear()
     yield
-    print("Test database collections cleared.")
 
-@pytest.fixture(scope="function")
-async def test_app_client(test_db_client: AsyncIOMotorClient):
+@pytest_asyncio.fixture(scope="function")
+async def test_db_client(clear_test_db) -> AsyncIOMotorClient:
     """
-    Fixture cung cấp một client HTTP bất đồng bộ cho ứng dụng FastAPI.
-    Nó ghi đè dependency get_database để sử dụng test_db_client.
+    Chạy lifespan thật của ứng dụng (kết nối Mongo, index, permission catalog, các task nền)
+    trên database kiểm thử; trả về database đang được ứng dụng sử dụng.
+    Vai trò mặc định cho người dùng mới được tạo sẵn như initialize_db.py.
     """
-    # Ghi đè dependency get_database để nó trả về test_db_client
-    # Đảm bảo rằng get_database trả về một đối tượng database cụ thể từ client
-    async def override_get_database():
-        return test_db_client[settings.MONGO_DB_NAME]
-
-    app.dependency_overrides[get_database] = override_get_database
-    
-    # Sử dụng httpx.AsyncClient để thực hiện các request HTTP đến ứng dụng
-    async with AsyncClient(app=app, base_url="http://test") as client:
+    async with lifespan(app):
+        db = await get_database()
+        permission = await create_permission_db({"name": "user:read_own"}, db)
+        await create_role_db({"name": settings.DEFAULT_USER_ROLE_NAME, "permission_ids": [permission.id]}, db)
+        await load_permission_catalog(db)
+        yield db
+
+@pytest_asyncio.fixture(scope="function")
+async def test_app_client(test_db_client: AsyncIOMotorClient):
+    """Fixture cung cấp một client HTTP bất đồng bộ cho ứng dụng FastAPI."""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
         yield client
-    
-    # Xóa ghi đè dependency sau khi test hoàn tất
-    app.dependency_overrides.clear()
 
 # --- Fixtures cho người dùng và xác thực ---
 
-@pytest.fixture(scope="function")
+@pytest_asyncio.fixture(scope="function")
 async def register_test_user(test_app_client: AsyncClient) -> UserInResponse:
     """Fixture để đăng ký một người dùng kiểm thử cơ bản."""
     user_data = UserCreate(
@@ -97,22 +157,18 @@ async def register_test_user(test_app_client: AsyncClient) -> UserInResponse:
     assert response.status_code == status.HTTP_201_CREATED
     return UserInResponse.model_validate(response.json())
 
-@pytest.fixture(scope="function")
+@pytest_asyncio.fixture(scope="function")
 async def get_test_user_token(test_app_client: AsyncClient, register_test_user: UserInResponse) -> Token:
     """Fixture để lấy token cho người dùng kiểm thử cơ bản."""
-    login_data = {
-        "username": register_test_user.username,
-        "password": "TestPassword123!"
-    }
     response = await test_app_client.post(
         "/api/v1/auth/login",
-        data={"username": login_data["username"], "password": login_data["password"]},
+        data={"username": register_test_user.username, "password": "TestPassword123!"},
         headers={"Content-Type": "application/x-www-form-urlencoded"}
     )
     assert response.status_code == status.HTTP_200_OK
     return Token.model_validate(response.json())
 
-@pytest.fixture(scope="function")
+@pytest_asyncio.fixture(scope="function")
 async def register_superadmin_user(test_app_client: AsyncClient) -> UserInResponse:
     """Fixture để đăng ký một người dùng superadmin kiểm thử."""
     superadmin_data = UserCreate(
@@ -125,28 +181,23 @@ async def register_superadmin_user(test_app_client: AsyncClient) -> UserInRespon
     assert response.status_code == status.HTTP_201_CREATED
     return UserInResponse.model_validate(response.json())
 
-@pytest.fixture(scope="function")
+@pytest_asyncio.fixture(scope="function")
 async def get_superadmin_token(test_app_client: AsyncClient, register_superadmin_user: UserInResponse) -> Token:
     """Fixture để lấy token cho người dùng superadmin kiểm thử."""
-    login_data = {
-        "username": register_superadmin_user.username,
-        "password": settings.SUPERADMIN_PASSWORD
-    }
     response = await test_app_client.post(
         "/api/v1/auth/login",
-        data={"username": login_data["username"], "password": login_data["password"]},
+        data={"username": register_superadmin_user.username, "password": settings.SUPERADMIN_PASSWORD},
         headers={"Content-Type": "application/x-www-form-urlencoded"}
     )
     assert response.status_code == status.HTTP_200_OK
     return Token.model_validate(response.json())
 
-@pytest.fixture(scope="function")
+@pytest_asyncio.fixture(scope="function")
 async def superadmin_auth_headers(get_superadmin_token: Token) -> Dict[str, str]:
     """Fixture cung cấp headers xác thực cho superadmin."""
     return {"Authorization": f"Bearer {get_superadmin_token.access_token}"}
 
-@pytest.fixture(scope="function")
+@pytest_asyncio.fixture(scope="function")
 async def test_user_auth_headers(get_test_user_token: Token) -> Dict[str, str]:
     """Fixture cung cấp headers xác thực cho người dùng cơ bản."""
     return {"Authorization": f"Bearer {get_test_user_token.access_token}"}
-
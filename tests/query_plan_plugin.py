@@ -0,0 +1,78 @@
+# tests/query_plan_plugin.py
+
+"""
+Plugin pytest ghi lại mọi dạng truy vấn (query shape) mà repository gửi tới Mongo trong khi chạy test suite,
+rồi explain từng shape trên một database tạm được seed trên TEST_MONGODB_URI (không bao giờ là MONGODB_URI)
+để phát hiện COLLSCAN, SORT trong bộ nhớ và tỷ lệ docs examined / returned cao. Được nạp từ tests/conftest.py; không làm gì nếu không bật tùy chọn:
+
+    python -m pytest tests/ --query-plans                        # kiểm tra ngay khi kết thúc session
+    python -m pytest tests/ --query-shapes-out=query_shapes.json # chỉ lưu shape, kiểm tra bằng check_query_plans.py
+"""
+
+import asyncio
+
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from app.core.config import settings
+from app.core.query_plans import (
+    DEFAULT_MAX_EXAMINED_RATIO,
+    QueryShapeRecorder,
+    check_on_seeded_database,
+    format_plan_reports,
+)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("query-plans", "Kiểm tra query plan của repository")
+    group.addoption("--query-plans", action="store_true", default=False,
+                    help="Explain mọi query shape trên database seed và fail nếu có COLLSCAN/SORT trong bộ nhớ")
+    group.addoption("--query-shapes-out", default=None, metavar="PATH",
+                    help="Ghi các query shape ra file JSON (dùng với check_query_plans.py)")
+    group.addoption("--query-plan-users", type=int, default=2000,
+                    help="Số người dùng giả được seed trước khi explain")
+    group.addoption("--query-plan-max-ratio", type=float, default=DEFAULT_MAX_EXAMINED_RATIO,
+                    help="Tỷ lệ docs examined / returned tối đa")
+
+
+def pytest_configure(config):
+    if config.getoption("--query-plans") or config.getoption("--query-shapes-out"):
+        # Phải đăng ký trước khi fixture tạo MongoClient
+        config._query_shape_recorder = QueryShapeRecorder()
+        monitoring.register(config._query_shape_recorder)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    recorder = getattr(config, "_query_shape_recorder", None)
+    if recorder is None or not recorder.shapes:
+        return
+    if config.getoption("--query-shapes-out"):
+        recorder.dump(config.getoption("--query-shapes-out"))
+    if config.getoption("--query-plans"):
+        try:
+            reports = asyncio.run(check_on_seeded_database(
+                list(recorder.shapes.values()),
+                f"{settings.MONGODB_DB_NAME}_query_plans",
+                users=config.getoption("--query-plan-users"),
+                max_examined_ratio=config.getoption("--query-plan-max-ratio"),
+            ))
+        except (PyMongoError, RuntimeError) as e:
+            config._query_plan_error = f"Không kiểm tra được query plan trên TEST_MONGODB_URI: {e}"
+            session.exitstatus = 1
+            return
+        config._query_plan_reports = reports
+        if any(report.problems or report.error for report in reports):
+            session.exitstatus = 1
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    error = getattr(config, "_query_plan_error", None)
+    reports = getattr(config, "_query_plan_reports", None)
+    if error is None and reports is None:
+        return
+    terminalreporter.section("query plans")
+    if error is not None:
+        terminalreporter.write_line(error)
+        return
+    terminalreporter.write_line(format_plan_reports(reports, verbose=config.getoption("verbose") > 0))
@@ -0,0 +1,160 @@
+# tests/test_admission.py
+
+import asyncio
+
+import pytest
+
+from app.core import admission
+from app.core.admission import AdmissionClass, AdmissionController, AdmissionRejected
+from app.core.security import default_hashing_pool_size
+
+
+def _controller(capacity=1, max_queue=10, login_wait=5.0, register_wait=5.0):
+    return AdmissionController(
+        capacity,
+        [
+            AdmissionClass("login", priority=0, max_concurrency=capacity, max_wait_seconds=login_wait),
+            AdmissionClass("register", priority=2, max_concurrency=capacity, max_wait_seconds=register_wait),
+        ],
+        max_queue=max_queue,
+        initial_service_seconds=0.01,
+    )
+
+
+def test_waiters_are_granted_by_priority_then_fifo():
+    """
+    Kiểm thử khi slot được trả, login đang chờ được cấp trước register đã chờ từ trước.
+    """
+    controller = _controller()
+    order = []
+
+    async def request(class_name, tag):
+        await controller.acquire(class_name)
+        order.append(tag)
+        await asyncio.sleep(0)
+        controller.release(class_name, 0.01)
+
+    async def scenario():
+        await controller.acquire("login") # Giữ slot duy nhất
+        tasks = [asyncio.create_task(request("register", "register-1"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("login", "login-1")))
+        tasks.append(asyncio.create_task(request("login", "login-2")))
+        await asyncio.sleep(0)
+        controller.release("login", 0.01)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["login-1", "login-2", "register-1"]
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_rejects_when_expected_wait_exceeds_budget():
+    """
+    Kiểm thử request bị từ chối ngay (kèm Retry-After) khi thời gian chờ ước lượng vượt ngân sách của lớp.
+    """
+    controller = _controller(register_wait=0.5)
+    controller.service_seconds = 0.2
+
+    async def scenario():
+        await controller.acquire("login")
+        waiters = [asyncio.create_task(controller.acquire("register")) for _ in range(2)]
+        await asyncio.sleep(0)
+        # 2 request đang chờ -> (2 + 1) * 0.2s = 0.6s > 0.5s
+        with pytest.raises(AdmissionRejected) as exc_info:
+            await controller.acquire("register")
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return exc_info.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.retry_after == 1
+    stats = controller.stats()
+    assert stats["classes"]["register"]["rejected"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_waiter_past_deadline_is_dropped_from_queue():
+    """
+    Kiểm thử request chờ quá deadline bị loại khỏi hàng đợi và slot không bị rò rỉ.
+    """
+    controller = _controller(login_wait=0.05)
+
+    async def scenario():
+        await controller.acquire("login")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("login")
+        controller.release("login", 0.01)
+        await controller.acquire("login") # Slot trống lại được cấp ngay
+        controller.release("login", 0.01)
+
+    asyncio.run(scenario())
+    stats = controller.stats()
+    assert stats["classes"]["login"]["expired"] == 1
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+
+def test_authenticated_admission_rejects_bad_tokens_before_taking_a_slot(monkeypatch):
+    """
+    Kiểm thử request không xác thực được bị trả 401 mà không xin slot, còn request hợp lệ giữ slot và trả lại.
+    """
+    import httpx
+    from fastapi import Depends, FastAPI, HTTPException
+
+    from app import dependencies
+
+    controller = _controller()
+    acquired = []
+    original_acquire = controller.acquire
+
+    async def tracking_acquire(class_name):
+        acquired.append(class_name)
+        await original_acquire(class_name)
+
+    monkeypatch.setattr(controller, "acquire", tracking_acquire)
+    monkeypatch.setattr(dependencies, "admission_controller", controller)
+    monkeypatch.setattr(dependencies.settings, "ADMISSION_CONTROL_ENABLED", True)
+
+    app = FastAPI()
+
+    @app.put("/change-password", dependencies=[Depends(dependencies.admission("login", authenticated=True))])
+    async def change_password():
+        return {"ok": True}
+
+    async def current_user(authorization: str = ""):
+        if authorization != "valid":
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        return object()
+
+    app.dependency_overrides[dependencies.get_current_active_user] = current_user
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            rejected = await client.put("/change-password")
+            accepted = await client.put("/change-password", params={"authorization": "valid"})
+        return rejected, accepted
+
+    rejected, accepted = asyncio.run(scenario())
+
+    assert rejected.status_code == 401
+    assert accepted.status_code == 200
+    assert acquired == ["login"]
+    assert controller.stats()["classes"]["login"]["in_flight"] == 0
+
+
+def test_default_pool_and_capacity_are_per_worker(monkeypatch):
+    """
+    Kiểm thử mặc định số process băm và số slot admission chia CPU của máy cho WEB_CONCURRENCY worker,
+    để tổng trên máy không nhân lên theo số worker.
+    """
+    monkeypatch.setattr("app.core.security.os.cpu_count", lambda: 8)
+    monkeypatch.setattr(admission.settings, "PASSWORD_HASH_POOL_SIZE", None)
+    monkeypatch.setattr(admission.settings, "ADMISSION_MAX_CONCURRENCY", None)
+    monkeypatch.setattr(admission.settings, "WEB_CONCURRENCY", 2)
+    assert default_hashing_pool_size() == 4
+    assert admission.build_admission_controller().capacity == 8
+
+    monkeypatch.setattr(admission.settings, "WEB_CONCURRENCY", 16)
+    assert default_hashing_pool_size() == 1
+    assert admission.build_admission_controller().capacity == 2
@@ -6,6 +6,7 @@ from fastapi import status
 from typing import Dict
 
 from app.schemas.user import UserInResponse
+from app.schemas.token import Token
 
 # Các fixtures từ conftest.py sẽ tự động được phát hiện và sử dụng
 
@@ -122,7 +123,9 @@ async def test_get_me_unauthorized(test_app_client: AsyncClient):
     response = await test_app_client.get("/api/v1/auth/me")
     
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
-    assert response.json()["detail"] == "Không thể xác thực thông tin đăng nhập"
+    # Thiếu header Authorization: OAuth2PasswordBearer từ chối trước khi token được giải mã
+    assert response.json()["detail"] == "Not authenticated"
+    assert response.headers["WWW-Authenticate"] == "Bearer"
 
 @pytest.mark.asyncio
 async def test_refresh_token_success(test_app_client: AsyncClient, get_test_user_token: Token):
@@ -138,8 +141,10 @@ async def test_refresh_token_success(test_app_client: AsyncClient, get_test_user
     assert "access_token" in response_json
     assert "refresh_token" in response_json
     assert response_json["token_type"] == "bearer"
-    # Access token mới phải khác token cũ (thường là vậy)
-    assert response_json["access_token"] != get_test_user_token.access_token
+    # Refresh token được xoay vòng: token mới khác token cũ và token cũ không dùng lại được
+    assert response_json["refresh_token"] != get_test_user_token.refresh_token
+    reuse_response = await test_app_client.post("/api/v1/auth/refresh-token", headers=headers)
+    assert reuse_response.status_code == status.HTTP_401_UNAUTHORIZED
 
 @pytest.mark.asyncio
 async def test_refresh_token_invalid(test_app_client: AsyncClient):
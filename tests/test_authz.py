@@ -0,0 +1,95 @@
+# tests/test_authz.py
+
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+from app.core.permission_catalog import PermissionCatalog
+from app.schemas.authz import AuthzCheckRequest
+from app.services import authz_service
+from app.services.authz_service import AuthzService
+
+
+def _catalog() -> PermissionCatalog:
+    catalog = PermissionCatalog()
+    catalog.upsert_permission("p1", "article:read")
+    catalog.upsert_permission("p2", "article:delete_any")
+    catalog.upsert_role("editor", ["p1"])
+    return catalog
+
+
+def test_request_requires_subject_for_permissions():
+    """
+    Kiểm thử request gửi `permissions` mà không có `subject` bị từ chối.
+    """
+    with pytest.raises(ValidationError):
+        AuthzCheckRequest(permissions=["article:read"])
+
+
+def test_batch_check_uses_one_user_query(monkeypatch):
+    """
+    Kiểm thử mọi subject được đọc trong một lần gọi repository và kết quả giữ đúng thứ tự request.
+    """
+    calls = []
+
+    async def fake_get_users(user_ids, db):
+        calls.append(sorted(set(user_ids)))
+        return {
+            "u1": {"role_ids": ["editor"], "is_active": True, "is_superuser": False},
+            "u2": {"role_ids": [], "is_active": False, "is_superuser": False},
+            "admin": {"role_ids": [], "is_active": True, "is_superuser": True},
+        }
+
+    async def fake_reload(db):
+        raise AssertionError("Không được nạp lại catalog khi mọi quyền hạn đều đã biết")
+
+    monkeypatch.setattr(authz_service, "get_users_access_by_ids", fake_get_users)
+    monkeypatch.setattr(authz_service, "load_permission_catalog", fake_reload)
+    monkeypatch.setattr(authz_service, "permission_catalog", _catalog())
+
+    request = AuthzCheckRequest(
+        checks=[
+            {"subject": "u2", "permission": "article:read"},
+            {"subject": "admin", "permission": "article:delete_any"},
+            {"subject": "missing", "permission": "article:read"},
+        ],
+        subject="u1",
+        permissions=["article:read", "article:delete_any"],
+    )
+    response = asyncio.run(AuthzService(db=object()).check(request))
+
+    assert calls == [["admin", "missing", "u1", "u2"]]
+    assert [(r.subject, r.allowed, r.reason) for r in response.results] == [
+        ("u2", False, "subject_inactive"),
+        ("admin", True, "superuser"),
+        ("missing", False, "subject_not_found"),
+        ("u1", True, "granted"),
+        ("u1", False, "denied"),
+    ]
+
+
+def test_unknown_permission_reload_is_throttled(monkeypatch):
+    """
+    Kiểm thử quyền hạn lạ chỉ kích hoạt nạp lại catalog một lần trong khoảng AUTHZ_CATALOG_RELOAD_SECONDS.
+    """
+    reloads = []
+
+    async def fake_get_users(user_ids, db):
+        return {"u1": {"role_ids": ["editor"], "is_active": True, "is_superuser": False}}
+
+    async def fake_reload(db):
+        reloads.append(db)
+
+    monkeypatch.setattr(authz_service, "get_users_access_by_ids", fake_get_users)
+    monkeypatch.setattr(authz_service, "load_permission_catalog", fake_reload)
+    monkeypatch.setattr(authz_service, "permission_catalog", _catalog())
+    monkeypatch.setattr(authz_service, "catalog_reload_state", authz_service.CatalogReloadState())
+
+    request = AuthzCheckRequest(subject="u1", permissions=["report:export"])
+    service = AuthzService(db=object())
+    first = asyncio.run(service.check(request))
+    asyncio.run(service.check(request))
+
+    assert len(reloads) == 1
+    assert first.results[0].reason == "unknown_permission"
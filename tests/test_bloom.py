@@ -0,0 +1,26 @@
+# tests/test_bloom.py
+
+from app.core.bloom import BloomFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """
+    Kiểm thử mọi phần tử đã thêm đều được báo là có trong filter.
+    """
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    items = [f"family-{i}" for i in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    assert bloom.is_full
+
+
+def test_bloom_filter_false_positive_rate_is_bounded():
+    """
+    Kiểm thử tỷ lệ false positive khi đầy capacity xấp xỉ error_rate cấu hình.
+    """
+    bloom = BloomFilter(capacity=2000, error_rate=0.01)
+    for i in range(2000):
+        bloom.add(f"revoked-{i}")
+    false_positives = sum(f"valid-{i}" in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
@@ -0,0 +1,65 @@
+# tests/test_bookkeeping.py
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.core import bookkeeping
+from app.core.bookkeeping import LoginBookkeepingBuffer
+
+
+def test_record_login_requires_running_buffer():
+    """
+    Kiểm thử buffer chưa khởi động từ chối ghi nhận để caller ghi trực tiếp xuống DB.
+    """
+    assert LoginBookkeepingBuffer().record_login("user-1") is False
+
+
+def test_logins_are_coalesced_and_drained_on_stop(monkeypatch):
+    """
+    Kiểm thử nhiều lần đăng nhập của cùng user được gộp thành một cập nhật và được flush khi dừng.
+    """
+    written = []
+
+    async def fake_apply(updates, db):
+        written.append(dict(updates))
+        return len(updates)
+
+    monkeypatch.setattr(bookkeeping, "apply_login_bookkeeping_db", fake_apply)
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    async def scenario():
+        buffer = LoginBookkeepingBuffer()
+        buffer.start(db=object())
+        assert buffer.record_login("user-1", first + timedelta(seconds=5))
+        assert buffer.record_login("user-1", first)
+        assert buffer.record_login("user-2", first)
+        assert buffer.stats()["queue_depth"] == 2
+        await buffer.stop()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert written == [{"user-1": (first + timedelta(seconds=5), 2), "user-2": (first, 1)}]
+    assert buffer.stats()["queue_depth"] == 0
+    assert buffer.running is False
+
+
+def test_failed_flush_keeps_updates_for_retry(monkeypatch):
+    """
+    Kiểm thử khi bulk_write lỗi, các cập nhật được giữ lại trong buffer.
+    """
+    async def failing_apply(updates, db):
+        raise RuntimeError("mongo down")
+
+    monkeypatch.setattr(bookkeeping, "apply_login_bookkeeping_db", failing_apply)
+
+    async def scenario():
+        buffer = LoginBookkeepingBuffer()
+        buffer.start(db=object())
+        buffer.record_login("user-1")
+        assert await buffer.flush() == 0
+        await buffer.stop()
+        return buffer.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["queue_depth"] == 1
+    assert stats["failed_flushes"] >= 1
@@ -0,0 +1,66 @@
+# tests/test_cache.py
+
+import time
+
+from app.core.cache import LRUCache
+
+
+def test_cache_hit_and_miss_counters():
+    """
+    Kiểm thử get/set cơ bản và bộ đếm hit/miss.
+    """
+    cache = LRUCache("test", maxsize=10, ttl_seconds=60)
+    assert cache.get("user-1") is None
+    cache.set("user-1", "principal-1")
+    assert cache.get("user-1") == "principal-1"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+def test_cache_evicts_least_recently_used():
+    """
+    Kiểm thử LRU: entry ít được dùng gần đây nhất bị loại khi vượt maxsize.
+    """
+    cache = LRUCache("test", maxsize=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a") # "a" vừa được dùng, "b" là LRU
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+def test_cache_entry_expires_after_ttl():
+    """
+    Kiểm thử entry hết hạn theo TTL hoặc theo expires_at riêng.
+    """
+    cache = LRUCache("test", maxsize=10, ttl_seconds=60)
+    cache.set("expired", "value", expires_at=time.monotonic() - 1)
+    assert cache.get("expired") is None
+    assert len(cache) == 0
+
+def test_cache_rejects_set_after_invalidation():
+    """
+    Kiểm thử invalidation theo version: dữ liệu đọc trước khi invalidate không được lưu vào cache.
+    """
+    cache = LRUCache("test", maxsize=10, ttl_seconds=60)
+    version = cache.version()
+    cache.invalidate("user-1") # Một request khác vừa cập nhật user-1
+    assert cache.set("user-1", "stale", version=version) is False
+    assert cache.get("user-1") is None
+
+    assert cache.set("user-1", "fresh", version=cache.version()) is True
+    cache.clear()
+    assert cache.get("user-1") is None
+
+def test_cache_disabled_when_maxsize_zero():
+    """
+    Kiểm thử cache bị tắt (maxsize=0) không lưu gì.
+    """
+    cache = LRUCache("test", maxsize=0, ttl_seconds=60)
+    assert cache.set("a", 1) is False
+    assert cache.get("a") is None
@@ -0,0 +1,50 @@
+# tests/test_export.py
+
+import asyncio
+import gzip
+import json
+from datetime import datetime
+
+from app.core.export import USER_EXPORT_FIELDS, encode_csv, encode_ndjson, gzip_stream
+
+
+RECORD = {
+    "id": "60d5ec49f7e3d1a4e8b8c7c1",
+    "username": "johndoe",
+    "email": "john.doe@example.com",
+    "roles": ["member", "editor"],
+    "created_at": datetime(2024, 1, 2, 3, 4, 5),
+}
+
+
+def test_encode_ndjson_one_object_per_line():
+    """
+    Kiểm thử mỗi bản ghi là một dòng JSON và datetime được ghi dạng ISO 8601.
+    """
+    lines = encode_ndjson([RECORD, RECORD]).decode().splitlines()
+    assert len(lines) == 2
+    assert json.loads(lines[0])["created_at"] == "2024-01-02T03:04:05"
+
+
+def test_encode_csv_header_only_on_first_chunk():
+    """
+    Kiểm thử header CSV chỉ xuất hiện ở chunk đầu và danh sách được nối bằng "|".
+    """
+    first = encode_csv([RECORD], include_header=True).decode().splitlines()
+    assert first[0] == ",".join(USER_EXPORT_FIELDS)
+    assert "member|editor" in first[1]
+    assert len(encode_csv([RECORD]).decode().splitlines()) == 1
+
+
+def test_gzip_stream_produces_valid_gzip():
+    """
+    Kiểm thử các chunk nén liên tiếp ghép lại thành một file gzip hợp lệ.
+    """
+    async def chunks():
+        yield b"hello "
+        yield b"world"
+
+    async def collect():
+        return b"".join([chunk async for chunk in gzip_stream(chunks())])
+
+    assert gzip.decompress(asyncio.run(collect())) == b"hello world"
@@ -0,0 +1,74 @@
+# tests/test_indexes.py
+
+import asyncio
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from app.core.indexes import (
+    INDEX_REGISTRY,
+    IndexSpec,
+    MissingUniqueIndexError,
+    _option_drift,
+    duplicate_key_field,
+    verify_unique_indexes,
+)
+
+
+class _FakeCollection:
+    def __init__(self, indexes):
+        self._indexes = indexes
+
+    async def index_information(self):
+        return self._indexes
+
+
+def test_index_spec_default_name_follows_mongo_convention():
+    """
+    Kiểm thử tên index mặc định giống tên MongoDB tự sinh, để so khớp với index_information().
+    """
+    assert IndexSpec([("username", 1)]).name == "username_1"
+    assert IndexSpec([("created_at", 1), ("_id", 1)]).name == "created_at_1__id_1"
+
+
+def test_option_drift_detects_missing_unique():
+    """
+    Kiểm thử index cùng tên nhưng thiếu unique bị báo drift, còn index khớp thì không.
+    """
+    spec = IndexSpec([("email", 1)], unique=True)
+    assert _option_drift(spec, {"key": [("email", 1)], "unique": True}) == []
+    assert _option_drift(spec, {"key": [("email", 1)]}) == ["unique=False, expected True"]
+
+
+def test_duplicate_key_field_from_key_pattern():
+    """
+    Kiểm thử lấy tên trường trùng lặp từ keyPattern của DuplicateKeyError.
+    """
+    error = DuplicateKeyError("E11000 duplicate key error", 11000, {"keyPattern": {"email": 1}})
+    assert duplicate_key_field(error) == "email"
+    assert duplicate_key_field(DuplicateKeyError("E11000", 11000)) is None
+
+
+def test_verify_unique_indexes_aborts_on_missing_or_drifted_index():
+    """
+    Kiểm thử khởi động bị dừng khi index unique bắt buộc không tồn tại hoặc không còn unique,
+    và thành công khi mọi index unique của registry khớp khai báo.
+    """
+    def database(drop=None, not_unique=None):
+        db = {}
+        for collection_name, specs in INDEX_REGISTRY.items():
+            indexes = {}
+            for spec in specs:
+                label = f"{collection_name}.{spec.name}"
+                if label != drop:
+                    indexes[spec.name] = {"key": spec.keys, **spec.options}
+                    if label == not_unique:
+                        indexes[spec.name].pop("unique")
+            db[collection_name] = _FakeCollection(indexes)
+        return db
+
+    asyncio.run(verify_unique_indexes(database()))
+    with pytest.raises(MissingUniqueIndexError, match="users.email_1: không tồn tại"):
+        asyncio.run(verify_unique_indexes(database(drop="users.email_1")))
+    with pytest.raises(MissingUniqueIndexError, match="roles.name_1: unique=False"):
+        asyncio.run(verify_unique_indexes(database(not_unique="roles.name_1")))
@@ -0,0 +1,110 @@
+# tests/test_introspection.py
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.core import token_epoch
+from app.core.security import create_access_token, create_refresh_token, hash_token_id
+from app.schemas.user import UserInResponse
+from app.services import user_service
+from app.services.user_service import UserService
+
+
+def _user(user_id: str, is_active: bool = True) -> UserInResponse:
+    now = datetime.now(timezone.utc)
+    return UserInResponse(
+        id=user_id, username=f"user-{user_id}", email=f"{user_id}@example.com",
+        is_active=is_active, is_superuser=False, roles=["member"], permissions=["user:read_all"],
+        created_at=now, updated_at=now,
+    )
+
+
+def test_introspect_resolves_principals_in_one_lookup(monkeypatch):
+    """
+    Kiểm thử mọi token hợp lệ được resolve principal bằng một lần gọi get_user_profiles,
+    và token lỗi/không phải token xác thực/của user không hoạt động đều inactive.
+    """
+    lookups = []
+
+    async def fake_profiles(self, user_ids):
+        lookups.append(list(user_ids))
+        return {"u1": _user("u1"), "u2": _user("u2", is_active=False)}
+
+    async def fake_refresh_records(token_hashes, db):
+        return {hash_token_id("fresh"): {"_id": hash_token_id("fresh")}}
+
+    monkeypatch.setattr(UserService, "get_user_profiles", fake_profiles)
+    monkeypatch.setattr(user_service, "get_refresh_token_records", fake_refresh_records)
+    expires = timedelta(minutes=5)
+    tokens = [
+        create_access_token({"sub": "u1", "username": "user-u1"}, expires_delta=expires),
+        "not-a-jwt",
+        create_refresh_token({"sub": "u1", "type": "refresh", "jti": "fresh"}, expires_delta=expires),
+        create_access_token({"sub": "u2"}, expires_delta=expires),
+        create_access_token({"sub": "u1", "type": "password_reset"}, expires_delta=expires),
+        create_access_token({"sub": "u3"}, expires_delta=expires),
+    ]
+
+    response = asyncio.run(UserService(db=object()).introspect_tokens(tokens))
+
+    assert lookups == [["u1", "u1", "u2", "u3"]]
+    assert [r.active for r in response.results] == [True, False, True, False, False, False]
+    assert response.results[0].token_type == "access_token"
+    assert response.results[0].permissions == ["user:read_all"]
+    assert response.results[2].token_type == "refresh_token"
+    assert response.results[1].model_dump(exclude_none=True) == {"active": False}
+
+
+def test_introspect_reports_used_or_missing_refresh_tokens_inactive(monkeypatch):
+    """
+    Kiểm thử refresh token đã dùng (xoay vòng), bị thu hồi hoặc không còn bản ghi là inactive,
+    giống /auth/refresh-token; mọi bản ghi được đọc bằng một query.
+    """
+    lookups = []
+
+    async def fake_profiles(self, user_ids):
+        return {"u1": _user("u1")}
+
+    async def fake_refresh_records(token_hashes, db):
+        lookups.append(sorted(token_hashes))
+        now = datetime.now(timezone.utc)
+        return {
+            hash_token_id("fresh"): {},
+            hash_token_id("used"): {"used_at": now},
+            hash_token_id("revoked"): {"revoked_at": now},
+        }
+
+    monkeypatch.setattr(UserService, "get_user_profiles", fake_profiles)
+    monkeypatch.setattr(user_service, "get_refresh_token_records", fake_refresh_records)
+    expires = timedelta(minutes=5)
+    tokens = [
+        create_refresh_token({"sub": "u1", "type": "refresh", "jti": jti}, expires_delta=expires)
+        for jti in ("fresh", "used", "revoked", "expired")
+    ]
+
+    response = asyncio.run(UserService(db=object()).introspect_tokens(tokens))
+
+    assert [r.active for r in response.results] == [True, False, False, False]
+    assert lookups == [sorted(hash_token_id(jti) for jti in ("fresh", "used", "revoked", "expired"))]
+
+
+def test_introspect_compares_token_epoch_from_batched_profiles(monkeypatch):
+    """
+    Kiểm thử token có epoch cũ hơn epoch trong profile là inactive mà không đọc epoch theo từng token.
+    """
+    async def fake_profiles(self, user_ids):
+        user = _user("u1")
+        user._token_epoch = 2
+        return {"u1": user}
+
+    async def fail_epoch(user_id, db):
+        raise AssertionError("introspection không được đọc epoch theo từng token")
+
+    monkeypatch.setattr(UserService, "get_user_profiles", fake_profiles)
+    monkeypatch.setattr(token_epoch, "get_token_epoch_db", fail_epoch)
+    expires = timedelta(minutes=5)
+    tokens = [create_access_token({"sub": "u1", "tep": tep}, expires_delta=expires) for tep in (1, 2)]
+
+    response = asyncio.run(UserService(db=object()).introspect_tokens(tokens))
+
+    assert [r.active for r in response.results] == [False, True]
@@ -0,0 +1,170 @@
+# tests/test_invalidation.py
+
+import asyncio
+
+from app.core import invalidation
+from app.core.cache import principal_cache, token_epoch_cache
+from app.core.invalidation import InvalidationBus
+from app.core.permission_catalog import PermissionCatalog
+from app.models.role import RoleDBModel
+
+
+def _role(role_id, permission_ids):
+    return RoleDBModel.model_validate({
+        "_id": role_id, "name": role_id, "permission_ids": permission_ids,
+        "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z",
+    })
+
+
+def test_user_bookkeeping_updates_are_ignored():
+    """
+    Kiểm thử update chỉ chạm vào các trường bookkeeping không làm invalidate principal, update khác thì có.
+    """
+    principal_cache.clear()
+    principal_cache.set("u1", "principal")
+    bus = InvalidationBus()
+
+    async def scenario():
+        await bus.handle_change({
+            "operationType": "update", "ns": {"coll": "users"}, "documentKey": {"_id": "u1"},
+            "updateDescription": {"updatedFields": {"last_login_at": 1, "login_count": 2}},
+        })
+        cached_after_bookkeeping = principal_cache.get("u1")
+        await bus.handle_change({
+            "operationType": "update", "ns": {"coll": "users"}, "documentKey": {"_id": "u1"},
+            "updateDescription": {"updatedFields": {"role_ids": ["r1"]}},
+        })
+        return cached_after_bookkeeping, principal_cache.get("u1")
+
+    assert asyncio.run(scenario()) == ("principal", None)
+
+
+def test_role_change_updates_catalog_and_fans_out_to_users(monkeypatch):
+    """
+    Kiểm thử thay đổi vai trò cập nhật catalog và chỉ invalidate các user có vai trò đó.
+    """
+    catalog = PermissionCatalog()
+    catalog.upsert_permission("p1", "article:read")
+    catalog.upsert_role("r1", [])
+    fan_out_queries = []
+
+    async def fake_get_role(role_id, db):
+        return _role(role_id, ["p1"])
+
+    async def fake_user_ids(role_ids, db, limit):
+        fan_out_queries.append(role_ids)
+        return ["u1"]
+
+    monkeypatch.setattr(invalidation, "permission_catalog", catalog)
+    monkeypatch.setattr(invalidation, "get_role_by_id", fake_get_role)
+    monkeypatch.setattr(invalidation, "get_user_ids_with_roles", fake_user_ids)
+    principal_cache.clear()
+    principal_cache.set("u1", "principal")
+    principal_cache.set("u2", "principal")
+
+    asyncio.run(InvalidationBus().handle_change(
+        {"operationType": "update", "ns": {"coll": "roles"}, "documentKey": {"_id": "r1"}}
+    ))
+
+    assert catalog.mask_for_roles(["r1"]) == catalog.bit_for("article:read")
+    assert fan_out_queries == [["r1"]]
+    assert principal_cache.get("u1") is None
+    assert principal_cache.get("u2") == "principal"
+
+
+class FakeChangeStream:
+    def __init__(self, events):
+        self._events = list(events)
+        self.resume_token = None
+        self.alive = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def try_next(self):
+        if self._events:
+            change = self._events.pop(0)
+            self.resume_token = change["_id"]
+            return change
+        await asyncio.sleep(0.01)
+        return None
+
+
+class FakeDB:
+    def __init__(self, events):
+        self.watch_calls = []
+        self._events = events
+
+    def watch(self, pipeline, resume_after=None, max_await_time_ms=None):
+        self.watch_calls.append(resume_after)
+        return FakeChangeStream(self._events)
+
+
+def test_change_stream_resumes_from_saved_token_and_persists_progress(monkeypatch):
+    """
+    Kiểm thử bus mở change stream từ resume token đã lưu, áp dụng sự kiện và lưu token mới khi dừng.
+    """
+    saved = []
+
+    async def fake_get_token(db):
+        return {"_data": "saved"}
+
+    async def fake_save_token(token, db):
+        saved.append(token)
+
+    monkeypatch.setattr(invalidation, "get_resume_token_db", fake_get_token)
+    monkeypatch.setattr(invalidation, "save_resume_token_db", fake_save_token)
+    principal_cache.clear()
+    principal_cache.set("u1", "principal")
+    db = FakeDB([{"_id": {"_data": "next"}, "operationType": "delete", "ns": {"coll": "users"}, "documentKey": {"_id": "u1"}}])
+
+    async def scenario():
+        bus = InvalidationBus()
+        await bus.start(db)
+        await asyncio.sleep(0.05)
+        await bus.stop()
+        return bus
+
+    bus = asyncio.run(scenario())
+    assert bus.mode == "change_stream"
+    assert db.watch_calls == [{"_data": "saved"}]
+    assert principal_cache.get("u1") is None
+    assert saved[-1] == {"_data": "next"}
+
+
+def test_polling_flushes_user_caches_when_users_version_changes(monkeypatch):
+    """
+    Kiểm thử ở chế độ polling: users version đổi (token epoch, profile) xóa principal và token epoch cache
+    mà không nạp lại catalog; permissions version đổi thì flush toàn bộ.
+    """
+    versions = iter([(1, 1), (1, 1), (1, 2), (2, 2)])
+    catalog_loads = []
+
+    async def fake_versions(db):
+        return next(versions)
+
+    async def fake_load_catalog(db):
+        catalog_loads.append(db)
+
+    monkeypatch.setattr(invalidation, "get_invalidation_versions_db", fake_versions)
+    monkeypatch.setattr(invalidation, "load_permission_catalog", fake_load_catalog)
+    principal_cache.clear()
+    token_epoch_cache.clear()
+    bus = InvalidationBus()
+
+    async def scenario():
+        await bus.poll_once() # Giá trị ban đầu
+        principal_cache.set("u1", "principal")
+        token_epoch_cache.set("u1", 0)
+        await bus.poll_once() # Không đổi
+        unchanged = (principal_cache.get("u1"), token_epoch_cache.get("u1"))
+        await bus.poll_once() # Users version đổi
+        flushed = (principal_cache.get("u1"), token_epoch_cache.get("u1"), len(catalog_loads))
+        await bus.poll_once() # Permissions version đổi
+        return unchanged, flushed, len(catalog_loads)
+
+    assert asyncio.run(scenario()) == (("principal", 0), (None, None, 0), 1)
+    assert bus.full_flushes == 2
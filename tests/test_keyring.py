@@ -0,0 +1,52 @@
+# tests/test_keyring.py
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwt
+from jose.exceptions import JWTError
+
+from app.core.keyring import KeyRing, SigningKey
+
+
+def _private_pem() -> str:
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    return private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+
+
+def test_token_signed_with_active_kid_and_verifiable_from_jwks():
+    """
+    Kiểm thử token được ký bằng khóa active (có kid trong header) và xác minh được chỉ với JWKS công khai.
+    """
+    keyring = KeyRing([SigningKey("old", "ES256", _private_pem()), SigningKey("new", "ES256", _private_pem())], "new")
+    token = keyring.sign({"sub": "user-1"})
+    assert jwt.get_unverified_header(token)["kid"] == "new"
+    assert keyring.verify(token)["sub"] == "user-1"
+    assert jwt.decode(token, keyring.jwks_body.decode(), algorithms=["ES256"])["sub"] == "user-1"
+
+
+def test_retired_key_still_verifies_old_tokens():
+    """
+    Kiểm thử token ký bằng khóa cũ vẫn hợp lệ sau khi khóa đó chỉ còn public key.
+    """
+    old = SigningKey("old", "ES256", _private_pem())
+    token = KeyRing([old], "old").sign({"sub": "user-1"})
+    retired = SigningKey("old", "ES256", public_key=old.verifying_key.to_pem().decode())
+    keyring = KeyRing([retired, SigningKey("new", "ES256", _private_pem())], "new")
+    assert keyring.verify(token)["sub"] == "user-1"
+    with pytest.raises(ValueError):
+        KeyRing([retired], "old") # Khóa chỉ có public key không thể dùng để ký
+
+
+def test_unknown_kid_and_unsupported_algorithm_are_rejected():
+    """
+    Kiểm thử token có kid lạ bị từ chối và thuật toán đối xứng không được nhận trong keyring.
+    """
+    keyring = KeyRing([SigningKey("a", "ES256", _private_pem())], "a")
+    foreign = KeyRing([SigningKey("b", "ES256", _private_pem())], "b").sign({"sub": "user-1"})
+    with pytest.raises(JWTError):
+        keyring.verify(foreign)
+    with pytest.raises(ValueError):
+        SigningKey("hs", "HS256", "secret")
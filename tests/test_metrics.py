@@ -0,0 +1,81 @@
+# tests/test_metrics.py
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+from app.core.cache import LRUCache
+from app.core.metrics import MongoCommandMetrics, PrometheusMiddleware
+
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_command_listener_labels_by_collection_and_bounds_cardinality():
+    """
+    Kiểm thử lệnh Mongo được ghi theo collection/lệnh, collection vượt giới hạn gộp vào "other".
+    """
+    listener = MongoCommandMetrics(max_collections=1)
+    commands = [
+        ("find", {"find": "metrics_users"}),
+        ("getMore", {"getMore": 123, "collection": "metrics_users"}),
+        ("find", {"find": "metrics_roles"}), # Vượt giới hạn 1 collection
+        ("hello", {"hello": 1}),
+    ]
+    labels_before = {
+        ("metrics_users", "find"): _sample("mongo_command_duration_seconds_count", {"collection": "metrics_users", "command": "find", "outcome": "ok"}),
+        ("other", "find"): _sample("mongo_command_duration_seconds_count", {"collection": "other", "command": "find", "outcome": "ok"}),
+    }
+    for request_id, (command_name, command) in enumerate(commands):
+        listener.started(SimpleNamespace(command_name=command_name, command=command, connection_id=("h", 1), request_id=request_id))
+        listener.succeeded(SimpleNamespace(connection_id=("h", 1), request_id=request_id, duration_micros=1500))
+
+    assert _sample("mongo_command_duration_seconds_count", {"collection": "metrics_users", "command": "find", "outcome": "ok"}) == labels_before[("metrics_users", "find")] + 1
+    assert _sample("mongo_command_duration_seconds_count", {"collection": "metrics_users", "command": "getMore", "outcome": "ok"}) >= 1
+    assert _sample("mongo_command_duration_seconds_count", {"collection": "other", "command": "find", "outcome": "ok"}) == labels_before[("other", "find")] + 1
+    assert _sample("mongo_command_duration_seconds_count", {"collection": "", "command": "other", "outcome": "ok"}) >= 1
+    assert listener._pending == {}
+
+
+def test_middleware_labels_route_template_not_raw_path():
+    """
+    Kiểm thử nhãn route là path template; path không khớp route nào được gộp thành "unmatched".
+    """
+    app = FastAPI()
+    app.add_middleware(PrometheusMiddleware)
+
+    @app.get("/metrics-test/items/{item_id}")
+    async def read_item(item_id: str):
+        return {"id": item_id}
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            for item_id in ("a", "b", "c"):
+                await client.get(f"/metrics-test/items/{item_id}")
+            await client.get("/metrics-test/nowhere")
+
+    route_labels = {"method": "GET", "route": "/metrics-test/items/{item_id}", "status": "200"}
+    unmatched_labels = {"method": "GET", "route": "unmatched", "status": "404"}
+    route_before = _sample("http_request_duration_seconds_count", route_labels)
+    unmatched_before = _sample("http_request_duration_seconds_count", unmatched_labels)
+    asyncio.run(scenario())
+    assert _sample("http_request_duration_seconds_count", route_labels) == route_before + 3
+    assert _sample("http_request_duration_seconds_count", unmatched_labels) == unmatched_before + 1
+
+
+def test_cache_lookups_are_counted_per_cache():
+    """
+    Kiểm thử hit/miss của LRUCache được xuất ra counter theo tên cache.
+    """
+    cache = LRUCache("metrics_test", maxsize=10, ttl_seconds=60)
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+
+    assert _sample("cache_lookups_total", {"cache": "metrics_test", "result": "hit"}) == 2
+    assert _sample("cache_lookups_total", {"cache": "metrics_test", "result": "miss"}) == 1
@@ -0,0 +1,61 @@
+# tests/test_pagination.py
+
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.core.config import settings
+from app.core.pagination import (
+    InvalidCursorError,
+    clamp_limit,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+)
+
+
+def test_cursor_round_trip_for_created_at():
+    """
+    Kiểm thử cursor mã hóa/giải mã lại đúng giá trị created_at và _id của tài liệu cuối trang.
+    """
+    doc = {"_id": ObjectId(), "created_at": datetime(2024, 5, 1, 12, 30)}
+    cursor = encode_cursor("created_at", "desc", doc)
+    value, last_id = decode_cursor(cursor, "created_at", "desc")
+    assert value == doc["created_at"]
+    assert last_id == doc["_id"]
+
+
+def test_keyset_filter_uses_id_as_tiebreaker():
+    """
+    Kiểm thử điều kiện keyset: sort theo created_at cần _id làm khóa phụ, sort theo _id thì không.
+    """
+    doc = {"_id": ObjectId(), "created_at": datetime(2024, 5, 1)}
+    assert keyset_filter("_id", "asc", encode_cursor("_id", "asc", doc)) == {"_id": {"$gt": doc["_id"]}}
+    assert keyset_filter("created_at", "desc", encode_cursor("created_at", "desc", doc)) == {
+        "$or": [
+            {"created_at": {"$lt": doc["created_at"]}},
+            {"created_at": doc["created_at"], "_id": {"$lt": doc["_id"]}},
+        ]
+    }
+    assert keyset_filter("_id", "asc", None) == {}
+
+
+def test_invalid_or_mismatched_cursor_is_rejected():
+    """
+    Kiểm thử cursor rác hoặc cursor của cách sắp xếp khác bị từ chối.
+    """
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor", "_id", "asc")
+    cursor = encode_cursor("_id", "asc", {"_id": ObjectId()})
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, "created_at", "asc")
+
+
+def test_clamp_limit():
+    """
+    Kiểm thử limit mặc định và giới hạn trên.
+    """
+    assert clamp_limit(None) == settings.PAGINATION_DEFAULT_LIMIT
+    assert clamp_limit(settings.PAGINATION_MAX_LIMIT + 1000) == settings.PAGINATION_MAX_LIMIT
+    assert clamp_limit(0) == 1
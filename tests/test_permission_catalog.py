@@ -0,0 +1,62 @@
+# tests/test_permission_catalog.py
+
+from app.core.permission_catalog import PermissionCatalog, principal_has_permissions
+from app.schemas.token import TokenData
+
+
+def build_catalog() -> PermissionCatalog:
+    catalog = PermissionCatalog()
+    catalog.upsert_permission("p1", "user:read_all")
+    catalog.upsert_permission("p2", "role:read_all")
+    catalog.upsert_permission("p3", "permission:read_all")
+    catalog.upsert_role("r-admin", ["p1", "p2"])
+    catalog.upsert_role("r-viewer", ["p3"])
+    return catalog
+
+def test_role_masks_are_or_of_permission_bits():
+    """
+    Kiểm thử mask của người dùng là OR mask các vai trò.
+    """
+    catalog = build_catalog()
+    mask = catalog.mask_for_roles(["r-admin", "r-viewer"])
+    assert mask == catalog.required_mask(["user:read_all", "role:read_all", "permission:read_all"])
+    assert catalog.mask_for_roles(["unknown-role"]) == 0
+
+def test_rename_and_remove_permission_updates_catalog():
+    """
+    Kiểm thử đổi tên giữ nguyên bit, xóa quyền hạn thì bit bị bỏ khỏi các vai trò.
+    """
+    catalog = build_catalog()
+    bit = catalog.bit_for("user:read_all")
+    catalog.upsert_permission("p1", "user:list")
+    assert catalog.bit_for("user:read_all") is None
+    assert catalog.bit_for("user:list") == bit
+
+    catalog.remove_permission("p1")
+    assert catalog.mask_for_roles(["r-admin"]) == catalog.bit_for("role:read_all")
+
+    # Bit đã xóa không được cấp lại cho quyền hạn mới
+    catalog.upsert_permission("p4", "article:create")
+    assert catalog.bit_for("article:create") != bit
+
+def test_role_loaded_before_its_permissions():
+    """
+    Kiểm thử vai trò tham chiếu permission id chưa biết sẽ được cập nhật khi quyền hạn được nạp sau.
+    """
+    catalog = PermissionCatalog()
+    catalog.upsert_role("r1", ["p1"])
+    assert catalog.mask_for_roles(["r1"]) == 0
+    catalog.upsert_permission("p1", "user:read_all")
+    assert catalog.mask_for_roles(["r1"]) == catalog.bit_for("user:read_all")
+
+def test_principal_has_permissions_all_and_any():
+    """
+    Kiểm thử requires_all/requires_any trên principal dựng từ claims của token.
+    """
+    principal = TokenData(user_id="u1", permissions=["user:read_all", "role:read_all"])
+    assert principal_has_permissions(principal, ["user:read_all", "role:read_all"])
+    assert not principal_has_permissions(principal, ["user:read_all", "user:delete"])
+    assert principal_has_permissions(principal, ["user:delete", "role:read_all"], require_all=False)
+
+    superuser = TokenData(user_id="u2", is_superuser=True)
+    assert principal_has_permissions(superuser, ["anything:at_all"])
@@ -0,0 +1,111 @@
+# tests/test_query_plans.py
+
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app.core import query_plans
+from app.core.query_plans import QueryShape, QueryShapeRecorder, analyze_explain, load_query_shapes
+
+
+def _event(command_name, command, database_name="fastapi_app"):
+    return SimpleNamespace(command_name=command_name, command=command, database_name=database_name)
+
+
+def _explain(winning_plan, docs_examined, returned, keys_examined=0):
+    return {
+        "queryPlanner": {"winningPlan": winning_plan},
+        "executionStats": {"nReturned": returned, "totalDocsExamined": docs_examined, "totalKeysExamined": keys_examined},
+    }
+
+
+def test_recorder_groups_commands_by_shape(tmp_path):
+    """
+    Kiểm thử các lệnh chỉ khác giá trị được gộp thành một shape, lệnh ghi nhiều statement được tách,
+    lệnh không explain được hoặc trên database hệ thống bị bỏ qua, và shape lưu/đọc lại giữ nguyên ObjectId.
+    """
+    recorder = QueryShapeRecorder()
+    recorder.started(_event("find", {"find": "users", "filter": {"username": "alice"}, "limit": 1, "lsid": {"id": 1}}))
+    recorder.started(_event("find", {"find": "users", "filter": {"username": "bob"}, "limit": 1}))
+    recorder.started(_event("find", {"find": "roles", "filter": {"_id": {"$in": [ObjectId(), ObjectId()]}}}))
+    recorder.started(_event("find", {"find": "roles", "filter": {"_id": {"$in": [ObjectId()]}}}))
+    recorder.started(_event("update", {"update": "users", "updates": [
+        {"q": {"_id": ObjectId()}, "u": {"$set": {"login_count": 1}}},
+        {"q": {"role_ids": "r1"}, "u": {"$inc": {"token_epoch": 1}}, "multi": True},
+    ]}))
+    recorder.started(_event("insert", {"insert": "users", "documents": [{}]}))
+    recorder.started(_event("find", {"find": "system.version", "filter": {}}, database_name="admin"))
+
+    shapes = sorted(recorder.shapes.values(), key=lambda shape: shape.key)
+    assert [(shape.collection, shape.command, shape.count) for shape in shapes] == [
+        ("roles", "find", 2), ("users", "find", 2), ("users", "update", 1), ("users", "update", 1),
+    ]
+    assert "lsid" not in shapes[1].example
+
+    path = tmp_path / "query_shapes.json"
+    recorder.dump(str(path))
+    loaded = load_query_shapes(str(path))
+    assert {shape.key for shape in loaded} == set(recorder.shapes)
+    assert isinstance(loaded[[shape.collection for shape in loaded].index("roles")].example["filter"]["_id"]["$in"][0], ObjectId)
+
+
+def test_analyze_explain_flags_collscan_sort_and_examined_ratio():
+    """
+    Kiểm thử COLLSCAN, SORT trong bộ nhớ và tỷ lệ docs examined / returned cao bị báo cáo,
+    còn IXSCAN chọn lọc và lệnh quét toàn bộ có chủ ý (find {}) thì không.
+    """
+    shape = QueryShape("users", "find", {"filter": {"phone_number": "123"}, "sort": {"updated_at": -1}})
+    collscan = _explain(
+        {"stage": "SORT", "sortPattern": {"updated_at": -1}, "inputStage": {"stage": "COLLSCAN"}},
+        docs_examined=2000, returned=1,
+    )
+    report = analyze_explain(shape, collscan)
+    assert report.stages == ["SORT", "COLLSCAN"]
+    assert len(report.problems) == 3
+    assert report.examined_ratio == 2000
+
+    indexed = _explain(
+        {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "username_1"}},
+        docs_examined=1, returned=1, keys_examined=1,
+    )
+    report = analyze_explain(QueryShape("users", "find", {"filter": {"username": "alice"}}), indexed)
+    assert report.problems == []
+    assert report.stages == ["FETCH", "IXSCAN username_1"]
+
+    full_scan = _explain({"stage": "COLLSCAN"}, docs_examined=2000, returned=2000)
+    assert analyze_explain(QueryShape("roles", "find", {"filter": {}}), full_scan).problems == []
+
+
+def test_analyze_explain_checks_lookups_in_aggregations():
+    """
+    Kiểm thử explain của aggregate: plan nằm trong stage $cursor, $lookup quét collection (classic)
+    hoặc EQ_LOOKUP không dùng index (SBE) đều bị báo cáo.
+    """
+    shape = QueryShape("users", "aggregate", {"pipeline": [
+        {"$match": {"username": "alice"}},
+        {"$lookup": {"from": "roles", "localField": "role_ids", "foreignField": "name", "as": "_roles"}},
+    ]})
+    classic = {"stages": [
+        {"$cursor": _explain({"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "username_1"}}, 1, 1, 1)},
+        {"$lookup": {"from": "roles"}, "collectionScans": 1},
+    ]}
+    report = analyze_explain(shape, classic)
+    assert report.stages == ["FETCH", "IXSCAN username_1"]
+    assert report.problems == ["$lookup sang roles quét collection (1 lần)"]
+
+    sbe = _explain({"queryPlan": {
+        "stage": "EQ_LOOKUP", "foreignCollection": "app.roles", "strategy": "NestedLoopJoin",
+        "inputStage": {"stage": "IXSCAN", "indexName": "username_1"},
+    }}, docs_examined=1, returned=1)
+    report = analyze_explain(shape, sbe)
+    assert report.problems == ["$lookup sang app.roles không dùng index (NestedLoopJoin)"]
+
+
+def test_query_plan_client_refuses_application_database(monkeypatch):
+    """
+    Kiểm thử công cụ (xóa/seed database) từ chối chạy khi TEST_MONGODB_URI trùng MONGODB_URI của ứng dụng.
+    """
+    monkeypatch.setattr(query_plans.settings, "TEST_MONGODB_URI", query_plans.settings.MONGODB_URI)
+    with pytest.raises(RuntimeError, match="TEST_MONGODB_URI"):
+        query_plans.query_plan_client()
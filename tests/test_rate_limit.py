@@ -0,0 +1,79 @@
+# tests/test_rate_limit.py
+
+import asyncio
+
+from app.core.rate_limit import MemoryRateLimitBackend, RateLimiter, sliding_window_decision
+
+
+def test_sliding_window_weights_previous_window():
+    """
+    Kiểm thử số đếm cửa sổ trước được tính theo phần còn nằm trong cửa sổ trượt.
+    """
+    # Nửa cửa sổ đã trôi qua: 10 * 0.5 + 5 = 10 <= 10
+    assert sliding_window_decision(10, 5, elapsed=30, window_seconds=60, limit=10) == (True, 0)
+    allowed, retry_after = sliding_window_decision(10, 6, elapsed=30, window_seconds=60, limit=10)
+    assert allowed is False
+    # Cần 10 * (1 - f) <= 3 -> f >= 0.7 -> 42s - 30s
+    assert retry_after == 12
+
+
+def test_memory_backend_rolls_windows_and_prunes_shards():
+    """
+    Kiểm thử backend trong process dịch cửa sổ đúng và giữ số key trong giới hạn.
+    """
+    backend = MemoryRateLimitBackend(shard_count=2, max_keys=4)
+
+    async def scenario():
+        counts = [await backend.hit("ip:1", 60, now) for now in (0, 10, 65, 130)]
+        for i in range(20):
+            await backend.hit(f"ip:{i}", 60, 200)
+        return counts
+
+    assert asyncio.run(scenario()) == [(0, 1), (0, 2), (2, 1), (1, 1)]
+    assert backend.key_count() <= 4
+
+
+def test_limiter_rejects_when_any_key_exceeds_limit():
+    """
+    Kiểm thử request bị từ chối (kèm Retry-After) khi một trong các key vượt giới hạn.
+    """
+    limiter = RateLimiter(MemoryRateLimitBackend(shard_count=4, max_keys=100), window_seconds=60)
+
+    async def scenario():
+        results = []
+        for _ in range(4):
+            results.append(await limiter.check([("ip:1.2.3.4", 100), ("user:alice", 3)]))
+        results.append(await limiter.check([("ip:1.2.3.4", 100), ("user:bob", 3)]))
+        return results
+
+    results = asyncio.run(scenario())
+    assert results[:3] == [None, None, None]
+    assert results[3] is not None and results[3] >= 1
+    assert results[4] is None
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_client_ip_trusts_only_proxy_appended_forwarded_for(monkeypatch):
+    """
+    Kiểm thử IP client lấy từ X-Forwarded-For theo số proxy tin cậy (phần client tự gửi bị bỏ qua),
+    và chỉ khi kết nối đến từ proxy trong TRUSTED_PROXY_IPS.
+    """
+    from starlette.requests import Request
+
+    from app import dependencies
+
+    def request(peer, forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "client": (peer, 1234), "headers": headers})
+
+    monkeypatch.setattr(dependencies.settings, "TRUSTED_PROXY_HOPS", 0)
+    monkeypatch.setattr(dependencies.settings, "TRUSTED_PROXY_IPS", [])
+    assert dependencies.client_ip(request("10.0.0.5", "1.1.1.1")) == "10.0.0.5"
+
+    monkeypatch.setattr(dependencies.settings, "TRUSTED_PROXY_HOPS", 1)
+    assert dependencies.client_ip(request("10.0.0.5", "6.6.6.6, 203.0.113.7")) == "203.0.113.7"
+    assert dependencies.client_ip(request("10.0.0.5")) == "10.0.0.5"
+
+    monkeypatch.setattr(dependencies.settings, "TRUSTED_PROXY_IPS", ["10.0.0.0/8"])
+    assert dependencies.client_ip(request("10.0.0.5", "203.0.113.7")) == "203.0.113.7"
+    assert dependencies.client_ip(request("198.51.100.9", "203.0.113.7")) == "198.51.100.9"
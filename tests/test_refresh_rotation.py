@@ -0,0 +1,117 @@
+# tests/test_refresh_rotation.py
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import token_epoch
+from app.core.cache import token_epoch_cache
+from app.core.revocation import RevokedFamilies
+from app.core.security import create_access_token, create_refresh_token, hash_token_id
+from app.schemas.user import UserInResponse
+from app.services import user_service as user_service_module
+from app.services.user_service import UserService
+
+
+class FakeRefreshTokenStore:
+    """Bản ghi refresh token trong bộ nhớ thay cho collection refresh_tokens."""
+
+    def __init__(self):
+        self.records = {}
+
+    async def create(self, token_hash, family_id, user_id, expires_at, db):
+        self.records[token_hash] = {"_id": token_hash, "family_id": family_id, "user_id": user_id}
+
+    async def consume(self, token_hash, db):
+        record = self.records.get(token_hash)
+        if record is None or "used_at" in record or "revoked_at" in record:
+            return None
+        record["used_at"] = True
+        return record
+
+    async def get(self, token_hash, db):
+        return self.records.get(token_hash)
+
+    async def revoke_family(self, family_id, db):
+        revoked = [r for r in self.records.values() if r["family_id"] == family_id and "revoked_at" not in r]
+        for record in revoked:
+            record["revoked_at"] = True
+        return len(revoked)
+
+    async def is_family_revoked(self, family_id, db):
+        return any(r["family_id"] == family_id and "revoked_at" in r for r in self.records.values())
+
+
+@pytest.fixture
+def store(monkeypatch):
+    from app.core import revocation
+
+    store = FakeRefreshTokenStore()
+    monkeypatch.setattr(user_service_module, "create_refresh_token_record", store.create)
+    monkeypatch.setattr(user_service_module, "consume_refresh_token", store.consume)
+    monkeypatch.setattr(user_service_module, "get_refresh_token_record", store.get)
+    monkeypatch.setattr(revocation, "revoke_refresh_token_family", store.revoke_family)
+    monkeypatch.setattr(revocation, "is_refresh_token_family_revoked_db", store.is_family_revoked)
+    monkeypatch.setattr(user_service_module, "revoked_families", RevokedFamilies())
+
+    async def fake_profiles(self, user_ids):
+        now = datetime.now(timezone.utc)
+        return {
+            user_id: UserInResponse(
+                id=user_id, username=user_id, email=f"{user_id}@example.com",
+                is_active=True, is_superuser=False, created_at=now, updated_at=now,
+            )
+            for user_id in user_ids
+        }
+
+    async def fake_epoch(user_id, db):
+        return 0
+
+    monkeypatch.setattr(UserService, "get_user_profiles", fake_profiles)
+    monkeypatch.setattr(token_epoch, "get_token_epoch_db", fake_epoch)
+    token_epoch_cache.clear()
+    return store
+
+
+def _issue(store, jti="jti-1", fid="family-1"):
+    store.records[hash_token_id(jti)] = {"_id": hash_token_id(jti), "family_id": fid, "user_id": "u1"}
+    return create_refresh_token({"sub": "u1", "type": "refresh", "jti": jti, "fid": fid}, expires_delta=timedelta(minutes=5))
+
+
+def test_refresh_rotates_within_family(store):
+    """
+    Kiểm thử refresh token hợp lệ được đổi lấy cặp token mới cùng family và chỉ dùng được một lần.
+    """
+    service = UserService(db=object())
+    token = asyncio.run(service.refresh_access_token(_issue(store)))
+    assert token.refresh_token
+    assert store.records[hash_token_id("jti-1")]["used_at"] is True
+    assert {r["family_id"] for r in store.records.values()} == {"family-1"}
+    assert len(store.records) == 2
+
+
+def test_reused_refresh_token_revokes_family(store):
+    """
+    Kiểm thử dùng lại refresh token đã xoay vòng bị từ chối và thu hồi mọi token của family.
+    """
+    service = UserService(db=object())
+    old_token = _issue(store)
+    asyncio.run(service.refresh_access_token(old_token))
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(service.refresh_access_token(old_token))
+    assert exc_info.value.status_code == 401
+    assert all("revoked_at" in record for record in store.records.values())
+    assert user_service_module.revoked_families.might_be_revoked("family-1")
+
+
+def test_access_token_is_not_a_refresh_token(store):
+    """
+    Kiểm thử access token không dùng được để làm mới token.
+    """
+    access_token = create_access_token({"sub": "u1", "fid": "family-1"}, expires_delta=timedelta(minutes=5))
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(UserService(db=object()).refresh_access_token(access_token))
+    assert exc_info.value.status_code == 401
@@ -0,0 +1,99 @@
+# tests/test_request_timing.py
+
+import asyncio
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import httpx
+from fastapi import APIRouter, FastAPI
+
+from app.core import request_timing
+from app.core.request_timing import (
+    RequestTiming,
+    RequestTimingCommandListener,
+    ServerTimingMiddleware,
+    TimedRoute,
+    record_timing,
+)
+
+
+def _build_app():
+    router = APIRouter(route_class=TimedRoute)
+
+    @router.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        record_timing("jwt", 0.001)
+        record_timing("db", 0.002)
+        record_timing("db", 0.003)
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(ServerTimingMiddleware)
+    return app
+
+
+def _get(app, path):
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            return await client.get(path)
+    return asyncio.run(scenario())
+
+
+def test_debug_headers_report_breakdown_and_round_trips(monkeypatch):
+    """
+    Kiểm thử header Server-Timing có jwt, db (kèm số round trip), serialize và X-DB-Roundtrips khi DEBUG_MODE bật.
+    """
+    monkeypatch.setattr(request_timing.settings, "SERVER_TIMING_ENABLED", True)
+    monkeypatch.setattr(request_timing.settings, "DEBUG_MODE", True)
+    monkeypatch.setattr(request_timing.settings, "SLOW_REQUEST_LOG_MS", 60_000)
+
+    response = _get(_build_app(), "/items/42")
+
+    assert response.status_code == 200
+    server_timing = response.headers["server-timing"]
+    assert server_timing.startswith('jwt;dur=1.00, db;dur=5.00;desc="2 round trips", serialize;dur=')
+    assert "total;dur=" in server_timing
+    assert response.headers["x-db-roundtrips"] == "2"
+
+
+def test_slow_request_is_logged_without_debug_headers(monkeypatch, capsys):
+    """
+    Kiểm thử request vượt ngưỡng được ghi một dòng log JSON, còn header chỉ gửi khi DEBUG_MODE bật.
+    """
+    monkeypatch.setattr(request_timing.settings, "SERVER_TIMING_ENABLED", True)
+    monkeypatch.setattr(request_timing.settings, "DEBUG_MODE", False)
+    monkeypatch.setattr(request_timing.settings, "SLOW_REQUEST_LOG_MS", 0)
+
+    response = _get(_build_app(), "/items/42")
+
+    assert "server-timing" not in response.headers
+    log_line = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert log_line["event"] == "slow_request"
+    assert log_line["route"] == "/items/{item_id}"
+    assert log_line["db_roundtrips"] == 2
+
+
+def test_command_listener_feeds_request_from_driver_thread():
+    """
+    Kiểm thử listener chạy trên thread của driver (context được copy như Motor) vẫn cộng vào request đã gửi lệnh,
+    và không làm gì khi không có request nào đang được đo.
+    """
+    listener = RequestTimingCommandListener()
+    event = SimpleNamespace(duration_micros=2500)
+    listener.succeeded(event) # Ngoài request: bỏ qua
+
+    timing = RequestTiming()
+    token = request_timing._current_timing.set(timing)
+    try:
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(context.run, listener.succeeded, event).result()
+            executor.submit(context.run, listener.failed, event).result()
+    finally:
+        request_timing._current_timing.reset(token)
+
+    assert timing.counts["db"] == 2
+    assert abs(timing.totals["db"] - 0.005) < 1e-9
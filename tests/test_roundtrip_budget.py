@@ -0,0 +1,273 @@
+# tests/test_roundtrip_budget.py
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import pytest
+import pytest_asyncio
+from fastapi.routing import APIRoute
+from httpx import AsyncClient
+from jose import jwt
+
+from main import app
+from app.core.cache import principal_cache, token_epoch_cache
+from app.core.config import settings
+from app.core.permission_catalog import load_permission_catalog
+from app.core.security import get_password_hash
+from app.repository.permission import create_permission_db
+from app.repository.role import create_role_db, get_role_by_name
+from app.repository.user import create_user_db, update_user_db
+from app.services.user_service import UserService
+from tests.conftest import command_recorder
+
+API = settings.API_V1_STR
+
+# Số lệnh Mongo tối đa mỗi lần gọi, đo với cache trong process (principal, token epoch) đang trống:
+# đây là chi phí của request đầu tiên trên một worker hoặc ngay sau khi cache bị invalidate.
+# Với cache ấm, phần lớn các route đọc tốn ít hơn (xem WARM_ROUTE_BUDGETS). Thêm route mới phải khai báo ngân sách tại đây.
+ROUTE_BUDGETS: Dict[Tuple[str, str], int] = {
+    ("POST", f"{API}/auth/register"): 5,
+    ("POST", f"{API}/auth/login"): 2,
+    ("POST", f"{API}/auth/refresh-token"): 6,
+    ("POST", f"{API}/auth/introspect"): 6,
+    ("GET", f"{API}/auth/me"): 2,
+    ("POST", f"{API}/auth/forgot-password"): 1,
+    ("POST", f"{API}/auth/reset-password"): 4,
+    ("PUT", f"{API}/auth/change-password"): 6,
+    ("PUT", f"{API}/auth/deactivate-account"): 6,
+    ("POST", f"{API}/auth/reactivate-account"): 4,
+    ("POST", f"{API}/auth/request-email-verification"): 3,
+    ("GET", f"{API}/auth/verify-email/{{token}}"): 4,
+    ("PUT", f"{API}/auth/change-email"): 7,
+    ("POST", f"{API}/users/"): 7,
+    ("GET", f"{API}/users/"): 5,
+    ("GET", f"{API}/users/export"): 5,
+    ("GET", f"{API}/users/{{user_id}}"): 3,
+    ("PUT", f"{API}/users/{{user_id}}"): 7,
+    ("PUT", f"{API}/users/{{user_id}}/roles"): 8,
+    ("PUT", f"{API}/users/{{user_id}}/status"): 7,
+    ("DELETE", f"{API}/users/{{user_id}}"): 5,
+    ("POST", f"{API}/roles/"): 7,
+    ("GET", f"{API}/roles/"): 4,
+    ("GET", f"{API}/roles/{{role_id}}"): 4,
+    ("PUT", f"{API}/roles/{{role_id}}"): 7,
+    ("POST", f"{API}/roles/{{role_id}}/revoke-tokens"): 4,
+    ("DELETE", f"{API}/roles/{{role_id}}"): 6,
+    ("POST", f"{API}/permissions/"): 5,
+    ("GET", f"{API}/permissions/"): 3,
+    ("GET", f"{API}/permissions/{{permission_id}}"): 3,
+    ("PUT", f"{API}/permissions/{{permission_id}}"): 7,
+    ("DELETE", f"{API}/permissions/{{permission_id}}"): 6,
+    ("POST", f"{API}/authz/check"): 3,
+    ("GET", "/.well-known/jwks.json"): 0,
+    ("GET", "/metrics"): 0,
+    ("GET", "/health"): 0,
+}
+
+# Ngân sách của lần gọi thứ hai liên tiếp (principal cache và token epoch cache đã được lần gọi đầu làm ấm):
+# chi phí ở trạng thái ổn định của các route đọc nóng. Chỉ khai báo route đọc (gọi lại không đổi dữ liệu).
+WARM_ROUTE_BUDGETS: Dict[Tuple[str, str], int] = {
+    ("GET", f"{API}/auth/me"): 1,
+}
+
+PASSWORD = "BudgetPassword123!"
+
+
+class BudgetCase:
+    """Một lần gọi route: `build(env)` trả về (url, tham số cho httpx); `prepare(env)` chuẩn bị dữ liệu riêng nếu cần."""
+
+    def __init__(
+        self,
+        method: str,
+        route: str,
+        build: Callable[[SimpleNamespace], Tuple[str, Dict[str, Any]]],
+        prepare: Optional[Callable[[SimpleNamespace], Awaitable[None]]] = None,
+    ):
+        self.method = method
+        self.route = route
+        self.build = build
+        self.prepare = prepare
+
+    def __repr__(self) -> str:
+        return f"{self.method} {self.route}"
+
+
+def _auth(tokens) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {tokens.access_token}"}
+
+def _purpose_token(user_id: str, token_type: str) -> str:
+    """Token đặt lại mật khẩu/xác minh email, cùng định dạng với UserService."""
+    payload = {"sub": user_id, "type": token_type, "exp": datetime.now(timezone.utc) + timedelta(minutes=5)}
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+async def _deactivate_member(env: SimpleNamespace) -> None:
+    await update_user_db(env.member.id, {"is_active": False}, env.db)
+
+
+CASES: List[BudgetCase] = [
+    BudgetCase("POST", f"{API}/auth/register", lambda env: (
+        f"{API}/auth/register", {"json": {"username": "newcomer", "email": "newcomer@example.com", "password": PASSWORD}})),
+    BudgetCase("POST", f"{API}/auth/login", lambda env: (
+        f"{API}/auth/login", {"data": {"username": "member", "password": PASSWORD}})),
+    BudgetCase("POST", f"{API}/auth/refresh-token", lambda env: (
+        f"{API}/auth/refresh-token", {"headers": {"Authorization": f"Bearer {env.member_tokens.refresh_token}"}})),
+    BudgetCase("POST", f"{API}/auth/introspect", lambda env: (
+        f"{API}/auth/introspect", {"headers": _auth(env.admin_tokens),
+                                   "json": {"tokens": [env.member_tokens.access_token, env.member_tokens.refresh_token]}})),
+    BudgetCase("GET", f"{API}/auth/me", lambda env: (
+        f"{API}/auth/me", {"headers": _auth(env.member_tokens)})),
+    BudgetCase("POST", f"{API}/auth/forgot-password", lambda env: (
+        f"{API}/auth/forgot-password", {"json": {"email": "member@example.com"}})),
+    BudgetCase("POST", f"{API}/auth/reset-password", lambda env: (
+        f"{API}/auth/reset-password", {"json": {"token": _purpose_token(env.member.id, "password_reset"), "new_password": "NewPassword123!"}})),
+    BudgetCase("PUT", f"{API}/auth/change-password", lambda env: (
+        f"{API}/auth/change-password", {"headers": _auth(env.member_tokens),
+                                        "json": {"old_password": PASSWORD, "new_password": "NewPassword123!"}})),
+    BudgetCase("PUT", f"{API}/auth/deactivate-account", lambda env: (
+        f"{API}/auth/deactivate-account", {"headers": _auth(env.member_tokens)})),
+    BudgetCase("POST", f"{API}/auth/reactivate-account", lambda env: (
+        f"{API}/auth/reactivate-account", {"data": {"username": "member", "password": PASSWORD}}),
+        prepare=_deactivate_member),
+    BudgetCase("POST", f"{API}/auth/request-email-verification", lambda env: (
+        f"{API}/auth/request-email-verification", {"headers": _auth(env.member_tokens)})),
+    BudgetCase("GET", f"{API}/auth/verify-email/{{token}}", lambda env: (
+        f"{API}/auth/verify-email/{_purpose_token(env.member.id, 'email_verification')}", {})),
+    BudgetCase("PUT", f"{API}/auth/change-email", lambda env: (
+        f"{API}/auth/change-email", {"headers": _auth(env.member_tokens),
+                                     "json": {"new_email": "member.new@example.com", "password": PASSWORD}})),
+    BudgetCase("POST", f"{API}/users/", lambda env: (
+        f"{API}/users/", {"headers": _auth(env.admin_tokens),
+                          "json": {"username": "created", "email": "created@example.com", "password": PASSWORD}})),
+    BudgetCase("GET", f"{API}/users/", lambda env: (
+        f"{API}/users/", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("GET", f"{API}/users/export", lambda env: (
+        f"{API}/users/export", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("GET", f"{API}/users/{{user_id}}", lambda env: (
+        f"{API}/users/{env.member.id}", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("PUT", f"{API}/users/{{user_id}}", lambda env: (
+        f"{API}/users/{env.member.id}", {"headers": _auth(env.admin_tokens), "json": {"full_name": "Member Name"}})),
+    BudgetCase("PUT", f"{API}/users/{{user_id}}/roles", lambda env: (
+        f"{API}/users/{env.member.id}/roles", {"headers": _auth(env.admin_tokens), "json": [env.role.id]})),
+    BudgetCase("PUT", f"{API}/users/{{user_id}}/status", lambda env: (
+        f"{API}/users/{env.member.id}/status", {"headers": _auth(env.admin_tokens), "params": {"is_active": "false"}})),
+    BudgetCase("DELETE", f"{API}/users/{{user_id}}", lambda env: (
+        f"{API}/users/{env.member.id}", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("POST", f"{API}/roles/", lambda env: (
+        f"{API}/roles/", {"headers": _auth(env.admin_tokens), "json": {"name": "auditor", "permission_ids": [env.permission.id]}})),
+    BudgetCase("GET", f"{API}/roles/", lambda env: (
+        f"{API}/roles/", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("GET", f"{API}/roles/{{role_id}}", lambda env: (
+        f"{API}/roles/{env.role.id}", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("PUT", f"{API}/roles/{{role_id}}", lambda env: (
+        f"{API}/roles/{env.role.id}", {"headers": _auth(env.admin_tokens), "json": {"description": "Updated"}})),
+    BudgetCase("POST", f"{API}/roles/{{role_id}}/revoke-tokens", lambda env: (
+        f"{API}/roles/{env.role.id}/revoke-tokens", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("DELETE", f"{API}/roles/{{role_id}}", lambda env: (
+        f"{API}/roles/{env.role.id}", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("POST", f"{API}/permissions/", lambda env: (
+        f"{API}/permissions/", {"headers": _auth(env.admin_tokens), "json": {"name": "report:export"}})),
+    BudgetCase("GET", f"{API}/permissions/", lambda env: (
+        f"{API}/permissions/", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("GET", f"{API}/permissions/{{permission_id}}", lambda env: (
+        f"{API}/permissions/{env.permission.id}", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("PUT", f"{API}/permissions/{{permission_id}}", lambda env: (
+        f"{API}/permissions/{env.permission.id}", {"headers": _auth(env.admin_tokens), "json": {"name": "article:read_any"}})),
+    BudgetCase("DELETE", f"{API}/permissions/{{permission_id}}", lambda env: (
+        f"{API}/permissions/{env.spare_permission.id}", {"headers": _auth(env.admin_tokens)})),
+    BudgetCase("POST", f"{API}/authz/check", lambda env: (
+        f"{API}/authz/check", {"headers": _auth(env.admin_tokens),
+                               "json": {"subject": env.member.id, "permissions": ["user:read_own", "article:read_all"]}})),
+    BudgetCase("GET", "/.well-known/jwks.json", lambda env: ("/.well-known/jwks.json", {})),
+    BudgetCase("GET", "/metrics", lambda env: ("/metrics", {})),
+    BudgetCase("GET", "/health", lambda env: ("/health", {})),
+]
+
+
+@pytest.fixture(scope="module")
+def password_hash() -> str:
+    return get_password_hash(PASSWORD) # Chỉ băm một lần cho cả module
+
+@pytest_asyncio.fixture(scope="function")
+async def budget_env(test_db_client, password_hash: str) -> SimpleNamespace:
+    """
+    Dữ liệu dùng chung: superuser "admin", người dùng "member" (vai trò mặc định), vai trò "editor"
+    với quyền "article:read_all" và quyền "article:archive" chưa được gán. Token được phát hành trực tiếp qua UserService (không qua bcrypt).
+    """
+    db = test_db_client
+    permission = await create_permission_db({"name": "article:read_all"}, db)
+    spare_permission = await create_permission_db({"name": "article:archive"}, db) # Không gán cho vai trò nào (để xóa được)
+    role = await create_role_db({"name": "editor", "permission_ids": [permission.id]}, db)
+    default_role = await get_role_by_name(settings.DEFAULT_USER_ROLE_NAME, db)
+    await load_permission_catalog(db)
+
+    admin = await create_user_db({
+        "username": "admin", "email": "admin@example.com", "hashed_password": password_hash, "is_superuser": True, "role_ids": [],
+    }, db)
+    member = await create_user_db({
+        "username": "member", "email": "member@example.com", "hashed_password": password_hash, "role_ids": [default_role.id],
+    }, db)
+    user_service = UserService(db)
+    return SimpleNamespace(
+        db=db,
+        admin=admin,
+        member=member,
+        role=role,
+        permission=permission,
+        spare_permission=spare_permission,
+        admin_tokens=await user_service.create_auth_tokens(admin),
+        member_tokens=await user_service.create_auth_tokens(member),
+    )
+
+
+def test_every_route_declares_a_budget():
+    """
+    Kiểm thử mọi route của ứng dụng đều có ngân sách round trip và một lần gọi mẫu.
+    """
+    routes = {(method, route.path) for route in app.routes if isinstance(route, APIRoute) for method in route.methods}
+    assert routes == set(ROUTE_BUDGETS)
+    assert {(case.method, case.route) for case in CASES} == set(ROUTE_BUDGETS)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("case", CASES, ids=repr)
+async def test_route_stays_within_round_trip_budget(case: BudgetCase, budget_env: SimpleNamespace, test_app_client: AsyncClient):
+    """
+    Kiểm thử số lệnh Mongo của một lần gọi route không vượt ngân sách đã khai báo.
+    """
+    if case.prepare:
+        await case.prepare(budget_env)
+    url, request_kwargs = case.build(budget_env)
+    principal_cache.clear()
+    token_epoch_cache.clear()
+
+    with command_recorder.recording() as commands:
+        response = await test_app_client.request(case.method, url, **request_kwargs)
+
+    assert response.status_code < 400, response.text
+    budget = ROUTE_BUDGETS[(case.method, case.route)]
+    assert len(commands) <= budget, (
+        f"{case!r}: {len(commands)} lệnh Mongo, vượt ngân sách {budget}:\n  " + "\n  ".join(commands)
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("case", [case for case in CASES if (case.method, case.route) in WARM_ROUTE_BUDGETS], ids=repr)
+async def test_route_stays_within_warm_cache_budget(case: BudgetCase, budget_env: SimpleNamespace, test_app_client: AsyncClient):
+    """
+    Kiểm thử số lệnh Mongo của lần gọi lặp lại (cache trong process đã ấm) không vượt ngân sách cache ấm.
+    """
+    url, request_kwargs = case.build(budget_env)
+    principal_cache.clear()
+    token_epoch_cache.clear()
+    response = await test_app_client.request(case.method, url, **request_kwargs) # Làm ấm cache
+    assert response.status_code < 400, response.text
+
+    with command_recorder.recording() as commands:
+        response = await test_app_client.request(case.method, url, **request_kwargs)
+
+    assert response.status_code < 400, response.text
+    budget = WARM_ROUTE_BUDGETS[(case.method, case.route)]
+    assert len(commands) <= budget, (
+        f"{case!r} (cache ấm): {len(commands)} lệnh Mongo, vượt ngân sách {budget}:\n  " + "\n  ".join(commands)
+    )
@@ -0,0 +1,45 @@
+# tests/test_token_cache.py
+
+import time
+from datetime import timedelta
+
+import pytest
+from jose import JWTError
+
+from app.core.cache import token_cache
+from app.core.config import settings
+from app.core.security import create_access_token, decode_token_cached
+
+
+def test_cached_decode_returns_claims_and_counts_hits():
+    """
+    Kiểm thử lần decode thứ hai lấy từ cache và trả về cùng claims.
+    """
+    token_cache.clear()
+    token = create_access_token({"sub": "user-1"}, expires_delta=timedelta(minutes=5))
+    first = decode_token_cached(token, settings.SECRET_KEY)
+    hits = token_cache.hits
+    second = decode_token_cached(token, settings.SECRET_KEY)
+    assert first == second and first["sub"] == "user-1"
+    assert token_cache.hits == hits + 1
+
+
+def test_cache_entry_expires_with_token():
+    """
+    Kiểm thử entry trong cache hết hạn theo claim `exp` của token, không theo TTL mặc định.
+    """
+    token_cache.clear()
+    token = create_access_token({"sub": "user-1"}, expires_delta=timedelta(seconds=30))
+    claims = decode_token_cached(token, settings.SECRET_KEY)
+    (expires_at, _), = token_cache._data.values()
+    assert abs((expires_at - time.monotonic()) - (claims["exp"] - time.time())) < 1
+
+
+def test_invalid_token_is_not_cached():
+    """
+    Kiểm thử token sai chữ ký vẫn bị từ chối và không được đưa vào cache.
+    """
+    token_cache.clear()
+    with pytest.raises(JWTError):
+        decode_token_cached("not.a.jwt", settings.SECRET_KEY)
+    assert len(token_cache) == 0
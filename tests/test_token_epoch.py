@@ -0,0 +1,57 @@
+# tests/test_token_epoch.py
+
+import asyncio
+
+from app.core import token_epoch
+from app.core.cache import token_epoch_cache
+from app.core.token_epoch import is_token_epoch_current
+
+
+def test_token_with_older_epoch_is_rejected(monkeypatch):
+    """
+    Kiểm thử token có `tep` nhỏ hơn epoch hiện tại của user bị từ chối, token mới (hoặc thiếu tep khi epoch = 0) được chấp nhận.
+    """
+    epochs = {"u1": 2, "u2": 0}
+
+    async def fake_epoch(user_id, db):
+        return epochs.get(user_id)
+
+    monkeypatch.setattr(token_epoch, "get_token_epoch_db", fake_epoch)
+    token_epoch_cache.clear()
+
+    async def scenario():
+        return [
+            await is_token_epoch_current({"sub": "u1", "tep": 1}, db=None),
+            await is_token_epoch_current({"sub": "u1", "tep": 2}, db=None),
+            await is_token_epoch_current({"sub": "u2"}, db=None),
+            await is_token_epoch_current({"sub": "deleted", "tep": 0}, db=None),
+        ]
+
+    assert asyncio.run(scenario()) == [False, True, True, False]
+
+
+def test_epoch_is_cached_until_invalidated(monkeypatch):
+    """
+    Kiểm thử epoch được cache theo user (không đọc DB lần hai) cho tới khi bị invalidate.
+    """
+    reads = []
+    epochs = {"u1": 0}
+
+    async def fake_epoch(user_id, db):
+        reads.append(user_id)
+        return epochs[user_id]
+
+    monkeypatch.setattr(token_epoch, "get_token_epoch_db", fake_epoch)
+    token_epoch_cache.clear()
+    claims = {"sub": "u1", "tep": 0}
+
+    async def scenario():
+        first = await is_token_epoch_current(claims, db=None)
+        second = await is_token_epoch_current(claims, db=None)
+        epochs["u1"] = 1
+        token_epoch_cache.invalidate("u1")
+        third = await is_token_epoch_current(claims, db=None)
+        return first, second, third
+
+    assert asyncio.run(scenario()) == (True, True, False)
+    assert reads == ["u1", "u1"]